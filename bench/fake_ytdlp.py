@@ -0,0 +1,156 @@
+"""A synthetic, offline stand-in for the yt-dlp executable, used by bench/suite.py.
+
+Understands just enough of the command line the app builds: --flat-playlist
+listings of ``https://bench.invalid/playlist?items=N`` and downloads of the
+``https://bench.invalid/watch?v=benchNNNNN`` URLs it lists, or of the info
+JSON given with --load-info-json. Nothing is fetched, and nothing is written
+except the --download-archive file and the --write-info-json file.
+
+A format that joins streams with "+" (as the app's video presets do) is
+downloaded as a video and an audio stream that are then merged, with the
+"[Merger]" line and the postprocess records real yt-dlp prints.
+
+Output is deterministic for a given URL. It is tuned through environment
+variables:
+
+- BENCH_LINES: progress lines per video (default 200)
+- BENCH_LINE_DELAY: seconds to sleep after each progress line (default 0)
+- BENCH_MARK_EVERY: emit a timestamped "[bench] mark" line every N progress
+  lines (default 50), for measuring output latency
+- BENCH_FAIL_EVERY: every Nth video fails as a private video (default 0, never)
+- BENCH_DROP_EVERY: every Nth video times out halfway through its download,
+  unless it was started from an info JSON (default 0, never)
+- BENCH_MERGE: set to 0 to download merged formats as a single file
+- BENCH_MERGE_DELAY: seconds a merge takes (default 0)
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+VIDEO_URL = "https://bench.invalid/watch?v=bench{:05d}"
+
+
+def list_playlist(url):
+    count = int(parse_qs(urlsplit(url).query).get("items", ["20"])[0])
+    for n in range(1, count + 1):
+        video_id = f"bench{n:05d}"
+        print(f"{video_id}\t{VIDEO_URL.format(n)}\tBench video {n}\tBench")
+
+
+def option(args, name):
+    """The value given for ``name`` on the command line, or None."""
+    return args[args.index(name) + 1] if name in args and args.index(name) + 1 < len(args) else None
+
+
+def download(url, args):
+    info_file = option(args, "--load-info-json")
+    if info_file:
+        with open(info_file, encoding="utf-8") as f:
+            info = json.load(f)
+        video_id, url = info["id"], info.get("webpage_url", url)
+    else:
+        video_id = parse_qs(urlsplit(url).query).get("v", ["bench00001"])[0]
+    number = int(video_id[5:] or 1)
+    lines = int(os.environ.get("BENCH_LINES", "200"))
+    delay = float(os.environ.get("BENCH_LINE_DELAY", "0"))
+    mark_every = int(os.environ.get("BENCH_MARK_EVERY", "50"))
+    fail_every = int(os.environ.get("BENCH_FAIL_EVERY", "0"))
+    drop_every = int(os.environ.get("BENCH_DROP_EVERY", "0"))
+    merge_delay = float(os.environ.get("BENCH_MERGE_DELAY", "0"))
+    structured = "--progress-template" in args
+    merge = "+" in (option(args, "-f") or "") and os.environ.get("BENCH_MERGE", "1") != "0"
+    rng = random.Random(number)
+    total = rng.randint(5, 500) * 1024 * 1024
+    speed = rng.uniform(1, 20) * 1024 * 1024
+    path = f"/bench/Bench video {number}.mp4"
+    if merge:
+        # Split so a video still prints BENCH_LINES progress lines in all
+        audio_lines = max(1, lines // 10)
+        streams = [
+            (f"/bench/Bench video {number}.f137.mp4", total * 9 // 10, max(1, lines - audio_lines)),
+            (f"/bench/Bench video {number}.f140.m4a", total // 10, audio_lines),
+        ]
+    else:
+        streams = [(path, total, lines)]
+
+    if info_file:
+        print(f"[info] Loading info JSON from {info_file}")
+    else:
+        print(f"[bench] Extracting URL: {url}")
+        print(f"[bench] {video_id}: Downloading webpage")
+        if fail_every and number % fail_every == 0:
+            print(f"ERROR: [bench] {video_id}: Private video. Sign in if you've been granted access")
+            return 1
+    if "--write-info-json" in args and not info_file:
+        # Saved with the "-o infojson:<stem>.%(ext)s" template the app passes
+        templates = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == "-o"]
+        for template in templates:
+            if template.startswith("infojson:"):
+                info_path = template[9:].replace("%(ext)s", "info.json")
+                print(f"[info] Writing video metadata as JSON to: {info_path}")
+                with open(info_path, "w", encoding="utf-8") as f:
+                    json.dump({"id": video_id, "webpage_url": url, "title": f"Bench video {number}"}, f)
+    print(f"[info] {video_id}: Downloading 1 format(s): {'137+140' if merge else '18'}")
+
+    printed = 0
+    for stream_path, stream_total, stream_lines in streams:
+        print(f"[download] Destination: {stream_path}")
+        for n in range(1, stream_lines + 1):
+            printed += 1
+            done = stream_total * n // stream_lines
+            eta = int((stream_total - done) / speed)
+            if structured:
+                print(f"[progress] download\tdownloading\t{video_id}\t{done}\t{stream_total}\t{speed:.2f}\t{eta}\t{stream_path}")
+            else:
+                pct = done * 100 / stream_total
+                print(f"[download] {pct:5.1f}% of   {stream_total / 1024 ** 2:.2f}MiB at  {speed / 1024 ** 2:.2f}MiB/s ETA 00:{eta % 60:02d}")
+            if mark_every and printed % mark_every == 0:
+                print(f"[bench] mark {time.time():.6f}")
+            if delay:
+                sys.stdout.flush()
+                time.sleep(delay)
+            if drop_every and not info_file and number % drop_every == 0 and n * 2 >= stream_lines:
+                print(f"ERROR: [bench] {video_id}: Read timed out")
+                return 1
+        if structured:
+            print(f"[progress] download\tfinished\t{video_id}\t{stream_total}\t{stream_total}\tNA\tNA\t{stream_path}")
+        else:
+            print(f"[download] 100% of   {stream_total / 1024 ** 2:.2f}MiB in 00:00:01 at {speed / 1024 ** 2:.2f}MiB/s")
+
+    if merge:
+        if structured:
+            print(f"[progress] postprocess\tstarted\t{video_id}\tMerger\t{path}")
+        print(f'[Merger] Merging formats into "{path}"')
+        sys.stdout.flush()
+        if merge_delay:
+            time.sleep(merge_delay)
+        for stream_path, _, _ in streams:
+            print(f"Deleting original file {stream_path} (pass -k to keep)")
+        if structured:
+            print(f"[progress] postprocess\tfinished\t{video_id}\tMerger\t{path}")
+    if structured:
+        print(f"[progress] postprocess\tfinished\t{video_id}\tMoveFiles\t{path}")
+
+    if "--download-archive" in args:
+        with open(option(args, "--download-archive"), "a", encoding="utf-8") as f:
+            f.write(f"bench {video_id}\n")
+    return 0
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        return 2
+    if "--flat-playlist" in args:
+        list_playlist(args[-1])
+        return 0
+    # With --load-info-json there is no URL; the last argument is the JSON file
+    return download(args[-1], args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
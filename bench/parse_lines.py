@@ -0,0 +1,173 @@
+"""Micro-benchmark for classify_line().
+
+Usage: python bench/parse_lines.py [--lines N] [--repeat R] [--format text|structured]
+
+Classifies a synthetic mix of yt-dlp output (mostly --newline progress
+lines, as seen during a real download) and prints the best lines/sec.
+``--format structured`` uses the PROGRESS_TEMPLATE records instead of the
+human-readable progress lines.
+
+Each rate is printed next to that of the code it replaced, kept below as a
+reference: the chain of regexes every line used to be tried against, and
+the substring scan over the old list of permanent errors that
+ErrorClassifier (timed on ERROR/WARNING messages of many different videos)
+replaced.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import DEFAULT_ERROR_RULES, ErrorClassifier, classify_line  # noqa: E402
+
+SAMPLE_LINES = [
+    "[youtube] Extracting URL: https://www.youtube.com/watch?v=dQw4w9WgXcQ\n",
+    "[youtube] dQw4w9WgXcQ: Downloading webpage\n",
+    "[youtube] dQw4w9WgXcQ: Downloading ios player API JSON\n",
+    "[info] dQw4w9WgXcQ: Downloading 1 format(s): 137+140\n",
+    "[download] Destination: /downloads/Some Video Title.f137.mp4\n",
+    "[download] Got error: HTTP Error 503: Service Unavailable. Retrying fragment 3 (1/10)...\n",
+    "[download] 100% of   48.21MiB in 00:00:12 at 3.91MiB/s\n",
+    '[Merger] Merging formats into "/downloads/Some Video Title.mp4"\n',
+    "[download] /downloads/Other Video.mp4 has already been downloaded\n",
+    "[download] Downloading item 12 of 500\n",
+    "WARNING: [youtube] dQw4w9WgXcQ: Some formats are possibly damaged\n",
+    "ERROR: [youtube] dQw4w9WgXcQ: Private video. Sign in if you've been granted access\n",
+]
+
+PROGRESS_LINES = {
+    "text": "[download]  {pct:5.1f}% of ~  48.21MiB at    3.91MiB/s ETA 00:{eta:02d}\n",
+    "structured": (
+        "[progress] download\tdownloading\tdQw4w9WgXcQ\t{done}\t50551848\t4099932.16\t{eta}"
+        "\t/downloads/Some Video Title.f137.mp4\n"
+    ),
+}
+
+ERROR_MESSAGES = [
+    "[youtube] {id}: Private video. Sign in if you've been granted access",
+    "[youtube] {id}: Video unavailable. This video is not available",
+    "[youtube] {id}: Unable to download webpage: HTTP Error 503: Service Unavailable",
+    "[youtube] {id}: Some formats are possibly damaged. They will be skipped",
+    "[youtube] {id}: Sign in to confirm you're not a bot. Use --cookies-from-browser or --cookies",
+    "[download] Got error: The read operation timed out. Retrying fragment 3 (1/10)...",
+    "Unable to download video data: [Errno 104] Connection reset by peer",
+]
+
+# What parsed output lines before classify_line(): each pattern was tried in turn,
+# in legacy_parse_line()'s order, against the whole stripped line
+LEGACY_RE_DOWNLOAD_ITEM = re.compile(r"\[download\]\s+Downloading item (\d+) of (\d+)")
+LEGACY_RE_DOWNLOAD_DEST = re.compile(r"\[download\]\s+Destination:\s+(.+)")
+LEGACY_RE_DOWNLOAD_PROGRESS = re.compile(r"\[download\]\s+([\d.]+)%\s+of\s+~?\s*([\d.]+\S+)\s+at\s+(.+?)\s+ETA\s+(.+)")
+LEGACY_RE_DOWNLOAD_COMPLETE = re.compile(r"\[download\]\s+100%")
+LEGACY_RE_ALREADY_DOWNLOADED = re.compile(r"\[download\]\s+(.+) has already been downloaded")
+LEGACY_RE_EXTRACTING_URL = re.compile(r"\[youtube\]\s+Extracting URL:\s+(.+)")
+LEGACY_RE_EXTRACTING = re.compile(r"\[youtube\]\s+(\S+):\s+Downloading webpage")
+LEGACY_RE_MERGING = re.compile(r"\[Merger\]\s+Merging formats into")
+LEGACY_RE_WARNING = re.compile(r"WARNING:\s*(.*)", re.IGNORECASE)
+LEGACY_RE_ERROR = re.compile(r"ERROR:\s*(.*)", re.IGNORECASE)
+LEGACY_RE_ERROR_VIDEO_ID = re.compile(r"\[youtube\]\s+(\S+?):")
+
+LEGACY_LINE_PATTERNS = [
+    ("extracting_url", LEGACY_RE_EXTRACTING_URL.match),
+    ("error", LEGACY_RE_ERROR.search),
+    ("warning", LEGACY_RE_WARNING.search),
+    ("playlist_item", LEGACY_RE_DOWNLOAD_ITEM.match),
+    ("extracting", LEGACY_RE_EXTRACTING.match),
+    ("destination", LEGACY_RE_DOWNLOAD_DEST.match),
+    ("progress", LEGACY_RE_DOWNLOAD_PROGRESS.search),
+    ("complete", LEGACY_RE_DOWNLOAD_COMPLETE.search),
+    ("already_downloaded", LEGACY_RE_ALREADY_DOWNLOADED.match),
+    ("merging", LEGACY_RE_MERGING.match),
+]
+
+
+def legacy_parse_line(line):
+    """``(kind, *groups)`` for the first old pattern that matches ``line``, or None."""
+    stripped = line.strip()
+    for kind, match in LEGACY_LINE_PATTERNS:
+        m = match(stripped)
+        if m:
+            if kind == "error":
+                video_id = LEGACY_RE_ERROR_VIDEO_ID.match(m.group(1))
+                return (kind, m.group(1), video_id.group(1) if video_id else None)
+            return (kind, *m.groups())
+    return None
+
+
+# What classified errors before ErrorClassifier: only permanent ones were told apart
+LEGACY_PERMANENT_ERRORS = [
+    "this video is not available",
+    "private video",
+    "video is unavailable",
+    "this video has been removed",
+    "account associated with this video has been terminated",
+    "this video is no longer available",
+    "join this channel to get access",
+    "sign in to confirm your age",
+    "content warning",
+]
+
+
+def legacy_is_permanent(message):
+    lower = message.lower()
+    return any(reason in lower for reason in LEGACY_PERMANENT_ERRORS)
+
+
+def make_error_corpus(count):
+    """``count`` error and warning messages, rotating over ERROR_MESSAGES for 1000 video ids."""
+    return [
+        ERROR_MESSAGES[n % len(ERROR_MESSAGES)].format(id=f"v{n % 1000:010d}")
+        for n in range(count)
+    ]
+
+
+def best_rate(function, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in corpus:
+            function(line)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def make_corpus(count, fmt="text"):
+    """Roughly 90% progress lines, the rest a rotation of other output."""
+    template = PROGRESS_LINES[fmt]
+    lines = []
+    for n in range(count):
+        if n % 10:
+            pct = (n % 1000) / 10
+            lines.append(template.format(pct=pct, done=int(50551848 * pct / 100), eta=n % 60))
+        else:
+            lines.append(SAMPLE_LINES[(n // 10) % len(SAMPLE_LINES)])
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--format", choices=sorted(PROGRESS_LINES), default="text")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.lines, args.format)
+    rate = best_rate(classify_line, corpus, args.repeat)
+    legacy = best_rate(legacy_parse_line, corpus, args.repeat)
+    print(
+        f"{rate:,.0f} lines/sec ({args.lines} {args.format} lines, best of {args.repeat};"
+        f" {legacy:,.0f}/sec for the old regex chain)"
+    )
+
+    errors = make_error_corpus(args.lines // 10)
+    rate = best_rate(ErrorClassifier(DEFAULT_ERROR_RULES).classify, errors, args.repeat)
+    legacy = best_rate(legacy_is_permanent, errors, args.repeat)
+    print(f"{rate:,.0f} errors/sec classified ({legacy:,.0f}/sec for the old permanent-error scan)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Reproducible, offline benchmark suite. Prints one JSON document.
+
+Usage: python bench/suite.py [--items N] [--lines N] [--workers N] [--engine subprocess|python]
+                             [--format text|structured] [--output FILE]
+
+Runs a whole playlist through DownloadEngine against bench/fake_ytdlp.py, in
+a scratch directory so the real job queue, playlist cache, download
+archives, metrics and error rules are left alone. No network access and no display is needed. The
+engine is pumped by a loop that mimics the GUI's _poll_output (same frame
+budget and poll intervals, without the Tk widget updates).
+
+Measured:
+
+- parse: classify_line() lines/sec on the parse_lines.py corpus
+- latency_ms: from a "[bench] mark" line being printed by the fake yt-dlp
+  to the engine delivering it to a listener
+- pump_ms: time per poll tick spent in DownloadEngine.pump()
+- end_to_end: playlist items finished per second
+- peak_rss_mb: peak resident memory of this process and of the largest
+  child process (not available on Windows). On Linux a child's peak
+  includes what it inherited at fork, so it is never below this process's.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import engine  # noqa: E402
+from engine import DEFAULT_CONFIG, DownloadEngine, classify_line  # noqa: E402
+from parse_lines import make_corpus  # noqa: E402
+
+try:
+    from main import FRAME_BUDGET, POLL_BUSY_MS, POLL_IDLE_MS  # noqa: E402
+except ImportError:
+    # Python built without Tk; same values as main.py
+    FRAME_BUDGET, POLL_BUSY_MS, POLL_IDLE_MS = 0.012, 30, 250
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def percentiles(samples, scale=1000.0):
+    """p50/p95/max of ``samples`` (seconds), in milliseconds."""
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50": round(statistics.median(ordered) * scale, 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * scale, 3),
+        "max": round(ordered[-1] * scale, 3),
+    }
+
+
+def bench_parse(lines, repeat):
+    results = {}
+    for fmt in ("text", "structured"):
+        corpus = make_corpus(lines, fmt)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for line in corpus:
+                classify_line(line)
+            best = min(best, time.perf_counter() - start)
+        results[f"{fmt}_lines_per_sec"] = round(lines / best)
+    return results
+
+
+def make_fake_ytdlp(scratch):
+    """An executable wrapper that runs fake_ytdlp.py with this interpreter."""
+    fake = BENCH_DIR / "fake_ytdlp.py"
+    if os.name == "nt":
+        wrapper = scratch / "yt-dlp.cmd"
+        wrapper.write_text(f'@"{sys.executable}" "{fake}" %*\r\n', encoding="utf-8")
+    else:
+        wrapper = scratch / "yt-dlp"
+        wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake}" "$@"\n', encoding="utf-8")
+        wrapper.chmod(0o755)
+    return str(wrapper)
+
+
+def bench_engine(args, scratch):
+    # Keep the engine's state files out of the repository
+    engine.JOBS_FILE = scratch / "jobs.jsonl"
+    engine.PLAYLIST_CACHE_FILE = scratch / "playlist_cache.json"
+    engine.ARCHIVE_DIR = scratch / "archives"
+    engine.CONTENT_INDEX_FILE = scratch / "content_index.json"
+    engine.INFO_CACHE_DIR = scratch / "info_cache"
+    engine.METRICS_DIR = scratch / "metrics"
+    # The user's own rules could change how the fake failures are retried
+    engine.ERROR_RULES_FILE = scratch / "error_rules.txt"
+    download_dir = scratch / "downloads"
+    download_dir.mkdir()
+
+    config = dict(
+        DEFAULT_CONFIG,
+        ytdlp_path=make_fake_ytdlp(scratch),
+        engine=args.engine,
+        structured_progress=args.format == "structured",
+        retry_base_delay=0.01,
+        auto_tune=False,
+        max_download_rate="",
+    )
+    bench = DownloadEngine(config)
+    latencies = []
+    finished = []
+
+    def listener(event, data):
+        if event == "log":
+            now = time.time()
+            for line in data["text"].splitlines():
+                if line.startswith("[bench] mark "):
+                    latencies.append(now - float(line[13:]))
+        elif event == "item_finished":
+            finished.append(data["item"])
+
+    bench.subscribe(listener)
+    job = bench.enqueue(f"https://bench.invalid/playlist?items={args.items}", str(download_dir), "Best")
+
+    ticks = []
+    start = time.perf_counter()
+    bench.start(job, workers=args.workers, skip_downloaded=False)
+    while bench.running:
+        tick = time.perf_counter()
+        busy = bench.pump(FRAME_BUDGET)
+        ticks.append(time.perf_counter() - tick)
+        time.sleep((POLL_BUSY_MS if busy else POLL_IDLE_MS) / 1000)
+    elapsed = time.perf_counter() - start
+    bench.shutdown()
+
+    return {
+        "latency_ms": percentiles(latencies),
+        "pump_ms": percentiles(ticks),
+        "end_to_end": {
+            "items": len(bench.items),
+            "finished": len(finished),
+            "failed": len(bench.failed_videos),
+            "seconds": round(elapsed, 3),
+            "items_per_sec": round(len(bench.items) / elapsed, 3),
+        },
+    }
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 1024 ** 2, 1),
+        "largest_child": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 1024 ** 2, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=200, help="progress lines per video")
+    parser.add_argument("--line-delay", type=float, default=0.0, help="seconds between progress lines")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--engine", choices=["subprocess", "python"], default="subprocess")
+    parser.add_argument("--format", choices=["text", "structured"], default="structured")
+    parser.add_argument("--parse-lines", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ["BENCH_LINES"] = str(args.lines)
+    os.environ["BENCH_LINE_DELAY"] = str(args.line_delay)
+
+    results = {
+        "params": vars(args),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parse": bench_parse(args.parse_lines, args.repeat),
+    }
+    with tempfile.TemporaryDirectory(prefix="yt-dlp-gui-bench-") as scratch:
+        results.update(bench_engine(args, Path(scratch)))
+    results["peak_rss_mb"] = peak_rss()
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
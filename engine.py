@@ -0,0 +1,3301 @@
+import hashlib
+import heapq
+import importlib.util
+import codecs
+import itertools
+import json
+import locale
+import multiprocessing
+import os
+import queue
+import random
+import re
+import selectors
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+CONFIG_FILE = Path(__file__).parent / "config.json"
+ARCHIVE_DIR = CONFIG_FILE.parent / "archives"
+PLAYLIST_CACHE_FILE = CONFIG_FILE.parent / "playlist_cache.json"
+JOBS_FILE = CONFIG_FILE.parent / "jobs.jsonl"
+METRICS_DIR = CONFIG_FILE.parent / "metrics"
+ERROR_RULES_FILE = CONFIG_FILE.parent / "error_rules.txt"
+CONTENT_INDEX_FILE = CONFIG_FILE.parent / "content_index.json"
+INFO_CACHE_DIR = CONFIG_FILE.parent / "info_cache"
+# Job folders are kept in this subfolder of "scratch_dir", each marked by a
+# STAGING_MARKER file; StagingArea.cleanup() only ever deletes marked folders
+STAGING_SUBDIR = "yt-dlp-gui"
+STAGING_MARKER = ".yt-dlp-gui-job"
+
+DEFAULT_CONFIG = {
+    "download_dir": str(Path.home() / "Downloads"),
+    "quality": "Best",
+    "concurrent_downloads": 3,
+    "ytdlp_path": "yt-dlp",
+    "retry_max_attempts": 3,
+    "retry_concurrency": 2,
+    "retry_base_delay": 2.0,
+    "retry_max_delay": 60.0,
+    "retry_during_download": True,
+    "log_max_lines": 5000,
+    "log_file_max_mb": 10,
+    "structured_progress": True,
+    "skip_downloaded": True,
+    "playlist_cache_ttl_hours": 6,
+    "playlist_cache_max_entries": 50,
+    "engine": "subprocess",  # or "python": warm worker processes using the yt_dlp module
+    "max_download_rate": "",  # total for all downloads, e.g. "8M" or "500K"; empty for no limit
+    "max_per_host": 0,  # simultaneous downloads per site; 0 for no cap beyond parallel downloads
+    "auto_tune": False,  # learn the fastest fragment concurrency / downloader per extractor
+    "separate_postprocessing": False,  # download raw streams, merge/convert them in their own pool
+    "postprocess_workers": 0,  # simultaneous ffmpeg merges/conversions; 0 for one per CPU core
+    "ffmpeg_path": "ffmpeg",
+    "info_cache_max_mb": 200,  # extracted info JSON kept for retries; 0 to always re-extract
+    "scratch_dir": "",  # local folder to download and merge in before moving files over; empty to disable
+    "min_free_space_mb": 1024,  # needed in the scratch and download folders to start a job
+}
+
+# Minimum seconds between progress messages sent by a warm worker process
+API_PROGRESS_INTERVAL = 0.1
+
+# yt-dlp output is read by one OutputMultiplexer thread where selectors support
+# pipes; on Windows each download's worker thread reads its own pipe
+MULTIPLEX_OUTPUT = os.name != "nt"
+# Bytes read from a process's output at a time
+OUTPUT_CHUNK = 65536
+RE_LINE_END = re.compile(r"\r\n|\r|\n")
+
+# A throttled site gets one more concurrent download back after this many clean ones
+THROTTLE_RECOVERY_ITEMS = 5
+# Further throttling signals from a site within this many seconds are not counted again
+THROTTLE_COOLDOWN = 30.0
+
+# Phases an item's time is split into, in the order they normally happen
+PHASES = ["extracting", "downloading", "postprocessing", "retry_wait"]
+
+# Auto-tune candidates: concurrent fragments with yt-dlp's own downloader, tried in
+# order while doubling keeps helping, then each installed external downloader
+TUNING_FRAGMENTS = [1, 2, 4, 8, 16]
+TUNING_DOWNLOADERS = ["aria2c"]
+# Downloads measured per candidate, and the speed-up needed to keep doubling
+TUNING_SAMPLES = 3
+TUNING_MIN_GAIN = 0.1
+# Downloads shorter than this say little about throughput and are not measured
+TUNING_MIN_BYTES = 4 * 1024 ** 2
+TUNING_MIN_SECONDS = 2.0
+
+# Cached info JSON is reused while its stream URLs stay valid for this many more
+# seconds; without an expiry in the URLs, for INFO_CACHE_TTL after extraction
+INFO_EXPIRY_MARGIN = 300
+INFO_CACHE_TTL = 1800
+RE_URL_EXPIRE = re.compile(r"[?&/]expire[=/](\d+)")
+
+# Query parameters that never change what a URL lists
+IGNORED_QUERY_PARAMS = {"t", "si", "feature", "pp", "index", "start_radio", "ab_channel"}
+
+# Hosts (after normalize_url) whose URLs download a whole playlist when they carry "list="
+YOUTUBE_HOSTS = {"youtube.com", "youtu.be"}
+
+# Video URLs whose id can be read without asking yt-dlp: (host, path pattern, extractor).
+# Group 1 of the pattern is the video id; watch URLs carry it in the "v" query parameter.
+VIDEO_URL_PATTERNS = [
+    ("youtube.com", re.compile(r"/(?:shorts|embed|live|v)/([\w-]+)"), "youtube"),
+    ("youtu.be", re.compile(r"/([\w-]+)"), "youtube"),
+    ("vimeo.com", re.compile(r"/(\d+)$"), "vimeo"),
+]
+
+
+# One tab-separated record per playlist entry when listing with --flat-playlist
+EXPAND_TEMPLATE = "%(id)s\t%(webpage_url,url)s\t%(title)s\t%(ie_key,extractor_key)s"
+
+# Machine-readable progress records, one tab-separated "[progress]" line per tick
+# and per post-processing step. Unknown values are printed by yt-dlp as "NA".
+PROGRESS_TEMPLATE = (
+    "download:[progress] download\t%(progress.status)s\t%(info.id)s"
+    "\t%(progress.downloaded_bytes)s\t%(progress.total_bytes,progress.total_bytes_estimate)s"
+    "\t%(progress.speed)s\t%(progress.eta)s\t%(progress.filename)s"
+)
+POSTPROCESS_TEMPLATE = (
+    "postprocess:[progress] postprocess\t%(progress.status)s\t%(info.id)s"
+    "\t%(progress.postprocessor)s\t%(info.filepath)s"
+)
+
+QUALITY_OPTIONS = {
+    "Best": ["-f", "bestvideo+bestaudio/best", "--merge-output-format", "mp4"],
+    "1080p": ["-f", "bestvideo[height<=1080]+bestaudio/best[height<=1080]", "--merge-output-format", "mp4"],
+    "720p": ["-f", "bestvideo[height<=720]+bestaudio/best[height<=720]", "--merge-output-format", "mp4"],
+    "480p": ["-f", "bestvideo[height<=480]+bestaudio/best[height<=480]", "--merge-output-format", "mp4"],
+    "Audio Only": ["-x", "--audio-format", "mp3"],
+}
+
+# With "separate_postprocessing" yt-dlp downloads the streams as separate files
+# ("," instead of "+"), which PostProcessPool merges or converts afterwards
+RAW_QUALITY_OPTIONS = {
+    "Best": ["-f", "bv*,ba/b"],
+    "1080p": ["-f", "bv*[height<=1080],ba/b[height<=1080]"],
+    "720p": ["-f", "bv*[height<=720],ba/b[height<=720]"],
+    "480p": ["-f", "bv*[height<=480],ba/b[height<=480]"],
+    "Audio Only": ["-f", "ba/b"],
+}
+# The video id in the file name lets ContentIndex match files whatever their title
+OUTPUT_TEMPLATE = "%(title)s [%(id)s].%(ext)s"
+RAW_OUTPUT_TEMPLATE = "%(title)s [%(id)s].f%(format_id)s.%(ext)s"
+# The ".f<format id>" suffix RAW_OUTPUT_TEMPLATE adds to the file name
+RE_RAW_SUFFIX = re.compile(r"\.f[\w-]+$")
+RE_FFMPEG_DURATION = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+# A finished download written with OUTPUT_TEMPLATE: "<title> [<id>].<ext>"
+RE_INDEXED_NAME = re.compile(r"\[([\w-]+)\]\.(\w+)$")
+# A complete raw stream written with RAW_OUTPUT_TEMPLATE
+RE_RAW_NAME = re.compile(r"\[([\w-]+)\]\.f[\w-]+\.(\w+)$")
+# Files with these extensions only satisfy "Audio Only" downloads, all others only video ones
+AUDIO_EXTENSIONS = {"mp3", "m4a", "opus", "ogg", "oga", "flac", "wav", "aac"}
+# Files without a "[<id>]" in the name (the "<title>.<ext>" names of older
+# versions) are only indexed with one of these extensions, and matched by title
+MEDIA_EXTENSIONS = AUDIO_EXTENSIONS | {"mp4", "webm", "mkv", "mov", "flv", "avi", "3gp", "m4v"}
+
+# Tries per merge/conversion before the item is reported as failed
+POSTPROCESS_ATTEMPTS = 2
+POSTPROCESS_LABELS = {"merge": "Merging video and audio", "convert": "Converting to mp3", "rename": "Renaming"}
+
+# Patterns for parsing yt-dlp output into user-friendly progress. Each one is
+# matched against the text after the line's "[tag] " prefix, see classify_line().
+RE_DOWNLOAD_ITEM = re.compile(r"Downloading item (\d+) of (\d+)")
+RE_DOWNLOAD_PROGRESS = re.compile(r"([\d.]+)%\s+of\s+~?\s*([\d.]+\S+)\s+at\s+(.+?)\s+ETA\s+(.+)")
+RE_EXTRACTING = re.compile(r"(\S+):\s+Downloading webpage")
+RE_ERROR_VIDEO_ID = re.compile(r"\[youtube\]\s+(\S+?):")
+RE_SIZE = re.compile(r"([\d.]+)\s*([KMGTP]?i?B)")
+# A rate in yt-dlp's --limit-rate syntax ("500K", "8M", "1.5G"), or with a unit such as "8MiB/s"
+RE_RATE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:([KMGTP])(i?B)?|(B)?)(?:/s)?", re.IGNORECASE)
+
+SIZE_UNITS = {
+    "B": 1,
+    "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4, "PiB": 1024 ** 5,
+    "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4, "PB": 1000 ** 5,
+}
+
+# What an error or warning means for retrying it; messages no rule matches are "unknown"
+ERROR_CATEGORIES = ["permanent", "needs_cookies", "format_unavailable", "rate_limited", "network"]
+CATEGORY_LABELS = {
+    "permanent": "Permanently unavailable",
+    "needs_cookies": "Needs sign-in (cookies)",
+    "format_unavailable": "Format not available",
+    "rate_limited": "Rate limited",
+    "network": "Network errors",
+    "unknown": "Other errors",
+}
+
+# Written to ERROR_RULES_FILE when it does not exist, so it can be edited
+DEFAULT_ERROR_RULES = """\
+# Error classification rules, one per line: "category: text to look for".
+# Matching is case-insensitive; prefix the text with "re:" for a regular expression.
+# The first matching rule wins. Categories: permanent, needs_cookies,
+# format_unavailable, rate_limited, network. Anything else is "unknown".
+# Each category has its own retry settings, see "retry_categories" in the README.
+
+rate_limited: http error 429
+rate_limited: too many requests
+rate_limited: confirm you're not a bot
+rate_limited: confirm you\u2019re not a bot
+
+needs_cookies: sign in to confirm your age
+needs_cookies: join this channel to get access
+needs_cookies: members-only
+needs_cookies: use --cookies
+
+format_unavailable: requested format is not available
+format_unavailable: no video formats found
+
+permanent: this video is not available
+permanent: private video
+permanent: video is unavailable
+permanent: this video has been removed
+permanent: account associated with this video has been terminated
+permanent: this video is no longer available
+permanent: content warning
+permanent: not available in your country
+permanent: unsupported url
+permanent: http error 404
+
+network: re:http error 5\\d\\d
+network: timed out
+network: connection reset
+network: connection refused
+network: remote end closed connection
+network: incompleteread
+network: temporary failure in name resolution
+network: getaddrinfo failed
+"""
+
+# Distinct messages whose category ErrorClassifier remembers
+ERROR_CLASSIFIER_CACHE = 4096
+# Video ids MessageCounts lists for a message repeated for several videos
+MESSAGE_EXAMPLE_IDS = 3
+
+# Retry settings per category; unset ones use the general retry_* settings
+DEFAULT_RETRY_CATEGORIES = {
+    "permanent": {"max_attempts": 1},
+    "needs_cookies": {"max_attempts": 1},
+    "format_unavailable": {"max_attempts": 1},
+    "rate_limited": {"max_attempts": 5, "base_delay": 30.0, "max_delay": 600.0},
+    "network": {},
+    "unknown": {},
+}
+
+
+def load_config():
+    if CONFIG_FILE.exists():
+        try:
+            with open(CONFIG_FILE, "r") as f:
+                config = json.load(f)
+            for key, value in DEFAULT_CONFIG.items():
+                config.setdefault(key, value)
+            return config
+        except (json.JSONDecodeError, IOError):
+            pass
+    return dict(DEFAULT_CONFIG)
+
+
+def save_config(config):
+    try:
+        with open(CONFIG_FILE, "w") as f:
+            json.dump(config, f, indent=2)
+    except IOError:
+        pass
+
+
+class ErrorClassifier:
+    """Maps error and warning messages to one of ERROR_CATEGORIES.
+
+    Plain-text rules (see DEFAULT_ERROR_RULES) are substring checks on the
+    lowercased message, which CPython runs far faster than a regex
+    alternation over them. The first plain-text rule that matches bounds the
+    search: only "re:" rules before it are tried. The first matching rule
+    wins. Malformed rules are skipped and listed in ``skipped``.
+
+    Results are remembered per message with its video id left out, since the
+    same errors come back for many videos, on retries, and once more when a
+    failure is recorded.
+    """
+
+    def __init__(self, rules_text):
+        self.categories = []  # category of each compiled rule, by rule number
+        self.skipped = []
+        self._literals = {}  # lowercased text -> number of the first rule with it, in rule order
+        self._patterns = []  # (rule number, compiled regex) of the "re:" rules
+        self._known = {}  # _message_key() -> category
+        for number, line in enumerate(rules_text.splitlines(), 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            category, sep, pattern = line.partition(":")
+            category, pattern = category.strip().lower(), pattern.strip()
+            if not sep or not pattern or category not in ERROR_CATEGORIES:
+                self.skipped.append(f"line {number}: {line}")
+                continue
+            if pattern.startswith("re:"):
+                try:
+                    self._patterns.append((len(self.categories), re.compile(pattern[3:].strip(), re.IGNORECASE)))
+                except re.error as e:
+                    self.skipped.append(f"line {number}: {e}")
+                    continue
+            else:
+                self._literals.setdefault(pattern.lower(), len(self.categories))
+            self.categories.append(category)
+
+    @classmethod
+    def load(cls, path):
+        """Compile the rules in ``path``, writing the defaults there first if it does not exist."""
+        path = Path(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            text = DEFAULT_ERROR_RULES
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+            except OSError:
+                pass
+        return cls(text)
+
+    def classify(self, message):
+        key = self._message_key(message)
+        category = self._known.get(key)
+        if category is None:
+            if len(self._known) >= ERROR_CLASSIFIER_CACHE:
+                self._known.clear()
+            category = self._known[key] = self._classify(message)
+        return category
+
+    @staticmethod
+    def _message_key(message):
+        """``message`` without the video id of a "[extractor] id: ..." prefix."""
+        return split_video_id(message)[0]
+
+    def _classify(self, message):
+        text = message.lower()
+        best = len(self.categories)
+        for literal in self._literals:
+            if literal in text:
+                best = self._literals[literal]
+                break
+        for number, regex in self._patterns:
+            if number >= best:
+                break
+            if regex.search(text):
+                best = number
+                break
+        return self.categories[best] if best < len(self.categories) else "unknown"
+
+
+_error_classifier = None
+
+
+def load_error_rules(path=None):
+    """(Re)load the error rules file; later classify_error() calls use it."""
+    global _error_classifier
+    _error_classifier = ErrorClassifier.load(path or ERROR_RULES_FILE)
+    return _error_classifier
+
+
+def classify_error(message):
+    """Category of an error or warning message, one of ERROR_CATEGORIES or "unknown"."""
+    classifier = _error_classifier or load_error_rules()
+    return classifier.classify(message)
+
+
+class Failure:
+    """One failed video, as listed in the failure summary. Slotted: huge jobs keep thousands."""
+
+    __slots__ = ("url", "id", "error", "category", "permanent")
+
+    def __init__(self, url, video_id, error, category, permanent=False):
+        self.url = url
+        self.id = video_id
+        # The same message often fails many videos (a private playlist, a cookie problem)
+        self.error = sys.intern(error) if error else error
+        self.category = category
+        self.permanent = permanent  # not worth retrying, by its category's retry policy
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def split_video_id(message):
+    """``(message without the video id, video id)`` for a "[extractor] id: ..." message.
+
+    An "ERROR: " or "WARNING: " in front is kept. The id is None, and the
+    message returned unchanged, if there is no such prefix.
+    """
+    level = ""
+    if not message.startswith("["):
+        level, sep, rest = message.partition(": ")
+        if not sep or not rest.startswith("[") or " " in level:
+            return message, None
+        level, message = level + sep, rest
+    start = message.find("] ") + 2
+    end = message.find(": ", start)
+    if start > 1 and end > start and " " not in message[start:end]:
+        return level + message[:start] + message[end:], message[start:end]
+    return level + message, None
+
+
+class MessageCounts:
+    """The errors and warnings of a job, each distinct message stored once with its count.
+
+    Lines that only differ in their video id count as the same message,
+    listed with the first line seen and up to MESSAGE_EXAMPLE_IDS of the
+    ids. At most ``max_distinct`` different messages are kept; later new
+    ones are only counted in ``dropped``.
+    """
+
+    __slots__ = ("counts", "total", "dropped", "max_distinct")
+
+    def __init__(self, max_distinct=5000):
+        self.counts = {}  # message key -> [first line, occurrences, example ids], in first-seen order
+        self.total = 0
+        self.dropped = 0
+        self.max_distinct = max(1, max_distinct)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, line):
+        self.total += 1
+        key, video_id = split_video_id(line)
+        entry = self.counts.get(key)
+        if entry is not None:
+            entry[1] += 1
+            ids = entry[2]
+            if video_id and len(ids) < MESSAGE_EXAMPLE_IDS and video_id not in ids:
+                ids.append(video_id)
+        elif len(self.counts) < self.max_distinct:
+            self.counts[sys.intern(key)] = [line, 1, [video_id] if video_id else []]
+        else:
+            self.dropped += 1
+
+    def clear(self):
+        self.counts.clear()
+        self.total = 0
+        self.dropped = 0
+
+    def lines(self):
+        """Every distinct message, with a repeat count and example ids for the ones seen more than once."""
+        for line, count, ids in self.counts.values():
+            if count == 1:
+                yield line
+            elif len(ids) > 1:
+                more = ", ..." if count > len(ids) == MESSAGE_EXAMPLE_IDS else ""
+                yield f"{line}  (x{count}, videos {', '.join(ids)}{more})"
+            else:
+                yield f"{line}  (x{count})"
+
+
+def group_failures(failures):
+    """``(category, failures)`` pairs for the failure summary, in ERROR_CATEGORIES order."""
+    groups = {}
+    for failure in failures:
+        groups.setdefault(failure.category, []).append(failure)
+    order = ERROR_CATEGORIES + ["unknown"]
+    return sorted(groups.items(), key=lambda group: order.index(group[0]))
+
+
+def parse_size(text):
+    """Parse a yt-dlp size such as ``48.21MiB`` or ``3.91MiB/s`` into bytes, or None."""
+    m = RE_SIZE.match(text)
+    if not m:
+        return None
+    return float(m.group(1)) * SIZE_UNITS.get(m.group(2), 1)
+
+
+def parse_rate(text):
+    """Parse a download rate such as ``8M``, ``500K`` or ``3.5MiB/s`` into bytes/sec, or None.
+
+    A bare suffix counts in powers of 1024, as yt-dlp's --limit-rate does;
+    with a unit, "KiB" and "MiB" count in 1024s and "KB" and "MB" in 1000s.
+    """
+    m = RE_RATE.fullmatch(text.strip())
+    if not m:
+        return None
+    number, prefix, unit = float(m.group(1)), m.group(2), m.group(3)
+    if not prefix:
+        return number
+    if unit and unit.lower() == "b":
+        return number * SIZE_UNITS[prefix.upper() + "B"]
+    return number * SIZE_UNITS[prefix.upper() + "iB"]
+
+
+def parse_eta(text):
+    """Parse a yt-dlp ETA such as ``01:02:03`` into seconds, or None."""
+    try:
+        seconds = 0
+        for part in text.split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def format_size(num_bytes):
+    if num_bytes is None:
+        return "?"
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if num_bytes < 1024 or unit == "TiB":
+            return f"{num_bytes:.0f}{unit}" if unit == "B" else f"{num_bytes:.2f}{unit}"
+        num_bytes /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _classify_record(body):
+    """Decode a structured "[progress]" record produced by PROGRESS_TEMPLATE/POSTPROCESS_TEMPLATE."""
+    fields = body.split("\t")
+    kind = fields[0]
+
+    if kind == "download" and len(fields) >= 7:
+        status = fields[1]
+        if status == "downloading":
+            downloaded = _number(fields[3])
+            total = _number(fields[4])
+            pct = downloaded * 100 / total if downloaded is not None and total else 0.0
+            return ("progress", min(pct, 100.0), downloaded, total, _number(fields[5]), _number(fields[6]))
+        if status == "finished":
+            return ("complete", _number(fields[4]) or _number(fields[3]))
+        return None
+
+    if kind == "postprocess" and len(fields) >= 4:
+        status, video_id, postprocessor = fields[1], fields[2], fields[3]
+        if status == "started" and postprocessor in ("Merger", "FFmpegMerger"):
+            return ("merging",)
+        if status == "finished" and postprocessor in ("MoveFiles", "MoveFilesAfterDownload"):
+            return ("finished", video_id, fields[4] if len(fields) > 4 else "")
+    return None
+
+
+def _classify_download(body):
+    if body[:1].isdigit():
+        m = RE_DOWNLOAD_PROGRESS.match(body)
+        if m:
+            pct = float(m.group(1))
+            total = parse_size(m.group(2))
+            downloaded = total * pct / 100 if total is not None else None
+            return ("progress", pct, downloaded, total, parse_size(m.group(3)), parse_eta(m.group(4)))
+        if body.startswith("100%"):
+            m = RE_SIZE.search(body, 4)
+            return ("complete", parse_size(m.group(0)) if m else None)
+        return None
+    if body.startswith("Destination:"):
+        return ("destination", body[12:].strip())
+    if body.endswith(" has already been downloaded"):
+        return ("already_downloaded", body[:-28])
+    if body.startswith("Downloading item "):
+        m = RE_DOWNLOAD_ITEM.match(body)
+        if m:
+            return ("playlist_item", int(m.group(1)), int(m.group(2)))
+    return None
+
+
+def _classify_merger(body):
+    if body.startswith("Merging formats into"):
+        return ("merging",)
+    return None
+
+
+def _classify_extractor(body):
+    if body.startswith("Extracting URL:"):
+        return ("extracting_url", body[15:].strip())
+    if body.endswith("Downloading webpage"):
+        m = RE_EXTRACTING.match(body)
+        if m:
+            return ("extracting", m.group(1))
+    return None
+
+
+# Handlers for "[tag] ..." lines; any other tag is treated as an extractor name
+LINE_HANDLERS = {
+    "progress": _classify_record,
+    "download": _classify_download,
+    "Merger": _classify_merger,
+}
+
+
+def classify_line(line):
+    """Turn one line of yt-dlp output into a structured event tuple, or None.
+
+    The line is dispatched on its prefix so at most one precompiled pattern
+    runs per line. Structured "[progress]" records are decoded directly; the
+    human-readable patterns are only a fallback. Events are ``(kind, *fields)``
+    where kind is one of ``progress``, ``complete``, ``finished``,
+    ``destination``, ``already_downloaded``, ``playlist_item``, ``merging``,
+    ``extracting_url``, ``extracting``, ``error`` or ``warning``.
+
+    ``progress`` events are ``(kind, percent, downloaded_bytes, total_bytes,
+    speed_bytes_per_sec, eta_seconds)``, with None for unknown values, and
+    ``complete`` events ``(kind, total_bytes)``.
+    """
+    stripped = line.rstrip("\r\n").lstrip()
+    first = stripped[:1]
+
+    if first == "[":
+        end = stripped.find("] ", 1)
+        if end < 0:
+            return None
+        handler = LINE_HANDLERS.get(stripped[1:end], _classify_extractor)
+        return handler(stripped[end + 2:].lstrip())
+
+    if first in "Ee" and stripped[:6].upper() == "ERROR:":
+        error_msg = stripped[6:].lstrip()
+        # Extract video ID from error like "ERROR: [youtube] ABC123: ..."
+        m = RE_ERROR_VIDEO_ID.match(error_msg)
+        return ("error", error_msg, m.group(1) if m else None, stripped)
+
+    if first in "Ww" and stripped[:8].upper() == "WARNING:":
+        return ("warning", stripped[8:].lstrip(), stripped)
+
+    return None
+
+
+def popen_ytdlp(cmd, text=True):
+    """Start a yt-dlp process with stdout and stderr merged into one pipe, text unless ``text`` is False."""
+    return subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=text,
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+    )
+
+
+class _Stream:
+    """Read state of one process registered with an OutputMultiplexer."""
+
+    __slots__ = ("process", "on_lines", "on_exit", "decoder", "buffer", "after_cr")
+
+    def __init__(self, process, on_lines, on_exit):
+        self.process = process
+        self.on_lines = on_lines
+        self.on_exit = on_exit
+        self.decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace")
+        self.buffer = ""
+        self.after_cr = False  # the last chunk ended in "\r", which may be half of a "\r\n"
+
+    def feed(self, data, final=False):
+        """Decode ``data`` and return the complete lines in it, each ending in "\n"."""
+        text = self.decoder.decode(data, final)
+        if self.after_cr and text.startswith("\n"):
+            text = text[1:]
+        if text:
+            self.after_cr = text.endswith("\r")
+        lines = RE_LINE_END.split(self.buffer + text)
+        self.buffer = "" if final else lines.pop()
+        if final and lines and not lines[-1]:
+            lines.pop()
+        return [line + "\n" for line in lines]
+
+
+class OutputMultiplexer:
+    """One thread that reads the output of every running yt-dlp process.
+
+    Pipes are watched with a selector and read in OUTPUT_CHUNK-sized binary
+    chunks without blocking. Lines are split incrementally on "\r" as well as
+    "\n", so progress redrawn in place arrives as separate lines too. Each
+    chunk's lines are passed to the process's ``on_lines`` callback in one
+    call. Once its pipe closes, the process is reaped and ``on_exit(returncode)``
+    is called. Callbacks run on the multiplexer thread.
+
+    Selectors only support pipes on POSIX; see MULTIPLEX_OUTPUT.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._added = []
+        self._exiting = []  # streams whose pipe has closed, waiting for the process to exit
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._thread = None
+        self._closed = False
+
+    def add(self, process, on_lines, on_exit):
+        """Start reading ``process`` (from popen_ytdlp(..., text=False))."""
+        os.set_blocking(process.stdout.fileno(), False)
+        with self._lock:
+            self._added.append(_Stream(process, on_lines, on_exit))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_w, b"\0")
+
+    def close(self):
+        self._closed = True
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except OSError:
+            pass
+
+    def _run(self):
+        while not self._closed:
+            with self._lock:
+                added, self._added = self._added, []
+            for stream in added:
+                self._selector.register(stream.process.stdout, selectors.EVENT_READ, stream)
+            self._reap()
+
+            # Poll while a process that closed its output has not exited yet
+            for key, _ in self._selector.select(0.05 if self._exiting else None):
+                stream = key.data
+                if stream is None:
+                    try:
+                        os.read(self._wakeup_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                try:
+                    data = os.read(key.fd, OUTPUT_CHUNK)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if data:
+                    self._deliver(stream, stream.feed(data))
+                else:
+                    self._selector.unregister(key.fileobj)
+                    self._deliver(stream, stream.feed(b"", final=True))
+                    stream.process.stdout.close()
+                    self._exiting.append(stream)
+        self._selector.close()
+
+    def _reap(self):
+        for stream in list(self._exiting):
+            returncode = stream.process.poll()
+            if returncode is None:
+                continue
+            self._exiting.remove(stream)
+            try:
+                stream.on_exit(returncode)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _deliver(stream, lines):
+        if lines:
+            try:
+                stream.on_lines(lines)
+            except Exception:
+                # A broken callback must not stop the output of every other process
+                pass
+
+
+def api_available():
+    """Whether the yt_dlp Python module can be imported for the "python" engine."""
+    return importlib.util.find_spec("yt_dlp") is not None
+
+
+class _ApiLogger:
+    """yt-dlp logger that forwards every message to the parent as an output line."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def debug(self, msg):
+        # yt-dlp routes normal screen output through debug(); skip verbose-only lines
+        if not msg.startswith("[debug] "):
+            self.conn.send(("line", msg + "\n"))
+
+    def info(self, msg):
+        self.conn.send(("line", msg + "\n"))
+
+    def warning(self, msg):
+        self.conn.send(("line", f"WARNING: {msg}\n"))
+
+    def error(self, msg):
+        self.conn.send(("line", msg + "\n"))
+
+
+def _api_worker_main(conn, rate_limit):
+    """Warm worker process: import yt_dlp once, then run every download sent over ``conn``.
+
+    Each request is the yt-dlp argument list for one URL. Output is sent back
+    as ``("line", text)`` and ``("event", classify_line()-style event)``
+    messages, followed by ``("done", returncode)``.
+
+    ``rate_limit`` is a shared value the parent updates while a download is
+    running; yt-dlp reads its rate limit from the params on every block.
+    """
+    import yt_dlp
+
+    last_progress = [0.0]
+    current = [None]  # the YoutubeDL instance of the running download
+
+    def progress_hook(d):
+        status = d.get("status")
+        if current[0] is not None:
+            current[0].params["ratelimit"] = rate_limit.value or None
+        if status == "downloading":
+            now = time.monotonic()
+            if now - last_progress[0] < API_PROGRESS_INTERVAL:
+                return
+            last_progress[0] = now
+            downloaded = d.get("downloaded_bytes")
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            pct = min(downloaded * 100 / total, 100.0) if downloaded is not None and total else 0.0
+            conn.send(("event", ("progress", pct, downloaded, total, d.get("speed"), d.get("eta"))))
+        elif status == "finished":
+            conn.send(("event", ("complete", d.get("total_bytes") or d.get("downloaded_bytes"))))
+
+    def postprocessor_hook(d):
+        status, postprocessor = d.get("status"), d.get("postprocessor")
+        if status == "started" and postprocessor in ("Merger", "FFmpegMerger"):
+            conn.send(("event", ("merging",)))
+        elif status == "finished" and postprocessor in ("MoveFiles", "MoveFilesAfterDownload"):
+            info = d.get("info_dict") or {}
+            conn.send(("event", ("finished", info.get("id"), info.get("filepath") or "")))
+
+    while True:
+        try:
+            argv = conn.recv()
+        except EOFError:
+            return
+        if argv is None:
+            return
+
+        try:
+            parsed = yt_dlp.parse_options(argv)
+            opts = dict(
+                parsed.ydl_opts,
+                logger=_ApiLogger(conn),
+                progress_hooks=[progress_hook],
+                postprocessor_hooks=[postprocessor_hook],
+            )
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                current[0] = ydl
+                if parsed.options.load_info_filename is not None:
+                    returncode = ydl.download_with_info_file(os.path.expanduser(parsed.options.load_info_filename))
+                else:
+                    returncode = ydl.download(parsed.urls)
+        except yt_dlp.utils.DownloadError:
+            # Already reported through the logger
+            returncode = 1
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            conn.send(("line", f"ERROR: {e}\n"))
+            returncode = 1
+        current[0] = None
+        conn.send(("done", returncode))
+
+
+class ApiWorkerPool:
+    """Long-lived worker processes that each import yt_dlp once.
+
+    Workers are started lazily, one per scheduler slot, and kept between
+    items and jobs so the interpreter and extractor import cost is paid once.
+    """
+
+    def __init__(self):
+        # spawn, not fork: the parent runs Tk and several threads
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = {}  # slot -> (process, connection, rate limit)
+        self._lock = threading.Lock()
+
+    def _worker(self, slot):
+        with self._lock:
+            worker = self._workers.get(slot)
+            if worker is None or not worker[0].is_alive():
+                parent_conn, child_conn = self._context.Pipe()
+                rate_limit = self._context.Value("d", 0.0, lock=False)
+                process = self._context.Process(
+                    target=_api_worker_main, args=(child_conn, rate_limit), daemon=True
+                )
+                process.start()
+                child_conn.close()
+                worker = self._workers[slot] = (process, parent_conn, rate_limit)
+            return worker
+
+    def connection(self, slot):
+        return self._worker(slot)[1]
+
+    def rate_limit(self, slot):
+        """Shared value holding the slot's download rate limit in bytes/sec; 0 means none."""
+        return self._worker(slot)[2]
+
+    def discard(self, slot):
+        """Kill a worker whose pipe broke; a fresh one is started on next use."""
+        with self._lock:
+            worker = self._workers.pop(slot, None)
+        if worker:
+            worker[0].terminate()
+            worker[1].close()
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._workers = list(self._workers.values()), {}
+        for process, conn, _ in workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn, _ in workers:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+
+
+class RetryPolicy:
+    """How failed items are retried: attempt cap, backoff curve and concurrency.
+
+    ``categories`` overrides max_attempts, base_delay and max_delay per error
+    category (see classify_error()); a max_attempts of 1 means never retry.
+    """
+
+    def __init__(
+        self, max_attempts=3, base_delay=2.0, max_delay=60.0, concurrency=2, start_early=True, categories=None
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = max(1, concurrency)
+        # Retry failed items while the main download is still running
+        self.start_early = start_early
+        self.categories = DEFAULT_RETRY_CATEGORIES if categories is None else categories
+
+    @classmethod
+    def from_config(cls, config):
+        categories = {name: dict(settings) for name, settings in DEFAULT_RETRY_CATEGORIES.items()}
+        for name, settings in config.get("retry_categories", {}).items():
+            categories.setdefault(name, {}).update(settings)
+        return cls(
+            max_attempts=int(config.get("retry_max_attempts", 3)),
+            base_delay=float(config.get("retry_base_delay", 2.0)),
+            max_delay=float(config.get("retry_max_delay", 60.0)),
+            concurrency=int(config.get("retry_concurrency", 2)),
+            start_early=bool(config.get("retry_during_download", True)),
+            categories=categories,
+        )
+
+    def _setting(self, category, name):
+        return self.categories.get(category or "unknown", {}).get(name, getattr(self, name))
+
+    def attempts_for(self, category):
+        """Total attempts allowed for an item whose latest error is in ``category``."""
+        return max(1, int(self._setting(category, "max_attempts")))
+
+    def is_retryable(self, category):
+        return self.attempts_for(category) > 1
+
+    def should_retry(self, item):
+        return item.attempts < self.attempts_for(item.error_category)
+
+    def delay(self, attempt, category=None):
+        """Seconds to wait before retry number ``attempt``: exponential backoff with jitter."""
+        base_delay = float(self._setting(category, "base_delay"))
+        max_delay = float(self._setting(category, "max_delay"))
+        ceiling = min(max_delay, base_delay * 2 ** (attempt - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class BandwidthBudget:
+    """Splits a total download rate (bytes/sec) between the items downloading at once.
+
+    A yt-dlp process gets a fixed --limit-rate when it starts, so it takes a
+    fair share of whatever the running ones leave free. Warm workers read
+    their limit live, so their shares are rebalanced every time an item
+    starts or finishes.
+    """
+
+    def __init__(self, total, slots):
+        self.total = total
+        self.slots = max(1, slots)
+        self._lock = threading.Lock()
+        self._fixed = {}  # item -> rate it was started with
+        self._live = {}  # item -> shared value its worker reads the rate from
+
+    def acquire(self, item, queued=0, live=None):
+        """Reserve a share for ``item`` and return its rate.
+
+        ``queued`` is the number of items waiting for a free slot, so the first
+        items of a job leave room for the ones starting right after them.
+        """
+        with self._lock:
+            if live is not None:
+                self._live[item] = live
+                self._rebalance()
+                return live.value
+
+            others = len(self._fixed) + len(self._live)
+            expected = max(others + 1, min(self.slots, others + 1 + queued))
+            remaining = self.total - sum(self._fixed.values())
+            # Never starve a new item when earlier shares add up to the whole budget
+            rate = max(remaining / (expected - others), self.total / (4 * expected))
+            self._fixed[item] = rate
+            self._rebalance()
+            return rate
+
+    def release(self, item):
+        with self._lock:
+            self._fixed.pop(item, None)
+            live = self._live.pop(item, None)
+            if live is not None:
+                live.value = 0.0
+            self._rebalance()
+
+    def _rebalance(self):
+        if self._live:
+            share = max(self.total - sum(self._fixed.values()), self.total / 4) / len(self._live)
+            for live in self._live.values():
+                live.value = share
+
+
+class HostLimiter:
+    """Caps how many items download from the same site at once.
+
+    A site that throttles us (a "rate_limited" error or warning) has its cap lowered by
+    one; it gets one back after THROTTLE_RECOVERY_ITEMS clean downloads.
+    Shared by every job of an engine, so what was learned carries over.
+    """
+
+    def __init__(self, max_per_host=0):
+        self.max_per_host = max(0, max_per_host)  # 0: no cap until throttled
+        self._cond = threading.Condition()
+        self._running = Counter()
+        self._limits = {}  # host -> lowered cap
+        self._clean = Counter()
+        self._throttled_at = {}
+
+    @staticmethod
+    def key(item):
+        if item.extractor:
+            return item.extractor.lower()
+        return urlsplit(normalize_url(item.url)).netloc
+
+    def limit(self, key):
+        """Current cap for ``key``, or 0 for none."""
+        return self._limits.get(key, self.max_per_host)
+
+    def acquire(self, key):
+        """Block until another download from ``key`` may start."""
+        with self._cond:
+            while self.limit(key) and self._running[key] >= self.limit(key):
+                self._cond.wait()
+            self._running[key] += 1
+
+    def release(self, key, throttled=False):
+        """Finish a download. Returns the raised cap if a throttled site earned one back."""
+        raised = None
+        with self._cond:
+            self._running[key] -= 1
+            if key in self._limits and not throttled:
+                self._clean[key] += 1
+                if self._clean[key] >= THROTTLE_RECOVERY_ITEMS:
+                    self._clean[key] = 0
+                    raised = self._limits[key] + 1
+                    if self.max_per_host and raised >= self.max_per_host:
+                        del self._limits[key]
+                    else:
+                        self._limits[key] = raised
+            self._cond.notify_all()
+        return raised
+
+    def throttle(self, key):
+        """Lower the cap for ``key`` by one. Returns the new cap, or None within the cooldown."""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._throttled_at.get(key, -THROTTLE_COOLDOWN) < THROTTLE_COOLDOWN:
+                return None
+            self._throttled_at[key] = now
+            current = self.limit(key) or self._running[key]
+            self._limits[key] = max(1, current - 1)
+            self._clean[key] = 0
+            return self._limits[key]
+
+
+class FragmentTuner:
+    """Learns the fastest fragment concurrency or external downloader per extractor.
+
+    Each candidate in TUNING_FRAGMENTS is used for TUNING_SAMPLES downloads
+    and its mean throughput recorded; doubling stops once it no longer gains
+    TUNING_MIN_GAIN. Installed TUNING_DOWNLOADERS are tried after that, and
+    the fastest candidate is kept. ``state`` is the "tuning" dict from
+    config.json, updated in place.
+    """
+
+    def __init__(self, state, downloaders=None):
+        self.state = state
+        if downloaders is None:
+            downloaders = [name for name in TUNING_DOWNLOADERS if shutil.which(name)]
+        self.downloaders = downloaders
+        self._lock = threading.Lock()
+
+    def _entry(self, extractor):
+        return self.state.setdefault(extractor, {
+            "current": f"fragments={TUNING_FRAGMENTS[0]}",
+            "results": {},  # candidate -> [mean bytes/sec, downloads]
+            "settled": False,
+        })
+
+    def options(self, extractor):
+        """The candidate to use for the next download from ``extractor`` and its yt-dlp options."""
+        with self._lock:
+            candidate = self._entry(extractor)["current"]
+        name, _, value = candidate.partition("=")
+        if name == "fragments":
+            return candidate, ["--concurrent-fragments", value]
+        return candidate, ["--downloader", name]
+
+    def record(self, extractor, candidate, throughput):
+        """Add one measured download. Returns the new candidate if the setting changed, else None."""
+        with self._lock:
+            entry = self._entry(extractor)
+            mean, count = entry["results"].get(candidate, [0.0, 0])
+            count += 1
+            mean += (throughput - mean) / count
+            entry["results"][candidate] = [mean, count]
+
+            if entry["settled"] or candidate != entry["current"] or count < TUNING_SAMPLES:
+                return None
+            entry["current"] = self._next_candidate(entry)
+            return entry["current"]
+
+    def _next_candidate(self, entry):
+        results = entry["results"]
+        current = entry["current"]
+        if current.startswith("fragments="):
+            index = TUNING_FRAGMENTS.index(int(current[10:]))
+            previous = f"fragments={TUNING_FRAGMENTS[index - 1]}" if index else None
+            gained = previous not in results or results[current][0] > results[previous][0] * (1 + TUNING_MIN_GAIN)
+            if gained and index + 1 < len(TUNING_FRAGMENTS):
+                return f"fragments={TUNING_FRAGMENTS[index + 1]}"
+        for name in self.downloaders:
+            if name not in results:
+                return name
+        entry["settled"] = True
+        # Prefer the earliest candidate (fewest connections) that is about as fast as the best
+        best = max(mean for mean, _ in results.values())
+        return next(candidate for candidate, (mean, _) in results.items() if mean * (1 + TUNING_MIN_GAIN) >= best)
+
+
+def archive_path(download_dir, quality):
+    """Download archive file for one download directory and quality preset."""
+    directory = os.path.normcase(os.path.abspath(download_dir))
+    key = hashlib.sha1(directory.encode("utf-8")).hexdigest()[:12]
+    preset = re.sub(r"\W+", "-", quality).strip("-").lower()
+    return ARCHIVE_DIR / f"{key}-{preset}.txt"
+
+
+def normalize_url(url):
+    """Normalize a URL for use as a cache key: lowercase host, sorted query, no tracking params."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in IGNORED_QUERY_PARAMS)
+    return urlunsplit((parts.scheme.lower() or "https", host, parts.path.rstrip("/"), urlencode(query), ""))
+
+
+def url_key(url):
+    """What ``url`` downloads, for spotting duplicates before anything is listed.
+
+    Recognized video URLs map to "<extractor> <video id>", the download
+    archive's format, so ``youtu.be/X`` and ``youtube.com/watch?v=X&t=30``
+    are the same. YouTube playlists map to "youtube playlist <id>". Anything
+    else is its normalize_url().
+    """
+    normalized = normalize_url(url)
+    parts = urlsplit(normalized)
+    host = parts.netloc
+    if host in YOUTUBE_HOSTS:
+        query = dict(parse_qsl(parts.query))
+        # A video URL with a list parameter (watch or youtu.be) downloads the whole playlist
+        if "list" in query:
+            return f"youtube playlist {query['list']}"
+        if host == "youtube.com" and parts.path == "/watch" and query.get("v"):
+            return f"youtube {query['v']}"
+    for pattern_host, pattern, extractor in VIDEO_URL_PATTERNS:
+        if host == pattern_host:
+            m = pattern.match(parts.path)
+            if m:
+                return f"{extractor} {m.group(1)}"
+    return normalized
+
+
+def entry_key(video_id, extractor):
+    """url_key() of a listed playlist entry, or None if it cannot be identified."""
+    if not (extractor and video_id):
+        return None
+    return f"{extractor.lower()} {video_id}"
+
+
+def write_atomic(path, text, sync=False):
+    """Replace ``path`` with ``text`` through a temporary file, so it is never seen half written.
+
+    With ``sync`` the data is fsynced before the rename. Raises OSError.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class JsonFile:
+    """A JSON object kept in ``path``: read on first use, rewritten atomically by _save()."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._data = {}
+        return self._data
+
+    def _save(self):
+        try:
+            write_atomic(self.path, json.dumps(self._data))
+        except OSError:
+            pass
+
+
+class PlaylistCache(JsonFile):
+    """On-disk cache of playlist listings, keyed by normalized URL.
+
+    Entries expire after ``ttl`` seconds; when more than ``max_entries``
+    listings are stored the least recently used ones are evicted. A hit
+    only updates the last use in memory; it is written with the next
+    listing added or evicted, so one instance should be kept around.
+    """
+
+    def __init__(self, path, ttl=6 * 3600, max_entries=50):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+
+    def get(self, url):
+        """Return ``(entries, age_seconds)`` for a fresh cached listing, or None."""
+        key = normalize_url(url)
+        with self._lock:
+            record = self._load().get(key)
+            if record is None:
+                return None
+            now = time.time()
+            age = now - record["fetched"]
+            if age > self.ttl:
+                del self._data[key]
+                self._save()
+                return None
+            record["used"] = now
+            return record["entries"], age
+
+    def put(self, url, entries):
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            data = self._load()
+            data[key] = {"fetched": now, "used": now, "entries": entries}
+            if len(data) > self.max_entries:
+                by_use = sorted(data, key=lambda k: data[k]["used"])
+                for stale in by_use[:len(data) - self.max_entries]:
+                    del data[stale]
+            self._save()
+
+
+class DownloadArchive:
+    """Completed videos, in yt-dlp's --download-archive format.
+
+    yt-dlp appends "<extractor> <id>" to the file after each successful
+    download; the scheduler reads it to drop finished items before spawning
+    any process for them.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = set()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        self.entries.clear()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.entries.add(line)
+        except OSError:
+            pass
+
+    @staticmethod
+    def key(item):
+        return entry_key(item.video_id, item.extractor)
+
+    def __contains__(self, item):
+        return self.key(item) in self.entries
+
+    def add(self, item):
+        """Record ``item`` as completed, for downloads yt-dlp does not record itself."""
+        key = self.key(item)
+        if key is None:
+            return
+        with self._lock:
+            self.entries.add(key)
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(key + "\n")
+            except OSError:
+                pass
+
+
+def title_key(title):
+    """``title`` reduced to lower case letters and digits, for matching it against file names.
+
+    yt-dlp replaces characters that are not allowed in file names (with
+    "_", "#" or full-width look-alikes, depending on its version), so
+    punctuation cannot be compared.
+    """
+    text = unicodedata.normalize("NFKC", title or "").casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+class ContentIndex(JsonFile):
+    """Persistent index of the finished downloads in each download directory.
+
+    Maps the video id in each file name (see OUTPUT_TEMPLATE) to the file's
+    size and mtime, so duplicates are found before yt-dlp runs and even
+    after a video's title changed. Media files named "<title>.<ext>", as
+    older versions saved them, are indexed without an id and matched by
+    title instead. A directory is only listed again when its own mtime has
+    changed, and only files new since the last listing are stat()ed, which
+    keeps refreshes cheap on large network shares.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        # directory -> ({video id: [file names]}, {title_key: [file names]}), built on first lookup
+        self._names = {}
+
+    def refresh(self, directory):
+        """Bring the index of ``directory`` up to date. Returns the number of files indexed."""
+        key = os.path.abspath(directory)
+        with self._lock:
+            data = self._load()
+            record = data.get(key) or {"mtime": None, "files": {}}
+            try:
+                mtime = os.stat(key).st_mtime
+            except OSError:
+                return 0
+            if record["mtime"] == mtime:
+                return len(record["files"])
+
+            files = {}
+            try:
+                with os.scandir(key) as entries:
+                    for entry in entries:
+                        known = record["files"].get(entry.name)
+                        if known:
+                            files[entry.name] = known
+                            continue
+                        # Raw streams (".f137.mp4") and partial files (".part") do not match
+                        m = RE_INDEXED_NAME.search(entry.name)
+                        video_id = m.group(1) if m else None
+                        if not m:
+                            stem, _, ext = entry.name.rpartition(".")
+                            if ext.lower() not in MEDIA_EXTENSIONS or RE_RAW_SUFFIX.search(stem):
+                                continue
+                        try:
+                            if not entry.is_file():
+                                continue
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        if stat.st_size:
+                            files[entry.name] = [video_id, stat.st_size, stat.st_mtime]
+            except OSError:
+                return len(record["files"])
+
+            data[key] = {"mtime": mtime, "files": files}
+            self._names.pop(key, None)
+            self._save()
+            return len(files)
+
+    def find(self, directory, video_id, audio=False, title=None):
+        """The name of a finished audio (or video) download of ``video_id`` in ``directory``, or None.
+
+        Files without an id in their name are matched against ``title``.
+        """
+        key = os.path.abspath(directory)
+        with self._lock:
+            names = self._names.get(key)
+            if names is None:
+                record = self._load().get(key) or {"files": {}}
+                names = self._names[key] = ({}, {})
+                for name, (indexed_id, _size, _mtime) in record["files"].items():
+                    if indexed_id:
+                        names[0].setdefault(indexed_id, []).append(name)
+                    elif title_key(name.rpartition(".")[0]):
+                        names[1].setdefault(title_key(name.rpartition(".")[0]), []).append(name)
+            by_id, by_title = names
+            candidates = by_id.get(video_id, []) if video_id else []
+            if title and by_title and title_key(title):
+                candidates = candidates + by_title.get(title_key(title), [])
+            for name in candidates:
+                if (name.rpartition(".")[2].lower() in AUDIO_EXTENSIONS) == audio:
+                    return name
+        return None
+
+
+def info_expiry(info):
+    """Earliest expiry (unix time) of the stream URLs in an info dict, or None if they carry none."""
+    formats = info.get("requested_formats") or info.get("formats") or [info]
+    expiries = []
+    for fmt in formats:
+        m = RE_URL_EXPIRE.search(fmt.get("url") or "")
+        if m:
+            expiries.append(int(m.group(1)))
+    return min(expiries) if expiries else None
+
+
+class InfoCache:
+    """Extracted info JSON per video, so retries and resumed jobs can skip extraction.
+
+    yt-dlp writes the file on an item's first attempt (--write-info-json);
+    later attempts pass it back with --load-info-json as long as its stream
+    URLs have not expired. When the files add up to more than ``max_bytes``
+    the least recently used ones are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 ** 2):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # total bytes on disk, counted on first use
+
+    def path(self, item):
+        """Where yt-dlp writes the info JSON of ``item``, or None if it cannot be identified."""
+        key = DownloadArchive.key(item)
+        if key is None:
+            return None
+        return self.directory / (re.sub(r"[^\w.-]", "_", key) + ".info.json")
+
+    def get(self, item):
+        """The cached info JSON of ``item`` if its stream URLs are still usable, else None."""
+        path = self.path(item)
+        if path is None:
+            return None
+        try:
+            stat = path.stat()
+            with open(path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        expiry = info_expiry(info) if isinstance(info, dict) else 0
+        if expiry is None:
+            expiry = stat.st_mtime + INFO_CACHE_TTL + INFO_EXPIRY_MARGIN
+        if expiry - now < INFO_EXPIRY_MARGIN:
+            self.discard(item)
+            return None
+        try:
+            # Used recently: evicted last
+            os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            pass
+        return path
+
+    def discard(self, item):
+        path = self.path(item)
+        if path is None:
+            return
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                return
+            if self._size is not None:
+                self._size -= size
+
+    def added(self, item):
+        """Account for a file yt-dlp has just written, evicting old ones if over the limit."""
+        path = self.path(item)
+        with self._lock:
+            if self._size is not None:
+                try:
+                    self._size += path.stat().st_size
+                except OSError:
+                    return
+                if self._size <= self.max_bytes:
+                    return
+            self._evict()
+
+    def _evict(self):
+        try:
+            files = [(entry.stat().st_atime, entry.stat().st_size, entry.path) for entry in os.scandir(self.directory)]
+        except OSError:
+            files = []
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+
+class PlaylistItem:
+    """A single video to download, with its per-item progress and failure state."""
+
+    def __init__(self, index, url, video_id=None, title=None, extractor=None):
+        self.index = index
+        self.url = url
+        self.title = title
+        self.extractor = extractor
+        # Current video being processed; changes per entry if the item is itself a playlist
+        self.video_url = url
+        self.video_id = video_id
+        self.state = "pending"  # pending, skipped, downloading, waiting, processing, done, failed
+        self.progress = 0.0
+        self.detail = ""
+        self.slot = None
+        self.failed = False
+        self.failures = []  # failed_videos entries from the latest attempt
+        self.returncode = None
+        self.attempts = 0
+        self.last_error = None
+        self.error_category = None  # classify_error() of last_error
+        self.max_attempts = None  # allowed by the retry policy for error_category
+        self.throttled = False  # a throttling signal was seen during the current attempt
+        # Streams written by the current attempt, and the postprocess_task() queued for them
+        self.raw_files = []
+        self.postprocess = None
+        # Auto-tune candidate used for the current attempt and its measured transfer
+        self.tuning = None
+        self.transfer_bytes = 0
+        self.timed_bytes = 0  # the part of transfer_bytes that transfer_seconds covers
+        self.transfer_seconds = 0.0
+        self.stream_started = None
+        self.stream_bytes = 0
+        # Seconds spent in each of PHASES, over all attempts
+        self.phase = None
+        self.phase_started = None
+        self.phase_times = {}
+
+    @property
+    def label(self):
+        return self.title or self.video_id or self.url
+
+
+class Job:
+    """One queued URL and the saved state of its items, as replayed from the job journal."""
+
+    def __init__(self, job_id, url, download_dir, quality):
+        self.id = job_id
+        self.url = url
+        self.key = url_key(url)
+        self.download_dir = download_dir
+        self.quality = quality
+        self.entries = None  # [video_id, url, title, extractor] per item once listed
+        self.states = {}  # item index -> {"state", "attempts", "error", "permanent"}
+        self.finished = False
+
+    def restore_items(self):
+        """PlaylistItems for the recorded listing, with finished items already settled.
+
+        Completed items and permanent failures are kept as they were; everything
+        else, including items that were in flight, is downloaded again.
+        """
+        items = []
+        for index, (video_id, entry_url, title, extractor) in enumerate(self.entries, 1):
+            item = PlaylistItem(index, entry_url, video_id, title, extractor)
+            saved = self.states.get(index)
+            if saved:
+                item.attempts = saved["attempts"]
+                if saved["state"] == "in_flight":
+                    # The interrupted attempt does not count against the retry budget
+                    item.attempts = max(0, item.attempts - 1)
+                elif saved["state"] == "done":
+                    item.state = "done"
+                    item.progress = 100.0
+                    item.returncode = 0
+                    item.detail = "Finished before restart"
+                elif saved["state"] == "failed" and saved["permanent"]:
+                    item.state = "failed"
+                    item.progress = 100.0
+                    item.returncode = 1
+                    item.failed = True
+                    item.last_error = saved["error"]
+                    item.error_category = classify_error(saved["error"] or "")
+                    item.failures = [Failure(entry_url, video_id, saved["error"], item.error_category, True)]
+            items.append(item)
+        return items
+
+
+class JobQueue:
+    """Crash-safe queue of download jobs, kept as an append-only journal of JSON lines.
+
+    Every change (job added, playlist listed, item state changed, job finished)
+    is journaled so the queue can be replayed after a crash. Item changes are
+    collected until flush(), which appends and fsyncs them in one go;
+    DownloadEngine.pump() flushes once per call. Adding and finishing a job
+    flush straight away. A torn last line from an interrupted write is
+    ignored. Finished jobs are dropped when the journal is compacted on load.
+    """
+
+    # Item states as journaled; "waiting" and "in_flight" are resumed like "pending"
+    ITEM_STATES = {
+        "pending": "pending",
+        "downloading": "in_flight",
+        # Its raw streams are still on disk, so downloading again only re-runs the post-processing
+        "processing": "in_flight",
+        "waiting": "waiting",
+        "skipped": "done",
+        "done": "done",
+        "failed": "failed",
+    }
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.jobs = {}  # id -> Job, in the order they were added
+        self._file = None
+        self._unsaved = []  # records not yet written, see flush()
+        # (download_dir, quality, url_key) -> unfinished jobs downloading it, oldest first;
+        # keyed by each job's own URL and by its listed entries
+        self._by_key = {}
+        self._keys = {}  # job id -> the _by_key keys it is listed under
+        self.load()
+
+    def load(self):
+        self.jobs = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._replay(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+        self.compact()
+
+    def _replay(self, record):
+        op = record["op"]
+        if op == "add":
+            job = Job(record["job"], record["url"], record["dir"], record["quality"])
+            self.jobs[job.id] = job
+            return
+        job = self.jobs.get(record["job"])
+        if job is None:
+            return
+        if op == "items":
+            job.entries = record["entries"]
+            job.states = {}
+        elif op == "item":
+            job.states[record["index"]] = {
+                "state": record["state"],
+                "attempts": record["attempts"],
+                "error": record.get("error"),
+                "permanent": record.get("permanent", False),
+            }
+        elif op == "finish":
+            job.finished = True
+
+    def compact(self):
+        """Rewrite the journal with only the unfinished jobs."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        # Everything they recorded is part of the rewritten journal
+        self._unsaved = []
+        self.jobs = {job_id: job for job_id, job in self.jobs.items() if not job.finished}
+        self._by_key = {}
+        self._keys = {}
+        for job in self.jobs.values():
+            self._index(job)
+        records = []
+        for job in self.jobs.values():
+            records.append({"op": "add", "job": job.id, "url": job.url, "dir": job.download_dir, "quality": job.quality})
+            if job.entries is not None:
+                records.append({"op": "items", "job": job.id, "entries": job.entries})
+            for index, saved in job.states.items():
+                records.append(dict(saved, op="item", job=job.id, index=index))
+        try:
+            write_atomic(self.path, "".join(json.dumps(record) + "\n" for record in records), sync=True)
+        except OSError:
+            pass
+
+    def _append(self, record):
+        self._unsaved.append(record)
+
+    def flush(self):
+        """Write and fsync the records collected since the last flush."""
+        if not self._unsaved:
+            return
+        records, self._unsaved = self._unsaved, []
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json.dumps(record) + "\n" for record in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            pass
+
+    def _index(self, job, keys=None):
+        """List ``job`` under ``keys`` (url_key()s), or under its URL and listed entries."""
+        if keys is None:
+            keys = [job.key] + [entry_key(entry[0], entry[3]) for entry in job.entries or ()]
+        owned = self._keys.setdefault(job.id, set())
+        for key in keys:
+            scoped = (job.download_dir, job.quality, key)
+            if key is not None and scoped not in owned:
+                owned.add(scoped)
+                self._by_key.setdefault(scoped, []).append(job)
+
+    def _unindex(self, job):
+        for scoped in self._keys.pop(job.id, ()):
+            jobs = self._by_key[scoped]
+            jobs.remove(job)
+            if not jobs:
+                del self._by_key[scoped]
+
+    def add(self, url, download_dir, quality):
+        """Queue ``url``, or return the unfinished job that already downloads it.
+
+        Matched by url_key(), also against the listed entries of queued playlists.
+        """
+        job = self._add(url, download_dir, quality)
+        self.flush()
+        return job
+
+    def add_many(self, urls, download_dir, quality):
+        """add() each of ``urls``, journaled with a single fsync. Returns their jobs in order."""
+        jobs = [self._add(url, download_dir, quality) for url in urls]
+        self.flush()
+        return jobs
+
+    def _add(self, url, download_dir, quality):
+        queued = self._by_key.get((download_dir, quality, url_key(url)))
+        if queued:
+            return queued[0]
+        job = Job(uuid.uuid4().hex[:12], url, download_dir, quality)
+        self.jobs[job.id] = job
+        self._index(job)
+        self._append({"op": "add", "job": job.id, "url": url, "dir": download_dir, "quality": quality})
+        return job
+
+    def set_items(self, job, items):
+        job.entries = [[item.video_id, item.url, item.title, item.extractor] for item in items]
+        job.states = {}
+        self._index(job, [entry_key(entry[0], entry[3]) for entry in job.entries])
+        self._append({"op": "items", "job": job.id, "entries": job.entries})
+        for item in items:
+            if item.state != "pending":
+                self.set_item_state(job, item)
+
+    def set_item_state(self, job, item):
+        failure = item.failures[-1] if item.failures else None
+        saved = {
+            "state": self.ITEM_STATES.get(item.state, "pending"),
+            "attempts": item.attempts,
+            "error": failure.error if failure else None,
+            "permanent": bool(failure and failure.permanent),
+        }
+        job.states[item.index] = saved
+        self._append(dict(saved, op="item", job=job.id, index=item.index))
+
+    def finish(self, job):
+        job.finished = True
+        self._unindex(job)
+        self._append({"op": "finish", "job": job.id})
+        if self.pending():
+            self.flush()
+        else:
+            self.compact()
+
+    def listed_keys(self, job):
+        """entry_key()s listed by the other jobs into the same directory and quality.
+
+        Includes jobs finished since the journal was last compacted, so
+        overlapping playlists queued together are each downloaded once.
+        Entries that failed there are left out so they get another chance.
+        """
+        keys = set()
+        for other in self.jobs.values():
+            if other is job or not other.entries:
+                continue
+            if other.download_dir != job.download_dir or other.quality != job.quality:
+                continue
+            for index, entry in enumerate(other.entries, 1):
+                saved = other.states.get(index)
+                if not (saved and saved["state"] == "failed"):
+                    keys.add(entry_key(entry[0], entry[3]))
+        keys.discard(None)
+        return keys
+
+    def pending(self):
+        """Unfinished jobs, oldest first."""
+        return [job for job in self.jobs.values() if not job.finished]
+
+
+def postprocess_task(quality, files):
+    """What has to be done with an item's raw streams: ``(kind, inputs, output)``, or None.
+
+    ``kind`` is "merge" (video and audio into an mp4), "convert" (audio to
+    mp3) or "rename" (a single stream that only needs the format suffix dropped).
+    """
+    files = [path for path in dict.fromkeys(files) if os.path.exists(path)]
+    if not files:
+        return None
+    stem, ext = os.path.splitext(files[0])
+    stem = RE_RAW_SUFFIX.sub("", stem)
+    if quality == "Audio Only":
+        return ("convert", files[:1], stem + ".mp3")
+    if len(files) > 1:
+        return ("merge", files[:2], stem + ".mp4")
+    return ("rename", files, stem + ext)
+
+
+def ffmpeg_cmd(ffmpeg, kind, inputs, output):
+    """The ffmpeg command for a "merge" or "convert" task, reporting progress on stdout."""
+    cmd = [ffmpeg, "-y", "-hide_banner", "-nostats", "-progress", "pipe:1"]
+    for path in inputs:
+        cmd.extend(["-i", path])
+    if kind == "merge":
+        cmd.extend(["-map", "0:v:0", "-map", "1:a:0", "-c", "copy"])
+    else:
+        # -q:a 5 is yt-dlp's default --audio-quality
+        cmd.extend(["-vn", "-c:a", "libmp3lame", "-q:a", "5"])
+    cmd.append(output)
+    return cmd
+
+
+class PostProcessPool:
+    """Merges and converts downloaded streams with ffmpeg, apart from the download slots.
+
+    A download hands its raw streams to submit() and frees its slot; up to
+    ``workers`` ffmpeg processes (one per CPU core by default) work through
+    the queue meanwhile. Results are posted to ``output_queue`` as
+    ``__POSTPROCESS_START__``, ``__POSTPROCESS_PROGRESS__`` and
+    ``__POSTPROCESS_END__`` messages. A failing task is tried ``attempts``
+    times; the raw streams are kept if it still fails.
+    """
+
+    def __init__(self, output_queue, ffmpeg="ffmpeg", workers=0, archive=None, attempts=POSTPROCESS_ATTEMPTS):
+        self.output_queue = output_queue
+        self.ffmpeg = ffmpeg
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        # Items are only recorded as downloaded once their files are final
+        self.archive = archive
+        # StagingArea the finished files are handed to, if downloading into a scratch folder
+        self.staging = None
+        self.attempts = attempts
+        self.tasks = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, item, task):
+        """Queue ``task`` (from postprocess_task()) for ``item``."""
+        with self._lock:
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self.tasks.put((item, task))
+
+    def join(self):
+        """Wait for every queued task to finish, then stop the workers."""
+        self.tasks.join()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self.tasks.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            entry = self.tasks.get()
+            try:
+                if entry is None:
+                    return
+                self._process(*entry)
+            finally:
+                self.tasks.task_done()
+
+    def _process(self, item, task):
+        kind, inputs, output = task
+        error = None
+        for attempt in range(1, self.attempts + 1):
+            self.output_queue.put(("__POSTPROCESS_START__", item, kind, attempt))
+            try:
+                error = self._run(item, kind, inputs, output)
+            except FileNotFoundError:
+                error = "ffmpeg not found. Please install it first."
+                break
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                break
+
+        if error is None:
+            if kind != "rename":
+                for path in inputs:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            if self.archive:
+                self.archive.add(item)
+        item.returncode = 0 if error is None else 1
+        self.output_queue.put(("__POSTPROCESS_END__", item, error))
+        if error is None and self.staging:
+            self.staging.submit(item)
+
+    def _run(self, item, kind, inputs, output):
+        """Run one task. Returns None on success, otherwise an error message."""
+        if kind == "rename":
+            os.replace(inputs[0], output)
+            return None
+
+        # Written under a temporary name so a half-written file never looks finished
+        stem, ext = os.path.splitext(output)
+        partial = f"{stem}.temp{ext}"
+        process = subprocess.Popen(
+            ffmpeg_cmd(self.ffmpeg, kind, inputs, partial),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            errors="replace",
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+        )
+        duration = None
+        reported = -1
+        messages = deque(maxlen=3)
+        for line in process.stdout:
+            line = line.strip()
+            key, sep, value = line.partition("=")
+            if sep and key.isidentifier():
+                # -progress output; out_time_ms is in microseconds too
+                if key in ("out_time_us", "out_time_ms") and duration:
+                    seconds = _number(value)
+                    pct = int(min(seconds / 1e6 * 100 / duration, 100)) if seconds is not None else -1
+                    if pct > reported:
+                        reported = pct
+                        self.output_queue.put(("__POSTPROCESS_PROGRESS__", item, float(pct)))
+                continue
+            if duration is None:
+                m = RE_FFMPEG_DURATION.search(line)
+                if m:
+                    duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+            if line:
+                messages.append(line)
+        process.wait()
+
+        if process.returncode == 0:
+            try:
+                os.replace(partial, output)
+                return None
+            except OSError as e:
+                return f"Cannot move {partial} into place: {e}"
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        detail = messages[-1] if messages else "no output"
+        return f"ffmpeg exited with code {process.returncode}: {detail}"
+
+
+def _same_device(path, other):
+    return os.stat(path).st_dev == os.stat(other).st_dev
+
+
+def move_file(src, directory):
+    """Move ``src`` into ``directory``; the file appears there complete or not at all."""
+    name = os.path.basename(src)
+    dst = os.path.join(directory, name)
+    if _same_device(src, directory):
+        os.replace(src, dst)
+        return dst
+    # Copied under a name ContentIndex and yt-dlp ignore, then renamed in place
+    partial = os.path.join(directory, f".{name}.moving")
+    try:
+        shutil.copy2(src, partial)
+        os.replace(partial, dst)
+    except OSError:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    os.remove(src)
+    return dst
+
+
+class StagingArea:
+    """A job's folder under "scratch_dir", where its files are downloaded and post-processed.
+
+    Job folders live in a STAGING_SUBDIR of their own and carry a
+    STAGING_MARKER file; nothing else in "scratch_dir" is ever touched, as
+    it may well be a folder such as C:\\Temp that holds other data.
+
+    Each finished item's files are moved into the download directory by one
+    background thread, so the (possibly slow, networked) download directory
+    only sees a single sequential write per file. A failed move is posted as
+    ``__MOVE_FAILED__`` and the file is left in the scratch folder.
+    """
+
+    def __init__(self, scratch_dir, job_id, download_dir, output_queue, min_free=1024 ** 3):
+        self.scratch_dir = Path(scratch_dir)
+        self.directory = self.scratch_dir / STAGING_SUBDIR / job_id
+        self.download_dir = download_dir
+        self.output_queue = output_queue
+        self.min_free = min_free
+        self.failed = False
+        self.tasks = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cleanup(scratch_dir, keep):
+        """Delete the scratch folders of jobs not in ``keep`` (job ids).
+
+        Partial downloads of jobs that are gone can never be resumed. Only
+        folders with a STAGING_MARKER are considered. A folder that still holds
+        finished files is left alone; its path is returned.
+        """
+        kept = []
+        try:
+            entries = [
+                entry for entry in os.scandir(Path(scratch_dir) / STAGING_SUBDIR)
+                if entry.is_dir(follow_symlinks=False) and entry.name not in keep
+            ]
+        except OSError:
+            return kept
+        for entry in entries:
+            try:
+                names = os.listdir(entry.path)
+            except OSError:
+                continue
+            if STAGING_MARKER not in names:
+                continue
+            if any(RE_INDEXED_NAME.search(name) or RE_RAW_NAME.search(name) for name in names):
+                kept.append(entry.path)
+            else:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return kept
+
+    def prepare(self):
+        """Create the folder and check free space. Returns a problem description, or None.
+
+        The problem is ``(fatal, message)``: fatal when the download directory
+        itself is short of space, otherwise the scratch folder cannot be used.
+        """
+        try:
+            if shutil.disk_usage(self.download_dir).free < self.min_free:
+                return True, f"Not enough free space in {self.download_dir} (less than {format_size(self.min_free)})"
+        except OSError:
+            pass
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / STAGING_MARKER).touch()
+            if shutil.disk_usage(self.directory).free < self.min_free:
+                return False, f"Not enough free space in {self.scratch_dir} (less than {format_size(self.min_free)})"
+        except OSError as e:
+            return False, f"Cannot use scratch folder {self.scratch_dir}: {e}"
+        return None
+
+    def files(self, item=None, raw=False):
+        """Finished files in the folder: those of ``item``, or all of them.
+
+        With ``raw``, also complete raw streams that were not post-processed.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            m = RE_INDEXED_NAME.search(name) or (raw and RE_RAW_NAME.search(name))
+            if m and (item is None or m.group(1) == item.video_id):
+                found.append(str(self.directory / name))
+        return found
+
+    def submit(self, item):
+        """Move the finished files of ``item`` (or, with None, every finished file) in the background."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+        self.tasks.put(item)
+
+    def join(self):
+        """Wait for every queued move, then remove the folder unless something was left behind.
+
+        Finished files nobody submitted are moved too, and so are raw streams
+        whose post-processing failed, as they would be without a scratch
+        folder. Partial downloads are discarded.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self.tasks.put(StopIteration)
+            thread.join()
+        self._move(None, raw=True)
+        if not self.failed:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _worker(self):
+        while True:
+            item = self.tasks.get()
+            if item is StopIteration:
+                return
+            self._move(item)
+
+    def _move(self, item, raw=False):
+        # Without an id every finished file is moved, e.g. ones left by an interrupted run
+        for path in self.files(item if item is not None and item.video_id else None, raw):
+            try:
+                move_file(path, self.download_dir)
+            except OSError as e:
+                self.failed = True
+                if item is not None:
+                    item.returncode = 1
+                self.output_queue.put(("__MOVE_FAILED__", item, f"{os.path.basename(path)}: {e}"))
+
+
+class DownloadScheduler:
+    """Expand a URL into its playlist entries and download them with a bounded worker pool.
+
+    All results are posted to ``output_queue`` as tagged tuples so the UI thread
+    can consume them without touching the worker threads.
+    """
+
+    def __init__(
+        self,
+        output_queue,
+        download_dir,
+        quality,
+        ytdlp="yt-dlp",
+        workers=3,
+        retry=None,
+        structured=True,
+        archive=None,
+        cache=None,
+        refresh=False,
+        api_pool=None,
+        budget=None,
+        hosts=None,
+        tuner=None,
+        postprocessor=None,
+        index=None,
+        exclude=None,
+        info_cache=None,
+        staging=None,
+        mux=None,
+    ):
+        self.output_queue = output_queue
+        self.download_dir = download_dir
+        # Where yt-dlp writes: download_dir, or the job's StagingArea folder
+        self.output_dir = download_dir
+        self.staging = staging
+        self.quality = quality
+        self.ytdlp = ytdlp
+        self.structured = structured
+        self.archive = archive
+        # ContentIndex of finished files, checked before downloading; None to skip the check
+        self.index = index
+        # entry_key()s of videos another queued job already downloads
+        self.exclude = exclude or set()
+        # InfoCache that lets retries skip extraction; None to always extract
+        self.info_cache = info_cache
+        self.cache = cache
+        # Ignore any cached listing and fetch a fresh one
+        self.refresh = refresh
+        # Warm yt_dlp worker processes; None means one yt-dlp subprocess per item
+        self.api_pool = api_pool
+        # OutputMultiplexer reading those subprocesses; None to read each on its worker thread
+        self.mux = mux
+        # Shared bandwidth budget and per-site caps; None for no limits
+        self.budget = budget
+        self.hosts = hosts
+        self.tuner = tuner
+        # PostProcessPool that merges/converts raw streams; None lets yt-dlp do it inline
+        self.postprocessor = postprocessor
+        self.workers = max(1, workers)
+        self.retry = retry or RetryPolicy()
+
+        # Retry pipeline state, guarded by _retry_cond
+        self._retry_cond = threading.Condition()
+        self._retry_heap = []  # (due time, tie-breaker, item)
+        self._retry_counter = itertools.count()
+        self._retries_running = 0
+        self._main_done = False
+
+        # Latest progress event per item; intermediate ones are dropped
+        self._progress_lock = threading.Lock()
+        self._latest_progress = {}
+
+    def build_cmd(self, url, for_api=False, rate=None, extra=(), load_info=None, save_info=None):
+        """Build the yt-dlp command for a given URL.
+
+        With ``for_api`` the executable is left out and progress output is
+        disabled, since warm workers report progress through hooks instead;
+        so are colours, which would hide the "ERROR:" prefix from classify_line().
+        ``rate`` is the download rate limit in bytes/sec and ``extra`` any
+        further yt-dlp options. ``load_info`` is an info JSON file to download
+        from instead of extracting ``url``; ``save_info`` is where to write it.
+        """
+        template = RAW_OUTPUT_TEMPLATE if self.postprocessor else OUTPUT_TEMPLATE
+        # --continue picks up .part files left behind by an interrupted run
+        cmd = [self.ytdlp, "--newline", "--continue", "-o", os.path.join(self.output_dir, template)]
+        if for_api:
+            cmd = cmd[1:] + ["--no-progress", "--no-colors"]
+        elif self.structured:
+            cmd.extend(["--progress-template", PROGRESS_TEMPLATE, "--progress-template", POSTPROCESS_TEMPLATE])
+        # Raw streams are recorded by the post-processing pool once they are merged
+        if self.archive and not self.postprocessor:
+            cmd.extend(["--download-archive", str(self.archive.path)])
+        if rate:
+            cmd.extend(["--limit-rate", str(int(rate))])
+        cmd.extend(extra)
+        options = RAW_QUALITY_OPTIONS if self.postprocessor else QUALITY_OPTIONS
+        cmd.extend(options.get(self.quality, []))
+        if load_info:
+            cmd.extend(["--load-info-json", str(load_info)])
+            return cmd
+        if save_info:
+            # yt-dlp swaps the media extension for ".info.json"
+            stem = str(save_info)[:-len(".info.json")]
+            cmd.extend(["--write-info-json", "-o", f"infojson:{stem}.%(ext)s"])
+        cmd.append(url)
+        return cmd
+
+    def expand(self, url):
+        """List the entries of a playlist without downloading them.
+
+        A plain video URL expands to itself. If the listing fails the URL is
+        returned as a single item so yt-dlp can report the real error.
+        Listings are served from ``cache`` when fresh, unless ``refresh`` is set.
+        """
+        entries = None
+        if self.cache and not self.refresh:
+            cached = self.cache.get(url)
+            if cached:
+                entries, age = cached
+                self.output_queue.put((
+                    "__LOG__", f"Using cached playlist listing ({len(entries)} entries, {age / 60:.0f} min old)\n"
+                ))
+
+        if entries is None:
+            entries = self._list_entries(url)
+
+        # A video listed twice (e.g. in two sections of a channel) is downloaded once
+        seen = set()
+        unique = []
+        for entry in entries:
+            key = entry_key(entry[0], entry[3])
+            if key is None or key not in seen:
+                seen.add(key)
+                unique.append(entry)
+        entries = unique
+
+        items = [
+            PlaylistItem(index, entry_url, video_id, title, extractor)
+            for index, (video_id, entry_url, title, extractor) in enumerate(entries, 1)
+        ]
+        if not items:
+            items.append(PlaylistItem(1, url))
+        return items
+
+    def _list_entries(self, url):
+        cmd = [self.ytdlp, "--flat-playlist", "--ignore-errors", "--print", EXPAND_TEMPLATE, url]
+        entries = []
+        process = popen_ytdlp(cmd)
+        for line in process.stdout:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 4 and parts[1].startswith(("http://", "https://")):
+                video_id, entry_url, title, extractor = parts
+                entries.append([video_id, entry_url, title, None if extractor == "NA" else extractor])
+            elif line.strip():
+                self.output_queue.put(("__LOG__", line))
+        process.wait()
+
+        # Only complete listings are cached; a partial one would hide entries until it expires
+        if self.cache and entries and process.returncode == 0:
+            self.cache.put(url, entries)
+        return entries
+
+    def run(self, url, items=None):
+        """Expand ``url`` and download every entry. Posts ``__DONE__`` when finished.
+
+        ``items`` replaces the listing when resuming a job; only its pending
+        items are downloaded.
+        """
+        try:
+            if items is None:
+                items = self.expand(url)
+        except FileNotFoundError:
+            self.output_queue.put("Error: yt-dlp not found. Please install it first.\n")
+            self.output_queue.put(("__DONE__", 1))
+            return
+        except Exception as e:
+            self.output_queue.put(f"Error: {e}\n")
+            self.output_queue.put(("__DONE__", 1))
+            return
+
+        pending = [item for item in items if item.state == "pending"]
+        if self.exclude:
+            for item in pending:
+                if DownloadArchive.key(item) in self.exclude:
+                    item.state = "skipped"
+                    item.progress = 100.0
+                    item.returncode = 0
+                    item.detail = "Also in another queued download"
+            merged = sum(1 for item in pending if item.state == "skipped")
+            if merged:
+                self.output_queue.put(("__LOG__", f"{merged} item(s) are also in another queued download, skipping them\n"))
+            pending = [item for item in pending if item.state == "pending"]
+        if self.archive:
+            self.archive.load()
+            for item in pending:
+                if item in self.archive:
+                    item.state = "skipped"
+                    item.progress = 100.0
+                    item.returncode = 0
+            pending = [item for item in pending if item.state == "pending"]
+        if self.index and pending:
+            self.index.refresh(self.download_dir)
+            audio = self.quality == "Audio Only"
+            for item in pending:
+                if self.index.find(self.download_dir, item.video_id, audio, item.title):
+                    item.state = "skipped"
+                    item.progress = 100.0
+                    item.returncode = 0
+                    item.detail = "Already in the download folder"
+            found = sum(1 for item in pending if item.state == "skipped")
+            if found:
+                self.output_queue.put(("__LOG__", f"{found} item(s) already in the download folder, skipping them\n"))
+            pending = [item for item in pending if item.state == "pending"]
+
+        if self.staging:
+            problem = self.staging.prepare()
+            if problem and problem[0]:
+                self.output_queue.put(f"Error: {problem[1]}\n")
+                self.output_queue.put(("__DONE__", 1))
+                return
+            if problem:
+                self.output_queue.put(("__LOG__", f"{problem[1]}, downloading straight into the download folder\n"))
+                self.staging = None
+            else:
+                self.output_dir = str(self.staging.directory)
+                if self.postprocessor:
+                    self.postprocessor.staging = self.staging
+                # Finished files an interrupted run did not get to move
+                self.staging.submit(None)
+
+        self.output_queue.put(("__PLAYLIST__", items))
+        if pending:
+            self.run_items(pending)
+        if self.postprocessor:
+            self.postprocessor.join()
+        if self.staging:
+            self.staging.join()
+        # Items restored as failed count too, not just the ones downloaded now
+        self.output_queue.put(("__DONE__", 0 if all(item.returncode == 0 for item in items) else 1))
+
+    def slot_names(self, item_count):
+        """Display names for the worker slots used when downloading ``item_count`` items."""
+        names = [f"Slot {n}" for n in range(1, min(self.workers, item_count) + 1)]
+        names.extend(f"Retry {n}" for n in range(1, self.retry.concurrency + 1))
+        return names
+
+    def run_items(self, items):
+        """Download ``items`` and retry failures, returning once every item is settled.
+
+        Returns 0 if every item succeeded, otherwise 1.
+
+        Main workers take items in order; failures are handed to a separate pool
+        of retry workers which wait out each item's backoff before re-running it.
+        """
+        pending = queue.Queue()
+        for item in items:
+            pending.put(item)
+
+        with self._retry_cond:
+            self._main_done = False
+
+        count = min(self.workers, len(items))
+        threads = [
+            threading.Thread(target=self._worker, args=(slot, pending), daemon=True)
+            for slot in range(count)
+        ]
+        retry_threads = [
+            threading.Thread(target=self._retry_worker, args=(count + n,), daemon=True)
+            for n in range(self.retry.concurrency)
+        ]
+        for thread in threads + retry_threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self._retry_cond:
+            self._main_done = True
+            self._retry_cond.notify_all()
+        for thread in retry_threads:
+            thread.join()
+
+        return 0 if all(item.returncode == 0 for item in items) else 1
+
+    def _worker(self, slot, pending):
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            self.run_item(item, slot, queued=pending.qsize())
+
+    def _retry_worker(self, slot):
+        while True:
+            with self._retry_cond:
+                while True:
+                    if not self._retry_heap:
+                        if self._main_done and self._retries_running == 0:
+                            # Wake the other retry workers so they can exit too
+                            self._retry_cond.notify_all()
+                            return
+                        self._retry_cond.wait()
+                        continue
+                    if not (self.retry.start_early or self._main_done):
+                        self._retry_cond.wait()
+                        continue
+                    due = self._retry_heap[0][0]
+                    now = time.monotonic()
+                    if due > now:
+                        self._retry_cond.wait(due - now)
+                        continue
+                    item = heapq.heappop(self._retry_heap)[2]
+                    self._retries_running += 1
+                    break
+
+            try:
+                self.run_item(item, slot)
+            finally:
+                with self._retry_cond:
+                    self._retries_running -= 1
+                    self._retry_cond.notify_all()
+
+    def _schedule_retry(self, item):
+        item.max_attempts = self.retry.attempts_for(item.error_category)
+        delay = self.retry.delay(item.attempts, item.error_category)
+        with self._retry_cond:
+            heapq.heappush(self._retry_heap, (time.monotonic() + delay, next(self._retry_counter), item))
+            self._retry_cond.notify_all()
+        self.output_queue.put(("__RETRY_SCHEDULED__", item, delay, item.error_category or "unknown"))
+
+    def take_progress(self):
+        """Return and clear the latest progress event of every item, keyed by item."""
+        with self._progress_lock:
+            latest, self._latest_progress = self._latest_progress, {}
+        return latest
+
+    def _post_line(self, item, line, event=None):
+        event = self._note_line(item, line, event)
+        if event is not False:
+            self.output_queue.put(("__ITEM_LINE__", item, line, event))
+
+    def _note_line(self, item, line, event=None):
+        """Classify ``line`` and update ``item`` from it.
+
+        Returns the line's event (None if unrecognised), or False for progress,
+        which is coalesced and not queued with the other output.
+        """
+        if event is None:
+            event = classify_line(line)
+        if event:
+            if event[0] == "progress":
+                # Coalesced: the UI only ever needs the most recent one
+                with self._progress_lock:
+                    self._latest_progress[item] = event
+                return False
+            category = classify_error(event[1]) if event[0] in ("error", "warning") else None
+            if event[0] == "error":
+                item.last_error = event[1]
+                item.error_category = category
+            elif event[0] in ("destination", "already_downloaded"):
+                item.raw_files.append(event[1])
+            if category == "rate_limited" and self.hosts and not item.throttled:
+                item.throttled = True
+                key = HostLimiter.key(item)
+                limit = self.hosts.throttle(key)
+                if limit is not None:
+                    self.output_queue.put((
+                        "__LOG__", f"Throttled by {key}, downloading at most {limit} at a time from it\n"
+                    ))
+        return event
+
+    def _run_multiplexed(self, item, cmd):
+        """Run a yt-dlp subprocess whose output is read by the shared multiplexer. Returns its exit code."""
+        exited = threading.Event()
+        returncode = []
+
+        def on_lines(lines):
+            batch = []
+            for line in lines:
+                event = self._note_line(item, line)
+                if event is not False:
+                    batch.append((line, event))
+            if batch:
+                self.output_queue.put(("__ITEM_LINES__", item, batch))
+
+        def on_exit(code):
+            returncode.append(code)
+            exited.set()
+
+        self.mux.add(popen_ytdlp(cmd, text=False), on_lines, on_exit)
+        exited.wait()
+        return returncode[0]
+
+    def _run_api(self, item, slot, cmd_args):
+        """Download ``item`` on the slot's warm worker process."""
+        conn = self.api_pool.connection(slot)
+        try:
+            conn.send(self.build_cmd(item.url, for_api=True, **cmd_args))
+            while True:
+                kind, payload = conn.recv()
+                if kind == "line":
+                    self._post_line(item, payload)
+                elif kind == "event":
+                    self._post_line(item, "", payload)
+                else:
+                    return payload
+        except (EOFError, OSError):
+            self.api_pool.discard(slot)
+            self._post_line(item, "Error: yt-dlp worker process exited unexpectedly\n")
+            return 1
+
+    def run_item(self, item, slot, queued=0):
+        """Run one yt-dlp process for ``item``, streaming its output tagged with the item.
+
+        Failures are queued for another attempt as their error category's
+        retry policy allows. ``queued`` is the number of items still waiting for a main worker.
+        """
+        host = HostLimiter.key(item)
+        if self.hosts:
+            self.hosts.acquire(host)
+        rate = None
+        if self.budget:
+            live = self.api_pool.rate_limit(slot) if self.api_pool else None
+            rate = self.budget.acquire(item, queued, live)
+        item.tuning, extra = self.tuner.options(host) if self.tuner else (None, [])
+        cmd_args = {"rate": rate, "extra": extra}
+        if self.info_cache:
+            # Retries and resumed items reuse what an earlier attempt extracted. A resumed
+            # item's attempts start from 0 again, so the cache is checked on every attempt.
+            cmd_args["load_info"] = self.info_cache.get(item)
+            if cmd_args["load_info"]:
+                self.output_queue.put(("__LOG__", f"Reusing extracted info for {item.video_id}\n"))
+            else:
+                cmd_args["save_info"] = self.info_cache.path(item)
+
+        item.attempts += 1
+        item.last_error = None
+        item.error_category = None
+        item.throttled = False
+        item.raw_files = []
+        item.postprocess = None
+        self.output_queue.put(("__ITEM_START__", item, slot))
+        try:
+            if self.api_pool:
+                returncode = self._run_api(item, slot, cmd_args)
+            elif self.mux:
+                returncode = self._run_multiplexed(item, self.build_cmd(item.url, **cmd_args))
+            else:
+                process = popen_ytdlp(self.build_cmd(item.url, **cmd_args))
+                for line in process.stdout:
+                    self._post_line(item, line)
+                process.wait()
+                returncode = process.returncode
+        except FileNotFoundError:
+            self._post_line(item, "Error: yt-dlp not found. Please install it first.\n")
+            # Retrying cannot help when the executable is missing
+            item.attempts = self.retry.max_attempts
+            returncode = 1
+        except Exception as e:
+            self._post_line(item, f"Error: {e}\n")
+            returncode = 1
+        finally:
+            if self.budget:
+                self.budget.release(item)
+            if self.hosts:
+                raised = self.hosts.release(host, item.throttled)
+                if raised:
+                    self.output_queue.put(("__LOG__", f"{host} is no longer throttling, allowing {raised} at a time\n"))
+
+        if self.info_cache:
+            if returncode == 0 or cmd_args.get("load_info"):
+                # Not needed again, or possibly why this attempt failed: extract afresh next time
+                self.info_cache.discard(item)
+            elif cmd_args.get("save_info"):
+                self.info_cache.added(item)
+        if returncode == 0 and self.postprocessor:
+            item.postprocess = postprocess_task(self.quality, item.raw_files)
+        # Not done until the post-processing pool has finished with it
+        item.returncode = None if item.postprocess else returncode
+        with self._progress_lock:
+            self._latest_progress.pop(item, None)
+        self.output_queue.put(("__ITEM_END__", item, slot, returncode))
+        if item.postprocess:
+            self.postprocessor.submit(item, item.postprocess)
+        elif returncode != 0 and self.retry.should_retry(item):
+            self._schedule_retry(item)
+        elif returncode == 0 and self.staging:
+            self.staging.submit(item)
+        return returncode
+
+
+def item_metrics(item):
+    """Timings, bytes and throughput of one item, for the metrics summary."""
+    return {
+        "index": item.index,
+        "id": item.video_id,
+        "title": item.title,
+        "state": item.state,
+        "attempts": item.attempts,
+        "bytes": item.transfer_bytes,
+        "throughput": round(item.timed_bytes / item.transfer_seconds) if item.transfer_seconds else None,
+        "phases": {phase: round(seconds, 3) for phase, seconds in item.phase_times.items()},
+    }
+
+
+def job_metrics(items, elapsed):
+    """Aggregate counters for a job's items after ``elapsed`` seconds."""
+    states = Counter(item.state for item in items)
+    attempted = [item for item in items if item.attempts]
+    retried = sum(1 for item in attempted if item.attempts > 1)
+    permanent = sum(1 for item in items if item.state == "failed" and any(f.permanent for f in item.failures))
+    transfer_bytes = sum(item.transfer_bytes for item in items)
+    timed_bytes = sum(item.timed_bytes for item in items)
+    transfer_seconds = sum(item.transfer_seconds for item in items)
+    phases = Counter()
+    categories = Counter()
+    for item in items:
+        phases.update(item.phase_times)
+        if item.state == "failed":
+            categories.update(failure.category for failure in item.failures[-1:])
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "items": len(items),
+        "states": {state: states[state] for state in ("done", "skipped", "failed", "waiting", "downloading", "pending")},
+        "attempts": sum(item.attempts for item in items),
+        "items_per_hour": round(states["done"] * 3600 / elapsed, 2) if elapsed else 0.0,
+        "retry_rate": round(retried / len(attempted), 4) if attempted else 0.0,
+        "permanent_failure_rate": round(permanent / len(attempted), 4) if attempted else 0.0,
+        "bytes": int(transfer_bytes),
+        "throughput": round(timed_bytes / transfer_seconds) if transfer_seconds else 0,
+        "phase_seconds": {phase: round(phases[phase], 3) for phase in PHASES},
+        "failures_by_category": dict(categories),
+    }
+
+
+def format_prometheus(metrics):
+    """The job_metrics() counters in the Prometheus text exposition format."""
+    lines = []
+
+    def gauge(name, help_text, samples):
+        lines.append(f"# HELP ytdlp_gui_{name} {help_text}")
+        lines.append(f"# TYPE ytdlp_gui_{name} gauge")
+        for labels, value in samples:
+            lines.append(f"ytdlp_gui_{name}{labels} {value}")
+
+    gauge("job_items", "Items in the last job by state.", [
+        (f'{{state="{state}"}}', count) for state, count in metrics["states"].items()
+    ])
+    gauge("job_attempts", "yt-dlp runs in the last job, retries included.", [("", metrics["attempts"])])
+    gauge("job_duration_seconds", "Wall time of the last job.", [("", metrics["elapsed_seconds"])])
+    gauge("job_items_per_hour", "Items downloaded per hour in the last job.", [("", metrics["items_per_hour"])])
+    gauge("job_retry_rate", "Share of attempted items that needed a retry.", [("", metrics["retry_rate"])])
+    gauge("job_permanent_failure_rate", "Share of attempted items that failed permanently.", [
+        ("", metrics["permanent_failure_rate"])
+    ])
+    gauge("job_bytes", "Bytes downloaded in the last job.", [("", metrics["bytes"])])
+    gauge("job_throughput_bytes_per_second", "Average download throughput in the last job.", [
+        ("", metrics["throughput"])
+    ])
+    gauge("job_phase_seconds", "Item time spent per phase in the last job, summed over items.", [
+        (f'{{phase="{phase}"}}', seconds) for phase, seconds in metrics["phase_seconds"].items()
+    ])
+    gauge("job_failures", "Failed items in the last job by error category.", [
+        (f'{{category="{category}"}}', count) for category, count in metrics["failures_by_category"].items()
+    ])
+    gauge("job_finished_timestamp_seconds", "When the last job finished.", [("", round(time.time()))])
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(job, items, metrics, directory=None):
+    """Write the job summary as ``last_job.json`` and ``yt_dlp_gui.prom`` in ``directory``.
+
+    Both files are replaced atomically, so the .prom file can be read by a
+    node_exporter textfile collector at any time.
+    """
+    directory = Path(directory or METRICS_DIR)
+    summary = {
+        "job": job.id,
+        "url": job.url,
+        "finished": round(time.time(), 3),
+        "summary": metrics,
+        "items": [item_metrics(item) for item in items],
+    }
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        write_atomic(directory / "last_job.json", json.dumps(summary, indent=2))
+        write_atomic(directory / "yt_dlp_gui.prom", format_prometheus(metrics))
+    except OSError:
+        pass
+
+
+def item_summary(item):
+    """A JSON-serializable snapshot of an item, for listeners that leave the process."""
+    return {
+        "index": item.index,
+        "url": item.url,
+        "id": item.video_id,
+        "title": item.title,
+        "state": item.state,
+        "progress": round(item.progress, 1),
+        "detail": item.detail,
+        "attempts": item.attempts,
+    }
+
+
+class DownloadEngine:
+    """Runs download jobs and reports them to subscribed listeners. Has no UI dependencies.
+
+    Scheduler threads post raw output to a queue; pump() drains it on the
+    caller's thread, updates the per-item state and calls every listener as
+    ``listener(event, data)``. Events are:
+
+    - ``job_started``: ``{"url", "job", "resumed"}``
+    - ``log``: ``{"text"}``, all log text gathered during one pump
+    - ``playlist``: ``{"total", "pending"}``, once the URL has been expanded
+    - ``item_started``: ``{"item", "slot"}``
+    - ``item_updated``: ``{"item"}``, at most once per item per pump
+    - ``item_finished``: ``{"item", "slot"}``
+    - ``retry_scheduled``: ``{"item", "delay", "category"}``
+    - ``postprocess_started``: ``{"item", "kind", "attempt"}``, with "separate_postprocessing"
+    - ``postprocess_updated``: ``{"item"}``, at most once per item per pump
+    - ``postprocess_finished``: ``{"item", "error"}``, error None on success
+    - ``error``: ``{"message"}``, for errors not tied to an item
+    - ``job_finished``: ``{"return_code", "metrics"}``, metrics as from job_metrics()
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.listeners = []
+        self.output_queue = queue.Queue()
+        self.scheduler = None
+        self.api_pool = None
+        self.mux = None
+        self.playlist_cache = None
+        self.jobs = JobQueue(JOBS_FILE)
+        self.job = None
+        self.index = ContentIndex(CONTENT_INDEX_FILE)
+        # Kept across jobs so a throttling site stays slowed down
+        self.hosts = HostLimiter(int(config.get("max_per_host", 0)))
+        # What auto-tune learns is saved under "tuning" in config.json, keyed by extractor
+        self.tuner = FragmentTuner(config.setdefault("tuning", {})) if config.get("auto_tune") else None
+        self.running = False
+        self.return_code = 0
+        self.started_at = None
+
+        # Per-item tracking for the current job
+        self.items = []
+        self.active_items = {}  # slot -> PlaylistItem
+        self.postprocessing = {}  # items being merged/converted -> None, in start order
+        self.progress_total = 0.0  # sum of item progress, for the aggregate progress
+        self.failed_videos = []  # Failure records
+        # Repeated lines are counted, not stored again; bounded to log_max_lines distinct ones
+        self.errors_and_warnings = MessageCounts(int(config.get("log_max_lines", 5000)))
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _emit(self, event, **data):
+        for listener in self.listeners:
+            listener(event, data)
+
+    @property
+    def progress(self):
+        """Aggregate progress of the current job, 0-100."""
+        return self.progress_total / len(self.items) if self.items else 0.0
+
+    def counts(self):
+        """Number of items in each state."""
+        return Counter(item.state for item in self.items)
+
+    def enqueue(self, url, download_dir, quality):
+        """Add ``url`` to the persistent job queue and return its Job."""
+        return self.jobs.add(url, download_dir, quality)
+
+    def enqueue_many(self, urls, download_dir, quality):
+        """enqueue() each of ``urls`` at once; returns their Jobs in order."""
+        return self.jobs.add_many(urls, download_dir, quality)
+
+    def pending_jobs(self):
+        """Queued jobs still to be started, including ones left unfinished by an earlier run."""
+        return [job for job in self.jobs.pending() if job is not self.job]
+
+    def start(self, job, workers=3, skip_downloaded=True, refresh=False):
+        """Start downloading ``job`` in the background. Progress is reported through pump().
+
+        A job that was listed before is resumed from its journaled state.
+        """
+        self.items = []
+        self.active_items.clear()
+        self.postprocessing.clear()
+        self.progress_total = 0.0
+        self.failed_videos = []
+        self.errors_and_warnings.clear()
+        self.return_code = 0
+        self.running = True
+        self.job = job
+        self.started_at = time.monotonic()
+        # Picks up edits to the rules file without a restart
+        load_error_rules()
+
+        archive = None
+        if skip_downloaded:
+            ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+            archive = DownloadArchive(archive_path(job.download_dir, job.quality))
+
+        self.scheduler = DownloadScheduler(
+            self.output_queue,
+            job.download_dir,
+            job.quality,
+            ytdlp=self.config.get("ytdlp_path", "yt-dlp"),
+            workers=workers,
+            retry=RetryPolicy.from_config(self.config),
+            structured=bool(self.config.get("structured_progress", True)),
+            archive=archive,
+            cache=self._get_playlist_cache(),
+            refresh=refresh,
+            api_pool=self._get_api_pool(),
+            budget=self._get_budget(workers),
+            hosts=self.hosts,
+            tuner=self.tuner,
+            postprocessor=self._get_postprocessor(archive),
+            index=self.index if skip_downloaded else None,
+            exclude=self.jobs.listed_keys(job) if skip_downloaded else None,
+            info_cache=self._get_info_cache(),
+            staging=self._get_staging(job),
+            mux=self._get_mux(),
+        )
+        resumed = job.entries is not None
+        items = job.restore_items() if resumed else None
+        self._emit("job_started", url=job.url, job=job.id, resumed=resumed)
+        thread = threading.Thread(target=self.scheduler.run, args=(job.url, items), daemon=True)
+        thread.start()
+
+    def _get_playlist_cache(self):
+        """The shared PlaylistCache, with the current "playlist_cache_*" settings."""
+        if self.playlist_cache is None:
+            self.playlist_cache = PlaylistCache(PLAYLIST_CACHE_FILE)
+        self.playlist_cache.ttl = float(self.config.get("playlist_cache_ttl_hours", 6)) * 3600
+        self.playlist_cache.max_entries = max(1, int(self.config.get("playlist_cache_max_entries", 50)))
+        return self.playlist_cache
+
+    def _get_budget(self, workers):
+        """The bandwidth budget from "max_download_rate" (e.g. "8M", "8MiB" or bytes/sec), or None."""
+        rate = self.config.get("max_download_rate")
+        if isinstance(rate, str):
+            if not rate.strip():
+                return None
+            total = parse_rate(rate)
+            if total is None:
+                self._emit("log", text=(
+                    f"max_download_rate {rate!r} is not a rate such as \"8M\" or \"500K\", "
+                    "downloading without a limit\n"
+                ))
+        else:
+            total = rate
+        return BandwidthBudget(total, workers) if total else None
+
+    def _get_staging(self, job):
+        """A StagingArea for ``job`` under "scratch_dir", or None if that is not set.
+
+        Also removes what jobs that are no longer queued left in the scratch folder.
+        """
+        scratch_dir = self.config.get("scratch_dir")
+        if not scratch_dir:
+            return None
+        keep = {pending.id for pending in self.jobs.pending()}
+        for path in StagingArea.cleanup(scratch_dir, keep):
+            self._emit("log", text=f"Finished downloads were left in {path}, move them manually\n")
+        min_free = float(self.config.get("min_free_space_mb", 1024)) * 1024 ** 2
+        return StagingArea(scratch_dir, job.id, job.download_dir, self.output_queue, int(min_free))
+
+    def _get_info_cache(self):
+        """The InfoCache sized by "info_cache_max_mb", or None if that is 0."""
+        max_mb = float(self.config.get("info_cache_max_mb", 200))
+        if max_mb <= 0:
+            return None
+        try:
+            INFO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            return None
+        return InfoCache(INFO_CACHE_DIR, int(max_mb * 1024 ** 2))
+
+    def _get_postprocessor(self, archive):
+        """A PostProcessPool if "separate_postprocessing" is enabled, else None."""
+        if not self.config.get("separate_postprocessing"):
+            return None
+        return PostProcessPool(
+            self.output_queue,
+            ffmpeg=self.config.get("ffmpeg_path", "ffmpeg"),
+            workers=int(self.config.get("postprocess_workers", 0)),
+            archive=archive,
+        )
+
+    def _get_api_pool(self):
+        """The warm worker pool if the "python" engine is selected and usable, else None."""
+        if self.config.get("engine") != "python":
+            return None
+        if not api_available():
+            self._emit("log", text="yt_dlp Python module not found, using the yt-dlp executable instead.\n")
+            return None
+        if self.api_pool is None:
+            self.api_pool = ApiWorkerPool()
+        return self.api_pool
+
+    def _get_mux(self):
+        """The shared OutputMultiplexer, or None where MULTIPLEX_OUTPUT is off."""
+        if not MULTIPLEX_OUTPUT:
+            return None
+        if self.mux is None:
+            self.mux = OutputMultiplexer()
+        return self.mux
+
+    def shutdown(self):
+        if self.api_pool:
+            self.api_pool.shutdown()
+            self.api_pool = None
+        if self.mux:
+            self.mux.close()
+            self.mux = None
+
+    def pump(self, budget=None):
+        """Apply queued scheduler output and notify listeners.
+
+        Stops after ``budget`` seconds if given. Returns True if there was
+        anything to process.
+        """
+        start = time.perf_counter()
+        log = []
+        dirty = set()
+        busy = False
+
+        if self.scheduler:
+            for item, event in self.scheduler.take_progress().items():
+                if item.state == "downloading":
+                    self._apply_event(item, event)
+                    dirty.add(item)
+                    busy = True
+
+        finished = False
+        while budget is None or time.perf_counter() - start < budget:
+            try:
+                message = self.output_queue.get_nowait()
+            except queue.Empty:
+                break
+            busy = True
+            if self._handle_output(message, log, dirty):
+                finished = True
+                break
+        # One fsync for all the item changes of this pump
+        self.jobs.flush()
+
+        # One log and one update per item per pump, however many lines arrived
+        if log:
+            self._emit("log", text="".join(log))
+        for item in dirty:
+            if item.slot is not None:
+                self._emit("item_updated", item=item)
+            elif item in self.postprocessing:
+                self._emit("postprocess_updated", item=item)
+
+        if finished:
+            metrics = self.stats()
+            write_metrics(self.job, self.items, metrics)
+            self.running = False
+            self.scheduler = None
+            self.job = None
+            self._emit("job_finished", return_code=self.return_code, metrics=metrics)
+        return busy
+
+    def stats(self):
+        """Aggregate counters of the current or last job, see job_metrics()."""
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+        return job_metrics(self.items, elapsed)
+
+    def wait(self, interval=0.1):
+        """Pump until the current job has finished."""
+        while self.running:
+            if not self.pump():
+                time.sleep(interval)
+
+    def _add_error(self, line):
+        self.errors_and_warnings.add(line)
+
+    def _enter_phase(self, item, phase):
+        """Close the item's current phase and start ``phase`` (None to stop timing)."""
+        if item.phase == phase:
+            return
+        now = time.monotonic()
+        if item.phase is not None:
+            item.phase_times[item.phase] = item.phase_times.get(item.phase, 0.0) + now - item.phase_started
+        item.phase = phase
+        item.phase_started = now
+
+    def _set_item_progress(self, item, pct):
+        self.progress_total += pct - item.progress
+        item.progress = pct
+
+    def _record_throughput(self, item, log):
+        """Feed a finished download's throughput to the auto-tuner and save what it learns."""
+        # Measurements under a bandwidth cap would only reflect the cap
+        if item.tuning is None or self.scheduler.budget:
+            return
+        if item.timed_bytes < TUNING_MIN_BYTES or item.transfer_seconds < TUNING_MIN_SECONDS:
+            return
+        extractor = HostLimiter.key(item)
+        throughput = item.timed_bytes / item.transfer_seconds
+        candidate = self.tuner.record(extractor, item.tuning, throughput)
+        if candidate:
+            save_config(self.config)
+            results = self.config["tuning"][extractor]["results"]
+            tried = ", ".join(f"{name}: {format_size(mean)}/s" for name, (mean, _) in results.items())
+            verb = "settled on" if self.config["tuning"][extractor]["settled"] else "trying"
+            log.append(f"Auto-tune for {extractor}: {verb} {candidate} ({tried})\n")
+
+    def _record_failure(self, item, error_msg, video_id=None):
+        item.failed = True
+        category = classify_error(error_msg)
+        permanent = not self.scheduler.retry.is_retryable(category)
+        item.failures.append(Failure(item.video_url, video_id or item.video_id, error_msg, category, permanent))
+
+    def _apply_event(self, item, event):
+        """Update the item's user-friendly progress from a classify_line() event."""
+        kind = event[0]
+
+        if kind == "progress":
+            _, pct, downloaded, total, speed, eta = event
+            if item.stream_started is None:
+                item.stream_started = time.monotonic()
+                self._enter_phase(item, "downloading")
+            item.stream_bytes = total or downloaded or 0
+            self._set_item_progress(item, pct)
+            item.detail = f"{pct:.1f}% of {format_size(total)}  |  {format_size(speed)}/s  |  ETA {format_eta(eta)}"
+
+        elif kind == "extracting_url":
+            # Track the current video URL being extracted
+            item.video_url = event[1]
+
+        elif kind == "error":
+            _, error_msg, video_id, stripped = event
+            self._add_error(stripped)
+            self._record_failure(item, error_msg, video_id)
+            item.detail = f"Error: {error_msg[:60]}"
+
+        elif kind == "warning":
+            self._add_error(event[2])
+
+        elif kind == "playlist_item":
+            # Only seen when an item could not be expanded up front
+            _, current, total = event
+            item.detail = f"Item {current} of {total}"
+            self._enter_phase(item, "extracting")
+            self._set_item_progress(item, 0)
+            item.video_url = None
+            item.video_id = None
+
+        elif kind == "extracting":
+            item.video_id = event[1]
+            item.detail = f"Extracting: {event[1]}"
+            self._enter_phase(item, "extracting")
+
+        elif kind == "destination":
+            self._enter_phase(item, "downloading")
+            if not item.title:
+                item.title = os.path.basename(event[1])
+
+        elif kind == "complete":
+            size = event[1] or item.stream_bytes
+            item.transfer_bytes += size
+            # Streams that finished before any progress was seen have no timing
+            if item.stream_started is not None:
+                item.timed_bytes += size
+                item.transfer_seconds += time.monotonic() - item.stream_started
+                item.stream_started = None
+            item.stream_bytes = 0
+            self._enter_phase(item, "postprocessing")
+            self._set_item_progress(item, 100)
+            item.detail = "Download complete, processing..."
+
+        elif kind == "already_downloaded":
+            self._enter_phase(item, "postprocessing")
+            self._set_item_progress(item, 100)
+            item.detail = "Already downloaded"
+
+        elif kind == "merging":
+            self._enter_phase(item, "postprocessing")
+            item.detail = "Merging video and audio..."
+
+        elif kind == "finished":
+            _, video_id, filepath = event
+            item.video_id = item.video_id or video_id
+            if filepath and not item.title:
+                item.title = os.path.basename(filepath)
+            self._set_item_progress(item, 100)
+            item.detail = "Finished"
+
+    def _handle_output(self, message, log, dirty):
+        """Apply one queued message. Returns True once the job is complete."""
+        if not isinstance(message, tuple):
+            # Untagged lines come from the scheduler itself, not from an item
+            log.append(message)
+            event = classify_line(message)
+            if event and event[0] == "error":
+                _, error_msg, _, stripped = event
+                self._add_error(stripped)
+                # Nothing to retry without a URL
+                self.failed_videos.append(Failure(None, None, error_msg, classify_error(error_msg), True))
+                self._emit("error", message=error_msg)
+            return False
+
+        tag = message[0]
+
+        if tag == "__ITEM_LINE__":
+            _, item, line, event = message
+            log.append(line)
+            if event is not None:
+                self._apply_event(item, event)
+                dirty.add(item)
+
+        elif tag == "__ITEM_LINES__":
+            _, item, batch = message
+            for line, event in batch:
+                log.append(line)
+                if event is not None:
+                    self._apply_event(item, event)
+                    dirty.add(item)
+
+        elif tag == "__PLAYLIST__":
+            self.items = message[1]
+            if self.job.entries is None:
+                self.jobs.set_items(self.job, self.items)
+            else:
+                for item in self.items:
+                    if item.state == "skipped":
+                        self.jobs.set_item_state(self.job, item)
+            self.progress_total = sum(item.progress for item in self.items)
+            pending = sum(1 for item in self.items if item.state == "pending")
+            self._emit("playlist", total=len(self.items), pending=pending)
+
+        elif tag == "__ITEM_START__":
+            _, item, slot = message
+            if item.attempts > 1:
+                item.failed = False
+                item.failures = []
+                self._set_item_progress(item, 0)
+                item.detail = f"Attempt {item.attempts} of {item.max_attempts}"
+            item.state = "downloading"
+            item.slot = slot
+            item.transfer_bytes = 0
+            item.timed_bytes = 0
+            item.transfer_seconds = 0.0
+            item.stream_started = None
+            item.stream_bytes = 0
+            self._enter_phase(item, "extracting")
+            self.active_items[slot] = item
+            self.jobs.set_item_state(self.job, item)
+            self._emit("item_started", item=item, slot=slot)
+
+        elif tag == "__ITEM_END__":
+            _, item, slot, return_code = message
+            if return_code != 0 and not item.failed:
+                self._record_failure(item, f"yt-dlp exited with code {return_code}")
+            if item.failed:
+                item.state = "failed"
+                self._enter_phase(item, None)
+            elif item.postprocess:
+                item.state = "processing"
+                item.detail = "Waiting for post-processing"
+                self._enter_phase(item, "postprocessing")
+            else:
+                item.state = "done"
+                self._enter_phase(item, None)
+            self._set_item_progress(item, 100)
+            if not item.failed and item.attempts > 1:
+                log.append(f"Retry succeeded for {item.video_id or item.url}\n")
+            if not item.failed and self.tuner:
+                self._record_throughput(item, log)
+            item.slot = None
+            dirty.discard(item)
+            self.active_items.pop(slot, None)
+            self.jobs.set_item_state(self.job, item)
+            self._emit("item_finished", item=item, slot=slot)
+
+        elif tag == "__LOG__":
+            log.append(message[1])
+
+        elif tag == "__RETRY_SCHEDULED__":
+            _, item, delay, category = message
+            item.state = "waiting"
+            self._enter_phase(item, "retry_wait")
+            self.jobs.set_item_state(self.job, item)
+            log.append(
+                f"\n--- Retrying {item.video_id or item.url} in {delay:.1f}s "
+                f"(attempt {item.attempts + 1} of {item.max_attempts}, {CATEGORY_LABELS[category].lower()}) ---\n\n"
+            )
+            self._emit("retry_scheduled", item=item, delay=delay, category=category)
+
+        elif tag == "__POSTPROCESS_START__":
+            _, item, kind, attempt = message
+            item.detail = POSTPROCESS_LABELS[kind] + "..."
+            if attempt > 1:
+                item.detail += f" (attempt {attempt} of {self.scheduler.postprocessor.attempts})"
+            self.postprocessing[item] = None
+            self._emit("postprocess_started", item=item, kind=kind, attempt=attempt)
+
+        elif tag == "__POSTPROCESS_PROGRESS__":
+            _, item, pct = message
+            item.detail = f"{POSTPROCESS_LABELS[item.postprocess[0]]} {pct:.0f}%"
+            dirty.add(item)
+
+        elif tag == "__POSTPROCESS_END__":
+            _, item, error = message
+            if error is None:
+                item.state = "done"
+                item.detail = "Finished"
+            else:
+                log.append(f"Post-processing failed for {item.video_id or item.url}: {error}\n")
+                self._record_failure(item, f"Post-processing failed: {error}")
+                item.state = "failed"
+                item.detail = f"Error: {error[:60]}"
+            self._enter_phase(item, None)
+            self.postprocessing.pop(item, None)
+            dirty.discard(item)
+            self.jobs.set_item_state(self.job, item)
+            self._emit("postprocess_finished", item=item, error=error)
+
+        elif tag == "__MOVE_FAILED__":
+            _, item, error = message
+            log.append(f"Could not move a finished download into {self.job.download_dir}: {error}\n")
+            if item is not None:
+                self._record_failure(item, f"Could not move into the download folder: {error}")
+                item.state = "failed"
+                item.detail = "Error: could not move into the download folder"
+                self.jobs.set_item_state(self.job, item)
+
+        elif tag == "__DONE__":
+            self.failed_videos.extend(f for item in self.items for f in item.failures)
+            self.return_code = message[1]
+            self.jobs.finish(self.job)
+            return True
+
+        return False
@@ -1,80 +1,131 @@
+import argparse
+import itertools
 import json
+import multiprocessing
 import os
-import queue
-import re
 import shutil
 import subprocess
-import threading
-import tkinter as tk
-from tkinter import filedialog, ttk
+import sys
+import time
+from collections import deque
+from datetime import datetime
 from pathlib import Path
 
-CONFIG_FILE = Path(__file__).parent / "config.json"
-
-DEFAULT_CONFIG = {
-    "download_dir": str(Path.home() / "Downloads"),
-    "quality": "Best",
-}
-
-QUALITY_OPTIONS = {
-    "Best": ["-f", "bestvideo+bestaudio/best", "--merge-output-format", "mp4"],
-    "1080p": ["-f", "bestvideo[height<=1080]+bestaudio/best[height<=1080]", "--merge-output-format", "mp4"],
-    "720p": ["-f", "bestvideo[height<=720]+bestaudio/best[height<=720]", "--merge-output-format", "mp4"],
-    "480p": ["-f", "bestvideo[height<=480]+bestaudio/best[height<=480]", "--merge-output-format", "mp4"],
-    "Audio Only": ["-x", "--audio-format", "mp3"],
-}
-
-# Patterns for parsing yt-dlp output into user-friendly progress
-RE_DOWNLOAD_ITEM = re.compile(r"\[download\]\s+Downloading item (\d+) of (\d+)")
-RE_DOWNLOAD_DEST = re.compile(r"\[download\]\s+Destination:\s+(.+)")
-RE_DOWNLOAD_PROGRESS = re.compile(r"\[download\]\s+([\d.]+)%\s+of\s+~?\s*([\d.]+\S+)\s+at\s+(.+?)\s+ETA\s+(.+)")
-RE_DOWNLOAD_COMPLETE = re.compile(r"\[download\]\s+100%")
-RE_ALREADY_DOWNLOADED = re.compile(r"\[download\]\s+(.+) has already been downloaded")
-RE_EXTRACTING_URL = re.compile(r"\[youtube\]\s+Extracting URL:\s+(.+)")
-RE_EXTRACTING = re.compile(r"\[youtube\]\s+(\S+):\s+Downloading webpage")
-RE_MERGING = re.compile(r"\[Merger\]\s+Merging formats into")
-RE_WARNING = re.compile(r"WARNING:\s*(.*)", re.IGNORECASE)
-RE_ERROR = re.compile(r"ERROR:\s*(.*)", re.IGNORECASE)
-
-# Known permanent failure reasons that should not be retried
-PERMANENT_ERRORS = [
-    "this video is not available",
-    "private video",
-    "video is unavailable",
-    "this video has been removed",
-    "account associated with this video has been terminated",
-    "this video is no longer available",
-    "join this channel to get access",
-    "sign in to confirm your age",
-    "content warning",
-]
-
-
-def load_config():
-    if CONFIG_FILE.exists():
+try:
+    import tkinter as tk
+    from tkinter import filedialog, ttk
+except ImportError:
+    # Python built without Tk: only --batch mode is available
+    tk = filedialog = ttk = None
+
+from engine import (
+    CATEGORY_LABELS,
+    CONFIG_FILE,
+    METRICS_DIR,
+    QUALITY_OPTIONS,
+    DownloadEngine,
+    format_eta,
+    format_size,
+    group_failures,
+    item_summary,
+    load_config,
+    save_config,
+    url_key,
+)
+
+LOG_FILE = CONFIG_FILE.parent / "yt-dlp-gui.log"
+LOG_FILE_BACKUPS = 3
+
+MAX_CONCURRENT_DOWNLOADS = 16
+
+# UI update loop: time budget per tick, and polling intervals while busy/idle
+FRAME_BUDGET = 0.012
+POLL_BUSY_MS = 30
+POLL_IDLE_MS = 250
+# Minimum seconds between refreshes of the stats panel
+STATS_INTERVAL = 1.0
+# Failed videos inserted into the summary panel per UI tick
+SUMMARY_CHUNK = 200
+# Post-processing items listed individually under the worker slots
+POSTPROCESS_SHOWN = 3
+
+
+def format_stats(metrics):
+    """The live stats panel text for job_metrics() counters."""
+    states = metrics["states"]
+    phase_total = sum(metrics["phase_seconds"].values())
+    phases = "  ".join(
+        f"{phase.replace('_', ' ')} {seconds * 100 / phase_total:.0f}%"
+        for phase, seconds in metrics["phase_seconds"].items()
+        if seconds
+    ) if phase_total else "-"
+    return (
+        f"Elapsed {format_eta(metrics['elapsed_seconds'])}  |  {metrics['items_per_hour']:.0f} items/hour  |  "
+        f"{states['done']} done, {states['skipped']} skipped, {states['failed']} failed\n"
+        f"Downloaded {format_size(metrics['bytes'])} at {format_size(metrics['throughput'])}/s average  |  "
+        f"retry rate {metrics['retry_rate']:.0%}  |  permanent failures {metrics['permanent_failure_rate']:.0%}\n"
+        f"Time per phase: {phases}"
+    )
+
+
+def open_path(path):
+    """Open a file with the platform's default application."""
+    if os.name == "nt":
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", str(path)])
+    else:
+        subprocess.Popen(["xdg-open", str(path)])
+
+
+class DownloadLog:
+    """The detailed log: a bounded in-memory tail plus a rotating file with everything.
+
+    Only the last ``max_lines`` lines are kept in memory (and shown in the
+    widget); every line is also appended to ``path`` so the full log can be
+    opened on demand.
+    """
+
+    def __init__(self, path, max_lines=5000, max_bytes=10 * 1024 * 1024, backups=LOG_FILE_BACKUPS):
+        self.path = Path(path)
+        self.max_lines = max(100, max_lines)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lines = deque(maxlen=self.max_lines)
+        self._file = None
+
+    def write(self, text):
+        self.lines.extend(text.splitlines(keepends=True))
         try:
-            with open(CONFIG_FILE, "r") as f:
-                config = json.load(f)
-            for key, value in DEFAULT_CONFIG.items():
-                config.setdefault(key, value)
-            return config
-        except (json.JSONDecodeError, IOError):
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(text)
+            if self._file.tell() > self.max_bytes:
+                self._rotate()
+        except OSError:
             pass
-    return dict(DEFAULT_CONFIG)
 
-
-def save_config(config):
-    try:
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f, indent=2)
-    except IOError:
-        pass
-
-
-def is_permanent_error(error_msg):
-    """Check if an error is permanent (no point retrying)."""
-    lower = error_msg.lower()
-    return any(reason in lower for reason in PERMANENT_ERRORS)
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for n in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{n}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{n + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+    def start_job(self, description):
+        """Clear the in-memory tail and mark the start of a new job in the file."""
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.write(f"\n===== {stamp} {description} =====\n")
+        self.lines.clear()
+
+    def flush(self):
+        if self._file is not None:
+            try:
+                self._file.flush()
+            except OSError:
+                pass
 
 
 class YtDlpGui:
@@ -86,19 +137,32 @@ class YtDlpGui:
 
         self.config = load_config()
         self.downloading = False
-        self.process = None
-        self.output_queue = queue.Queue()
-        self.errors_and_warnings = []
+        self.engine = DownloadEngine(self.config)
+        self.engine.subscribe(self._on_engine_event)
+        self.detail_log = DownloadLog(
+            LOG_FILE,
+            max_lines=int(self.config.get("log_max_lines", 5000)),
+            max_bytes=int(self.config.get("log_file_max_mb", 10) * 1024 * 1024),
+        )
         self.detail_log_visible = False
 
-        # Failure tracking
-        self.current_video_url = None
-        self.current_video_id = None
-        self.failed_videos = []  # list of {"url": ..., "id": ..., "error": ..., "permanent": bool}
+        self.slot_vars = []
+        self.slot_names = []
+        # Collected while the engine is being pumped, flushed once per tick
+        self._pending_log = None
+        self._dirty_slots = set()
+        self._postprocess_dirty = False
+        self._summary_lines = None  # generator being rendered into the summary panel
+        self.stats_visible = False
+        self._stats_updated = 0.0
 
         self._build_ui()
         self._check_ytdlp()
 
+        # Jobs left unfinished when the app was last closed or crashed
+        if self.engine.pending_jobs():
+            self.root.after(500, self._resume_jobs)
+
     def _build_ui(self):
         padding = {"padx": 10, "pady": 5}
         self.root.columnconfigure(0, weight=1)
@@ -107,15 +171,15 @@ class YtDlpGui:
         style.configure("TButton", font=("Segoe UI", 11))
 
         # --- URL Section ---
-        url_frame = ttk.LabelFrame(self.root, text="Video or Playlist URL", padding=10)
+        url_frame = ttk.LabelFrame(self.root, text="Video or Playlist URLs (one per line)", padding=10)
         url_frame.grid(row=0, column=0, sticky="ew", **padding)
         url_frame.columnconfigure(0, weight=1)
 
-        self.url_entry = ttk.Entry(url_frame, font=("Segoe UI", 11))
-        self.url_entry.grid(row=0, column=0, sticky="ew", padx=(0, 5))
+        self.url_text = tk.Text(url_frame, height=3, wrap="none", font=("Segoe UI", 11))
+        self.url_text.grid(row=0, column=0, sticky="ew", padx=(0, 5))
 
         paste_btn = ttk.Button(url_frame, text="Paste", width=8, command=self._paste_url)
-        paste_btn.grid(row=0, column=1)
+        paste_btn.grid(row=0, column=1, sticky="n")
 
         # --- Download Directory Section ---
         dir_frame = ttk.LabelFrame(self.root, text="Download Directory", padding=10)
@@ -144,6 +208,31 @@ class YtDlpGui:
         )
         quality_combo.grid(row=0, column=1)
 
+        ttk.Label(options_frame, text="Parallel downloads:").grid(row=0, column=2, padx=(15, 5))
+        self.workers_var = tk.IntVar(value=self.config.get("concurrent_downloads", 3))
+        workers_spin = ttk.Spinbox(
+            options_frame,
+            from_=1,
+            to=MAX_CONCURRENT_DOWNLOADS,
+            textvariable=self.workers_var,
+            state="readonly",
+            width=5,
+        )
+        workers_spin.grid(row=0, column=3)
+
+        self.skip_downloaded_var = tk.BooleanVar(value=self.config.get("skip_downloaded", True))
+        skip_check = ttk.Checkbutton(
+            options_frame, text="Skip already downloaded", variable=self.skip_downloaded_var
+        )
+        skip_check.grid(row=1, column=0, columnspan=2, sticky="w", pady=(5, 0))
+
+        # One-shot override, not saved: re-list the playlist instead of using the cache
+        self.refresh_var = tk.BooleanVar(value=False)
+        refresh_check = ttk.Checkbutton(
+            options_frame, text="Refresh playlist listing", variable=self.refresh_var
+        )
+        refresh_check.grid(row=1, column=2, columnspan=2, sticky="w", padx=(15, 0), pady=(5, 0))
+
         # --- Download Button ---
         self.download_btn = ttk.Button(
             self.root, text="Download", command=self._start_download
@@ -171,6 +260,20 @@ class YtDlpGui:
         detail_label = ttk.Label(progress_frame, textvariable=self.detail_var, font=("Segoe UI", 8))
         detail_label.grid(row=3, column=0, sticky="w", pady=(2, 0))
 
+        # One status line per active worker slot, rebuilt for each job
+        self.slots_frame = ttk.Frame(progress_frame)
+        self.slots_frame.grid(row=4, column=0, sticky="ew", pady=(5, 0))
+        self.slots_frame.columnconfigure(0, weight=1)
+
+        # Merges/conversions running apart from the download slots ("separate_postprocessing")
+        self.postprocess_var = tk.StringVar(value="")
+        postprocess_label = ttk.Label(progress_frame, textvariable=self.postprocess_var, font=("Segoe UI", 8))
+        postprocess_label.grid(row=5, column=0, sticky="w")
+
+        # Live job statistics, NOT gridded by default (toggled with "Show Stats")
+        self.stats_var = tk.StringVar(value="")
+        self.stats_label = ttk.Label(progress_frame, textvariable=self.stats_var, font=("Consolas", 8), justify="left")
+
         # --- Summary Section (hidden until needed) ---
         self.summary_frame = ttk.LabelFrame(self.root, text="Failed Videos", padding=10)
         self.summary_frame.columnconfigure(0, weight=1)
@@ -194,9 +297,15 @@ class YtDlpGui:
         self.toggle_btn = ttk.Button(log_toggle_frame, text="Show Detailed Log", width=20, command=self._toggle_log)
         self.toggle_btn.grid(row=0, column=0)
 
+        self.stats_btn = ttk.Button(log_toggle_frame, text="Show Stats", width=12, command=self._toggle_stats)
+        self.stats_btn.grid(row=0, column=1, sticky="w", padx=(5, 0))
+
         self.copy_errors_btn = ttk.Button(log_toggle_frame, text="Copy Errors & Warnings", width=22, command=self._copy_errors)
         self.copy_errors_btn.grid(row=0, column=2)
 
+        open_log_btn = ttk.Button(log_toggle_frame, text="Open Full Log", width=14, command=self._open_full_log)
+        open_log_btn.grid(row=0, column=3, padx=(5, 0))
+
         self.log_frame = ttk.Frame(self.root)
         # log_frame is NOT gridded by default (collapsed)
         self.log_frame.columnconfigure(0, weight=1)
@@ -216,14 +325,30 @@ class YtDlpGui:
             self.toggle_btn.configure(text="Show Detailed Log")
             self.detail_log_visible = False
         else:
+            self._render_log()
             self.log_frame.grid(row=7, column=0, sticky="nsew", padx=10, pady=(0, 10))
             self.root.rowconfigure(7, weight=1)
             self.toggle_btn.configure(text="Hide Detailed Log")
             self.detail_log_visible = True
 
+    def _toggle_stats(self):
+        if self.stats_visible:
+            self.stats_label.grid_forget()
+            self.stats_btn.configure(text="Show Stats")
+            self.stats_visible = False
+        else:
+            self.stats_label.grid(row=6, column=0, sticky="w", pady=(5, 0))
+            self.stats_btn.configure(text="Hide Stats")
+            self.stats_visible = True
+            self._update_stats()
+
+    def _update_stats(self):
+        self._stats_updated = time.monotonic()
+        self.stats_var.set(format_stats(self.engine.stats()))
+
     def _show_summary(self):
         """Show the failed videos summary panel."""
-        if not self.failed_videos:
+        if not self.engine.failed_videos:
             self.summary_frame.grid_forget()
             return
 
@@ -231,51 +356,69 @@ class YtDlpGui:
 
         self.summary_text.configure(state="normal")
         self.summary_text.delete("1.0", tk.END)
-
-        for entry in self.failed_videos:
-            video_id = entry["id"] or "unknown"
-            error = entry["error"]
-            permanent = entry["permanent"]
-            tag = " [will not retry — permanent]" if permanent else " [retry failed]"
-
-            url = entry["url"] or f"https://www.youtube.com/watch?v={video_id}"
-            self.summary_text.insert(tk.END, f"{video_id}: {error}{tag}\n  {url}\n\n")
-
         self.summary_text.configure(state="disabled")
+        # Inserted a chunk per tick so thousands of failures don't freeze the window
+        self._summary_lines = self._summary_entries()
+        self._render_summary(self._summary_lines)
+
+    def _render_summary(self, lines):
+        if lines is not self._summary_lines:
+            return  # superseded by a newer summary, or hidden
+        chunk = "".join(itertools.islice(lines, SUMMARY_CHUNK))
+        if not chunk:
+            self._summary_lines = None
+            return
+        self.summary_text.configure(state="normal")
+        self.summary_text.insert(tk.END, chunk)
+        self.summary_text.configure(state="disabled")
+        self.root.after(1, self._render_summary, lines)
+
+    def _summary_entries(self):
+        """Failed videos grouped by error category, as lines of text."""
+        for n, (category, entries) in enumerate(group_failures(self.engine.failed_videos)):
+            retried = any(not entry.permanent for entry in entries)
+            tag = "retry failed" if retried else "will not retry"
+            if n:
+                yield "\n"
+            yield f"{CATEGORY_LABELS[category]} ({len(entries)}, {tag})\n"
+            for entry in entries:
+                video_id = entry.id or "unknown"
+                url = entry.url or f"https://www.youtube.com/watch?v={video_id}"
+                yield f"  {video_id}: {entry.error}\n    {url}\n"
 
     def _hide_summary(self):
+        self._summary_lines = None
         self.summary_frame.grid_forget()
 
     def _copy_summary(self):
-        if not self.failed_videos:
+        if not self.engine.failed_videos:
             return
-        lines = []
-        for entry in self.failed_videos:
-            video_id = entry["id"] or "unknown"
-            error = entry["error"]
-            permanent = entry["permanent"]
-            tag = " [permanent]" if permanent else " [retry failed]"
-            url = entry["url"] or f"https://www.youtube.com/watch?v={video_id}"
-            lines.append(f"{video_id}: {error}{tag}\n  {url}")
-
         self.root.clipboard_clear()
-        self.root.clipboard_append("\n\n".join(lines))
+        self.root.clipboard_append("".join(self._summary_entries()))
         self._flash_button(
             self.summary_frame.winfo_children()[-1],  # copy button
-            f"Copied {len(self.failed_videos)} items!",
+            f"Copied {len(self.engine.failed_videos)} items!",
         )
 
     def _copy_errors(self):
-        if not self.errors_and_warnings:
+        messages = self.engine.errors_and_warnings
+        if not messages:
             self.root.clipboard_clear()
             self.root.clipboard_append("No errors or warnings.")
             self._flash_button(self.copy_errors_btn, "Nothing to copy")
             return
 
-        text = "\n".join(self.errors_and_warnings)
+        text = "\n".join(messages.lines())
+        if messages.dropped:
+            text += f"\n({messages.dropped} more errors/warnings not listed, see {self.detail_log.path})"
         self.root.clipboard_clear()
         self.root.clipboard_append(text)
-        self._flash_button(self.copy_errors_btn, f"Copied {len(self.errors_and_warnings)} items!")
+        self._flash_button(self.copy_errors_btn, f"Copied {len(messages)} items!")
+
+    def _open_full_log(self):
+        self.detail_log.flush()
+        if self.detail_log.path.exists():
+            open_path(self.detail_log.path)
 
     def _flash_button(self, button, message):
         original = button.cget("text")
@@ -283,7 +426,7 @@ class YtDlpGui:
         self.root.after(2000, lambda: button.configure(text=original))
 
     def _check_ytdlp(self):
-        if not shutil.which("yt-dlp"):
+        if not shutil.which(self.config.get("ytdlp_path", "yt-dlp")):
             self.status_var.set("Warning: yt-dlp not found in PATH")
             self._log_detail("yt-dlp is not installed or not in your system PATH.\n")
             self._log_detail("Install it with: pip install yt-dlp\n")
@@ -292,10 +435,12 @@ class YtDlpGui:
     def _paste_url(self):
         try:
             clipboard = self.root.clipboard_get()
-            self.url_entry.delete(0, tk.END)
-            self.url_entry.insert(0, clipboard.strip())
         except tk.TclError:
-            pass
+            return
+        # Added below any URLs already entered
+        if self.url_text.get("1.0", "end-1c").strip():
+            self.url_text.insert(tk.END, "\n")
+        self.url_text.insert(tk.END, clipboard.strip())
 
     def _browse_dir(self):
         directory = filedialog.askdirectory(initialdir=self.dir_var.get())
@@ -305,8 +450,23 @@ class YtDlpGui:
             save_config(self.config)
 
     def _log_detail(self, text):
+        self.detail_log.write(text)
+        # The widget is only kept in sync while visible; _toggle_log re-renders it
+        if not self.detail_log_visible:
+            return
         self.log_text.configure(state="normal")
         self.log_text.insert(tk.END, text)
+        # Keep only the retained tail in the widget; the rest lives in the log file
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - self.detail_log.max_lines
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+        self.log_text.see(tk.END)
+        self.log_text.configure(state="disabled")
+
+    def _render_log(self):
+        self.log_text.configure(state="normal")
+        self.log_text.delete("1.0", tk.END)
+        self.log_text.insert(tk.END, "".join(self.detail_log.lines))
         self.log_text.see(tk.END)
         self.log_text.configure(state="disabled")
 
@@ -314,120 +474,69 @@ class YtDlpGui:
         self.log_text.configure(state="normal")
         self.log_text.delete("1.0", tk.END)
         self.log_text.configure(state="disabled")
-        self.errors_and_warnings.clear()
-        self.failed_videos.clear()
-        self.current_video_url = None
-        self.current_video_id = None
         self.progress_var.set(0)
         self.item_var.set("")
         self.detail_var.set("")
+        self.postprocess_var.set("")
+        self._build_slot_labels([])
         self._hide_summary()
 
-    def _parse_line(self, line):
-        """Parse a yt-dlp output line and update the user-friendly progress."""
-        stripped = line.strip()
-
-        # Track the current video URL being extracted
-        m = RE_EXTRACTING_URL.match(stripped)
-        if m:
-            self.current_video_url = m.group(1).strip()
+    def _build_slot_labels(self, names):
+        """Create one status label per worker slot."""
+        for child in self.slots_frame.winfo_children():
+            child.destroy()
+        self.slot_names = list(names)
+        self.slot_vars = []
+        for slot in range(len(self.slot_names)):
+            var = tk.StringVar(value="")
+            label = ttk.Label(self.slots_frame, textvariable=var, font=("Segoe UI", 8))
+            label.grid(row=slot, column=0, sticky="w")
+            self.slot_vars.append(var)
+
+    def _update_slot(self, slot, item=None):
+        if slot >= len(self.slot_vars):
             return
-
-        # Track errors and warnings
-        m = RE_ERROR.search(stripped)
-        if m:
-            error_msg = m.group(1)
-            self.errors_and_warnings.append(stripped)
-
-            # Extract video ID from error like "ERROR: [youtube] ABC123: ..."
-            error_id_match = re.match(r"\[youtube\]\s+(\S+?):", error_msg)
-            video_id = error_id_match.group(1) if error_id_match else self.current_video_id
-
-            self.failed_videos.append({
-                "url": self.current_video_url,
-                "id": video_id,
-                "error": error_msg,
-                "permanent": is_permanent_error(error_msg),
-            })
-
-            self.status_var.set("Error")
-            self.item_var.set(error_msg[:80])
+        if item is None:
+            self.slot_vars[slot].set(f"{self.slot_names[slot]}: idle")
             return
-
-        m = RE_WARNING.search(stripped)
-        if m:
-            self.errors_and_warnings.append(stripped)
+        text = f"{self.slot_names[slot]}: {item.label[:50]}"
+        if item.detail:
+            text += f"  —  {item.detail}"
+        self.slot_vars[slot].set(text)
+
+    def _update_postprocess(self):
+        """Show the items being merged or converted, a few at most."""
+        self._postprocess_dirty = False
+        active = list(self.engine.postprocessing)
+        lines = [f"Post-processing: {item.label[:50]}  —  {item.detail}" for item in active[:POSTPROCESS_SHOWN]]
+        if len(active) > POSTPROCESS_SHOWN:
+            lines.append(f"... and {len(active) - POSTPROCESS_SHOWN} more")
+        self.postprocess_var.set("\n".join(lines))
+
+    def _update_overall(self):
+        """Refresh the aggregate counters shown above the progress bar."""
+        items = self.engine.items
+        if not items:
             return
-
-        # Playlist item progress
-        m = RE_DOWNLOAD_ITEM.match(stripped)
-        if m:
-            current, total = m.group(1), m.group(2)
-            self.item_var.set(f"Item {current} of {total}")
-            self.progress_var.set(0)
-            self.detail_var.set("")
-            self.current_video_url = None
-            self.current_video_id = None
-            return
-
-        # Extracting video info
-        m = RE_EXTRACTING.match(stripped)
-        if m:
-            self.current_video_id = m.group(1)
-            self.detail_var.set(f"Extracting: {m.group(1)}")
-            return
-
-        # Download destination (shows filename)
-        m = RE_DOWNLOAD_DEST.match(stripped)
-        if m:
-            filename = os.path.basename(m.group(1))
-            self.item_var.set(filename[:80])
-            return
-
-        # Download progress percentage
-        m = RE_DOWNLOAD_PROGRESS.search(stripped)
-        if m:
-            pct = float(m.group(1))
-            size = m.group(2)
-            speed = m.group(3)
-            eta = m.group(4)
-            self.progress_var.set(pct)
-            self.detail_var.set(f"{pct:.1f}% of {size}  |  {speed}  |  ETA {eta}")
-            return
-
-        # Download complete for a file
-        m = RE_DOWNLOAD_COMPLETE.search(stripped)
-        if m:
-            self.progress_var.set(100)
-            self.detail_var.set("Download complete, processing...")
-            return
-
-        # Already downloaded
-        m = RE_ALREADY_DOWNLOADED.match(stripped)
-        if m:
-            filename = os.path.basename(m.group(1))
-            self.item_var.set(f"Already downloaded: {filename[:60]}")
-            self.progress_var.set(100)
-            return
-
-        # Merging
-        m = RE_MERGING.match(stripped)
-        if m:
-            self.detail_var.set("Merging video and audio...")
-            return
-
-    def _build_cmd(self, url):
-        """Build the yt-dlp command for a given URL."""
-        download_dir = self.dir_var.get()
-        cmd = ["yt-dlp", "--newline", "-o", os.path.join(download_dir, "%(title)s.%(ext)s")]
-        quality = self.quality_var.get()
-        cmd.extend(QUALITY_OPTIONS.get(quality, []))
-        cmd.append(url)
-        return cmd
+        states = self.engine.counts()
+        finished = states["done"] + states["failed"] + states["skipped"]
+        self.item_var.set(
+            f"{finished} of {len(items)} finished, {len(self.engine.active_items)} active"
+        )
+        parts = []
+        if states["skipped"]:
+            parts.append(f"{states['skipped']} already downloaded")
+        if states["failed"]:
+            parts.append(f"{states['failed']} failed so far")
+        if states["waiting"]:
+            parts.append(f"{states['waiting']} waiting to retry")
+        if states["processing"]:
+            parts.append(f"{states['processing']} merging/converting")
+        self.detail_var.set(", ".join(parts))
 
     def _start_download(self):
-        url = self.url_entry.get().strip()
-        if not url:
+        urls = parse_urls(self.url_text.get("1.0", tk.END))
+        if not urls:
             self.status_var.set("Error: No URL provided")
             return
 
@@ -437,153 +546,242 @@ class YtDlpGui:
             return
 
         self.config["quality"] = self.quality_var.get()
+        self.config["concurrent_downloads"] = self.workers_var.get()
+        self.config["skip_downloaded"] = self.skip_downloaded_var.get()
         save_config(self.config)
 
+        # Duplicates within the list and of queued jobs come back as the existing job
+        known = set(self.engine.jobs.pending())
+        added = []
+        for job in self.engine.enqueue_many(urls, download_dir, self.quality_var.get()):
+            if job not in known:
+                known.add(job)
+                added.append(job)
+        self.url_text.delete("1.0", tk.END)
+
+        duplicates = len(urls) - len(added)
+        if not added:
+            if len(urls) == 1 and self.engine.job is not None and url_key(urls[0]) == url_key(self.engine.job.url):
+                self.item_var.set("That URL is already being downloaded")
+            else:
+                self.item_var.set("Already queued or downloading")
+            return
+        if self.downloading:
+            # Picked up by _finish_download once the current job is done
+            message = f"Queued {len(added)} URL(s)" if len(added) > 1 else f"Queued: {added[0].url[:70]}"
+            if duplicates:
+                message += f", {duplicates} duplicate(s) skipped"
+            self.item_var.set(f"{message} ({len(self.engine.pending_jobs())} waiting)")
+            return
+        self._run_job(added[0])
+        if duplicates:
+            self._log_detail(f"{duplicates} duplicate URL(s) skipped\n")
+
+    def _resume_jobs(self):
+        if self.downloading:
+            return
+        pending = self.engine.pending_jobs()
+        if pending:
+            self._run_job(pending[0])
+
+    def _run_job(self, job):
         self._clear_all()
+        self.detail_log.start_job(job.url)
         self.downloading = True
-        self.download_btn.configure(state="disabled")
-        self.status_var.set("Downloading...")
+        self.download_btn.configure(text="Add to Queue")
+        self.status_var.set("Listing playlist...")
+
+        self.engine.start(
+            job,
+            workers=self.workers_var.get(),
+            skip_downloaded=self.skip_downloaded_var.get(),
+            refresh=self.refresh_var.get(),
+        )
+        self.refresh_var.set(False)
+        self._poll_output()
 
-        cmd = self._build_cmd(url)
+    def _poll_output(self):
+        """Apply engine output to the UI within a per-tick time budget."""
+        self._pending_log = []
+        self._dirty_slots.clear()
+        busy = self.engine.pump(FRAME_BUDGET)
+        log, self._pending_log = self._pending_log, None
+
+        # One Text insert and one label refresh per tick, however many lines arrived
+        if log:
+            self._log_detail("".join(log))
+        for slot in self._dirty_slots:
+            self._update_slot(slot, self.engine.active_items.get(slot))
+        if self._dirty_slots:
+            self.progress_var.set(self.engine.progress)
+            self._update_overall()
+        if self._postprocess_dirty:
+            self._update_postprocess()
+
+        if self.stats_visible and time.monotonic() - self._stats_updated >= STATS_INTERVAL:
+            self._update_stats()
+
+        if not self.engine.running:
+            self._finish_download(self.engine.return_code)
+        elif self.downloading:
+            self.root.after(POLL_BUSY_MS if busy else POLL_IDLE_MS, self._poll_output)
+
+    def _on_engine_event(self, event, data):
+        """Engine listener; called on the Tk thread."""
+        if event == "job_started":
+            if data["resumed"]:
+                self._log_detail(f"Resuming unfinished download: {data['url']}\n")
+
+        elif event == "log":
+            if self._pending_log is not None:
+                self._pending_log.append(data["text"])
+            else:
+                self._log_detail(data["text"])
 
-        thread = threading.Thread(target=self._run_download, args=(cmd,), daemon=True)
-        thread.start()
-        self._poll_output()
+        elif event == "playlist":
+            self.progress_var.set(self.engine.progress)
+            self._build_slot_labels(self.engine.scheduler.slot_names(data["pending"]))
+            self.status_var.set(f"Downloading {data['pending']} of {data['total']} item(s)...")
+            self._update_overall()
 
-    def _run_download(self, cmd):
-        try:
-            self.process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
-            )
-            for line in self.process.stdout:
-                self.output_queue.put(line)
-            self.process.wait()
-            self.output_queue.put(("__DONE__", self.process.returncode))
-        except FileNotFoundError:
-            self.output_queue.put("Error: yt-dlp not found. Please install it first.\n")
-            self.output_queue.put(("__DONE__", 1))
-        except Exception as e:
-            self.output_queue.put(f"Error: {e}\n")
-            self.output_queue.put(("__DONE__", 1))
-
-    def _run_retry(self, retryable):
-        """Retry each failed video URL individually."""
-        for i, entry in enumerate(retryable, 1):
-            url = entry["url"] or f"https://www.youtube.com/watch?v={entry['id']}"
-            self.output_queue.put(("__RETRY_STATUS__", i, len(retryable), entry["id"] or url))
+        elif event in ("item_started", "item_finished"):
+            self._dirty_slots.add(data["slot"])
 
-            try:
-                cmd = self._build_cmd(url)
-                self.process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
-                )
-                for line in self.process.stdout:
-                    self.output_queue.put(line)
-                self.process.wait()
-
-                if self.process.returncode == 0:
-                    self.output_queue.put(("__RETRY_OK__", entry["id"]))
-            except Exception as e:
-                self.output_queue.put(f"Retry error: {e}\n")
-
-        self.output_queue.put(("__RETRY_DONE__",))
+        elif event == "item_updated":
+            self._dirty_slots.add(data["item"].slot)
 
-    def _poll_output(self):
-        while True:
-            try:
-                item = self.output_queue.get_nowait()
-            except queue.Empty:
-                break
-
-            if isinstance(item, tuple):
-                tag = item[0]
-
-                if tag == "__DONE__":
-                    return_code = item[1]
-                    self.process = None
-
-                    # Check if we have retryable failures
-                    retryable = [v for v in self.failed_videos if not v["permanent"]]
-                    if retryable:
-                        # Start auto-retry in background
-                        permanent_count = len(self.failed_videos) - len(retryable)
-                        self.status_var.set("Retrying failed videos...")
-                        self.item_var.set(
-                            f"{len(retryable)} to retry, {permanent_count} permanently failed"
-                        )
-                        self.progress_var.set(0)
-                        self.detail_var.set("")
-
-                        # Clear retryable failures — they'll be re-added if retry fails
-                        self.failed_videos = [v for v in self.failed_videos if v["permanent"]]
-
-                        self._log_detail("\n--- Auto-retrying failed videos ---\n\n")
-                        thread = threading.Thread(target=self._run_retry, args=(retryable,), daemon=True)
-                        thread.start()
-                    else:
-                        self._finish_download(return_code)
-                        return
-
-                elif tag == "__RETRY_STATUS__":
-                    _, current, total, video_id = item
-                    self.item_var.set(f"Retry {current} of {total}: {video_id}")
-                    self.progress_var.set(0)
-                    self.detail_var.set("")
-
-                elif tag == "__RETRY_OK__":
-                    video_id = item[1]
-                    self._log_detail(f"Retry succeeded for {video_id}\n")
-
-                elif tag == "__RETRY_DONE__":
-                    self.process = None
-                    self._finish_download(0 if not self.failed_videos else 1)
-                    return
-            else:
-                self._log_detail(item)
-                self._parse_line(item)
+        elif event == "retry_scheduled":
+            self._update_overall()
 
-        if self.downloading:
-            self.root.after(100, self._poll_output)
+        elif event in ("postprocess_started", "postprocess_updated"):
+            self._postprocess_dirty = True
+
+        elif event == "postprocess_finished":
+            self._postprocess_dirty = True
+            self._update_overall()
+
+        elif event == "error":
+            self.status_var.set("Error")
+            self.item_var.set(data["message"][:80])
 
     def _finish_download(self, return_code):
         """Finalize the download process and show summary."""
         self.downloading = False
-        self.download_btn.configure(state="normal")
+        self.download_btn.configure(text="Download")
+        self._build_slot_labels([])
+        self.postprocess_var.set("")
 
-        if not self.failed_videos:
+        if not self.engine.failed_videos:
             self.status_var.set("Complete")
             self.progress_var.set(100)
             self.detail_var.set("All downloads finished successfully.")
         else:
-            permanent = [v for v in self.failed_videos if v["permanent"]]
-            other = [v for v in self.failed_videos if not v["permanent"]]
-
-            parts = []
-            if permanent:
-                parts.append(f"{len(permanent)} permanently unavailable")
-            if other:
-                parts.append(f"{len(other)} failed after retry")
+            parts = [
+                f"{len(entries)} {CATEGORY_LABELS[category].lower()}"
+                for category, entries in group_failures(self.engine.failed_videos)
+            ]
 
             self.status_var.set("Complete with errors")
-            self.item_var.set(f"{len(self.failed_videos)} video(s) could not be downloaded: {', '.join(parts)}")
+            self.item_var.set(f"{len(self.engine.failed_videos)} video(s) could not be downloaded: {', '.join(parts)}")
             self.detail_var.set("")
             self._show_summary()
 
-        if self.errors_and_warnings and not self.failed_videos:
+        self.detail_log.flush()
+        if self.stats_visible:
+            self._update_stats()
+        self._log_detail(f"Job metrics written to {METRICS_DIR}\n")
+
+        if self.engine.errors_and_warnings.total and not self.engine.failed_videos:
             self.item_var.set(
-                f"Finished with {len(self.errors_and_warnings)} warning(s) — use 'Copy Errors & Warnings' to share"
+                f"Finished with {self.engine.errors_and_warnings.total} warning(s) — use 'Copy Errors & Warnings' to share"
             )
 
+        # Leave this job's summary up for a moment before starting the next queued one
+        if self.engine.pending_jobs():
+            self.root.after(3000, self._resume_jobs)
+
+
+def parse_urls(text):
+    """URLs from text with one or more per line; blank lines and # comments are ignored."""
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.extend(line.split())
+    return urls
+
+
+def read_batch_file(path):
+    """URLs from a batch file, see parse_urls()."""
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_urls(f.read())
+
+
+def run_batch(args, config):
+    """Download every URL in the batch file without Tk, streaming JSON lines to stdout."""
+
+    def emit(event, data):
+        record = {"event": event, "time": round(time.time(), 3)}
+        for key, value in data.items():
+            record[key] = item_summary(value) if key == "item" else value
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+    try:
+        urls = read_batch_file(args.batch)
+    except OSError as e:
+        emit("error", {"message": f"Cannot read batch file: {e}"})
+        return 2
+    if not os.path.isdir(args.dir):
+        emit("error", {"message": f"Download directory does not exist: {args.dir}"})
+        return 2
+
+    engine = DownloadEngine(config)
+    engine.subscribe(emit)
+    engine.enqueue_many(urls, args.dir, args.quality)
+
+    # Unfinished jobs from an interrupted earlier run are resumed first
+    all_failed = []
+    job_count = 0
+    try:
+        while engine.pending_jobs():
+            job = engine.pending_jobs()[0]
+            engine.start(job, workers=args.workers, skip_downloaded=not args.no_skip, refresh=args.refresh)
+            engine.wait()
+            job_count += 1
+            all_failed.extend((job.url, failure) for failure in engine.failed_videos)
+    finally:
+        engine.shutdown()
+
+    emit("summary", {
+        "urls": job_count,
+        "failed": [dict(failure.as_dict(), source=source) for source, failure in all_failed],
+        "permanent": sum(1 for _, failure in all_failed if failure.permanent),
+        "by_category": {
+            category: len(entries) for category, entries in group_failures(failure for _, failure in all_failed)
+        },
+    })
+    return 1 if all_failed else 0
+
 
 def main():
+    multiprocessing.freeze_support()
+    config = load_config()
+
+    parser = argparse.ArgumentParser(description="Simple GUI for yt-dlp, with a headless batch mode.")
+    parser.add_argument("--batch", metavar="FILE", help="download every URL in FILE without opening the GUI")
+    parser.add_argument("--dir", default=config["download_dir"], help="download directory (batch mode)")
+    parser.add_argument("--quality", choices=list(QUALITY_OPTIONS), default=config["quality"])
+    parser.add_argument("--workers", type=int, default=config["concurrent_downloads"])
+    parser.add_argument("--no-skip", action="store_true", help="download videos even if already downloaded")
+    parser.add_argument("--refresh", action="store_true", help="ignore cached playlist listings")
+    args = parser.parse_args()
+
+    if args.batch:
+        sys.exit(run_batch(args, config))
+    if tk is None:
+        parser.error("tkinter is not available in this Python; use --batch FILE to download without the GUI")
+
     root = tk.Tk()
     YtDlpGui(root)
     root.mainloop()
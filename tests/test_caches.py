@@ -0,0 +1,216 @@
+"""Tests for the state kept between jobs: the content index and the playlist and info caches."""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import engine  # noqa: E402
+from engine import (  # noqa: E402
+    INFO_CACHE_TTL,
+    INFO_EXPIRY_MARGIN,
+    ContentIndex,
+    InfoCache,
+    PlaylistCache,
+    PlaylistItem,
+    info_expiry,
+    title_key,
+)
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory(prefix="yt-dlp-gui-test-")
+        self.addCleanup(scratch.cleanup)
+        self.root = Path(scratch.name)
+
+    def write(self, path, text="data"):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def clock(self, start=1_700_000_000.0):
+        """Patch time.time() to return ``self.now``, which the test moves forward."""
+        self.now = start
+        patcher = mock.patch.object(engine.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class PlaylistCacheTest(CacheTestCase):
+    ENTRIES = [["abc", "https://youtu.be/abc", "A video", "youtube"]]
+
+    def setUp(self):
+        super().setUp()
+        self.clock()
+        self.cache = PlaylistCache(self.root / "playlist_cache.json", ttl=3600, max_entries=2)
+
+    def test_hit_with_age(self):
+        self.cache.put("https://www.youtube.com/playlist?list=PL1", self.ENTRIES)
+        self.now += 60
+        entries, age = self.cache.get("https://youtube.com/playlist?list=PL1&si=share")
+        self.assertEqual((entries, age), (self.ENTRIES, 60))
+        self.assertIsNone(self.cache.get("https://youtube.com/playlist?list=PL2"))
+
+    def test_expired_listing_is_dropped(self):
+        self.cache.put("https://youtube.com/playlist?list=PL1", self.ENTRIES)
+        self.now += 3601
+        self.assertIsNone(self.cache.get("https://youtube.com/playlist?list=PL1"))
+        self.assertIsNone(PlaylistCache(self.cache.path).get("https://youtube.com/playlist?list=PL1"))
+
+    def test_least_recently_used_is_evicted(self):
+        for n in (1, 2):
+            self.cache.put(f"https://youtube.com/playlist?list=PL{n}", self.ENTRIES)
+            self.now += 1
+        # Using PL1 makes PL2 the least recently used
+        self.assertIsNotNone(self.cache.get("https://youtube.com/playlist?list=PL1"))
+        self.now += 1
+        self.cache.put("https://youtube.com/playlist?list=PL3", self.ENTRIES)
+
+        restored = PlaylistCache(self.cache.path, ttl=3600)
+        self.assertIsNotNone(restored.get("https://youtube.com/playlist?list=PL1"))
+        self.assertIsNone(restored.get("https://youtube.com/playlist?list=PL2"))
+        self.assertIsNotNone(restored.get("https://youtube.com/playlist?list=PL3"))
+
+
+class InfoCacheTest(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock()
+        self.cache = InfoCache(self.root / "info_cache", max_bytes=1000)
+        self.cache.directory.mkdir()
+
+    def item(self, video_id):
+        return PlaylistItem(1, f"https://youtu.be/{video_id}", video_id, "Video", "Youtube")
+
+    def write_info(self, item, expire=None, padding=0, used=None):
+        """Write ``item``'s info JSON as yt-dlp would, with stream URLs expiring at ``expire``."""
+        url = f"https://cdn.invalid/videoplayback?expire={int(expire)}&id=1" if expire else "https://cdn.invalid/v"
+        info = {"id": item.video_id, "formats": [{"url": url}], "padding": "x" * padding}
+        path = self.cache.path(item)
+        path.write_text(json.dumps(info), encoding="utf-8")
+        stamp = self.now if used is None else used
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_path(self):
+        self.assertEqual(self.cache.path(self.item("a/b")).name, "youtube_a_b.info.json")
+        self.assertIsNone(self.cache.path(PlaylistItem(1, "https://example.com/video")))
+
+    def test_url_expiry(self):
+        fresh, stale = self.item("fresh"), self.item("stale")
+        self.write_info(fresh, expire=self.now + 3600)
+        path = self.write_info(stale, expire=self.now + INFO_EXPIRY_MARGIN - 1)
+        self.assertEqual(self.cache.get(fresh), self.cache.path(fresh))
+        # Too close to expiring to start a download with: deleted
+        self.assertIsNone(self.cache.get(stale))
+        self.assertFalse(path.exists())
+        self.assertIsNone(self.cache.get(self.item("missing")))
+
+    def test_files_without_expiry_last_a_while(self):
+        item = self.item("abc")
+        self.write_info(item, used=self.now - INFO_CACHE_TTL + 60)
+        self.assertIsNotNone(self.cache.get(item))
+        self.write_info(item, used=self.now - INFO_CACHE_TTL - 60)
+        self.assertIsNone(self.cache.get(item))
+
+    def test_info_expiry(self):
+        info = {"requested_formats": [
+            {"url": "https://cdn.invalid/videoplayback?expire=2000&x=1"},
+            {"url": "https://cdn.invalid/videoplayback/expire/1500/x"},
+        ]}
+        self.assertEqual(info_expiry(info), 1500)
+        self.assertIsNone(info_expiry({"url": "https://cdn.invalid/v"}))
+
+    def test_least_recently_used_are_evicted(self):
+        items = [self.item(f"v{n}") for n in range(4)]
+        for n, item in enumerate(items[:3]):
+            self.write_info(item, expire=self.now + 3600, padding=200, used=self.now - 100 + n)
+            self.cache.added(item)
+        # A hit makes the oldest file the most recently used
+        self.assertIsNotNone(self.cache.get(items[0]))
+        self.now += 1
+        self.write_info(items[3], expire=self.now + 3600, padding=200)
+        self.cache.added(items[3])
+
+        kept = sorted(path.name for path in self.cache.directory.iterdir())
+        self.assertEqual(kept, ["youtube_v0.info.json", "youtube_v2.info.json", "youtube_v3.info.json"])
+        self.cache.discard(items[0])
+        self.assertFalse(self.cache.path(items[0]).exists())
+
+
+class ContentIndexTest(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.folder = self.root / "downloads"
+        self.folder.mkdir()
+        self.index = ContentIndex(self.root / "content_index.json")
+
+    def touch_folder(self, offset):
+        # Folder mtimes may be coarse; make every change visible to refresh()
+        stamp = 1_700_000_000 + offset
+        os.utime(self.folder, (stamp, stamp))
+
+    def test_finds_files_by_id(self):
+        self.write(self.folder / "Renamed by hand [abc].mp4")
+        self.write(self.folder / "Song [def].m4a")
+        self.write(self.folder / "Partial [ghi].mp4.part")
+        self.write(self.folder / "Stream [jkl].f137.mp4")
+        self.write(self.folder / "Empty [mno].mp4", "")
+        self.assertEqual(self.index.refresh(self.folder), 2)
+
+        self.assertEqual(self.index.find(self.folder, "abc"), "Renamed by hand [abc].mp4")
+        self.assertIsNone(self.index.find(self.folder, "abc", audio=True))
+        self.assertEqual(self.index.find(self.folder, "def", audio=True), "Song [def].m4a")
+        for video_id in ("ghi", "jkl", "mno", None):
+            self.assertIsNone(self.index.find(self.folder, video_id), video_id)
+
+    def test_index_is_saved_and_refreshed_on_change(self):
+        self.write(self.folder / "One [aaa].mp4")
+        self.touch_folder(0)
+        self.index.refresh(self.folder)
+        self.assertEqual(ContentIndex(self.index.path).find(self.folder, "aaa"), "One [aaa].mp4")
+
+        (self.folder / "One [aaa].mp4").unlink()
+        self.write(self.folder / "Two [bbb].mp4")
+        self.touch_folder(1)
+        self.assertEqual(self.index.refresh(self.folder), 1)
+        self.assertIsNone(self.index.find(self.folder, "aaa"))
+        self.assertEqual(self.index.find(self.folder, "bbb"), "Two [bbb].mp4")
+
+    def test_unchanged_folder_is_not_listed(self):
+        self.write(self.folder / "One [aaa].mp4")
+        self.touch_folder(0)
+        self.index.refresh(self.folder)
+        self.write(self.folder / "Two [bbb].mp4")
+        self.touch_folder(0)
+        self.assertEqual(self.index.refresh(self.folder), 1)
+        self.assertIsNone(self.index.find(self.folder, "bbb"))
+
+    def test_legacy_names_match_by_title(self):
+        # Saved by older versions as "<title>.<ext>", with yt-dlp's replacement characters
+        self.write(self.folder / "What？ A ⧸ Video.mp4")
+        self.write(self.folder / "Old song.mp3")
+        self.write(self.folder / "notes.txt")
+        self.write(self.folder / "Old stream.f137.mp4")
+        self.assertEqual(self.index.refresh(self.folder), 2)
+
+        self.assertEqual(self.index.find(self.folder, "xyz", title="What? A / video"), "What？ A ⧸ Video.mp4")
+        self.assertIsNone(self.index.find(self.folder, "xyz", audio=True, title="What? A / video"))
+        self.assertEqual(self.index.find(self.folder, None, audio=True, title="Old Song"), "Old song.mp3")
+        self.assertIsNone(self.index.find(self.folder, "xyz", title="Old stream"))
+        self.assertIsNone(self.index.find(self.folder, "xyz", title="notes"))
+        self.assertIsNone(self.index.find(self.folder, "xyz", title="???"))
+
+    def test_title_key(self):
+        self.assertEqual(title_key("Ｆｕｌｌ-width: Title!"), "fullwidthtitle")
+        self.assertEqual(title_key(None), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,301 @@
+"""Tests that run DownloadEngine against bench/fake_ytdlp.py, with all state in a temporary directory."""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import engine  # noqa: E402
+from engine import DEFAULT_CONFIG, DownloadEngine, JobQueue, PlaylistItem, RetryPolicy  # noqa: E402
+
+PLAYLIST_URL = "https://bench.invalid/playlist?items={}"
+
+# Job timeout, in seconds; the fake yt-dlp finishes a video in well under one
+TIMEOUT = 60
+
+
+def make_fake_ytdlp(directory):
+    """An executable wrapper that runs bench/fake_ytdlp.py with this interpreter."""
+    fake = ROOT / "bench" / "fake_ytdlp.py"
+    if os.name == "nt":
+        wrapper = directory / "yt-dlp.cmd"
+        wrapper.write_text(f'@"{sys.executable}" "{fake}" %*\r\n', encoding="utf-8")
+    else:
+        wrapper = directory / "yt-dlp"
+        wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake}" "$@"\n', encoding="utf-8")
+        wrapper.chmod(0o755)
+    return str(wrapper)
+
+
+class EngineTestCase(unittest.TestCase):
+    """Points the engine's state files at a scratch directory and sets up the fake yt-dlp."""
+
+    error_rules = engine.DEFAULT_ERROR_RULES
+
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory(prefix="yt-dlp-gui-test-")
+        self.addCleanup(scratch.cleanup)
+        self.scratch = Path(scratch.name)
+        self.download_dir = self.scratch / "downloads"
+        self.download_dir.mkdir()
+        (self.scratch / "error_rules.txt").write_text(self.error_rules, encoding="utf-8")
+
+        patcher = mock.patch.multiple(
+            engine,
+            JOBS_FILE=self.scratch / "jobs.jsonl",
+            PLAYLIST_CACHE_FILE=self.scratch / "playlist_cache.json",
+            ARCHIVE_DIR=self.scratch / "archives",
+            CONTENT_INDEX_FILE=self.scratch / "content_index.json",
+            INFO_CACHE_DIR=self.scratch / "info_cache",
+            METRICS_DIR=self.scratch / "metrics",
+            ERROR_RULES_FILE=self.scratch / "error_rules.txt",
+            _error_classifier=None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        env = mock.patch.dict(os.environ, {"BENCH_LINES": "5", "BENCH_LINE_DELAY": "0", "BENCH_FAIL_EVERY": "0"})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.config = dict(
+            DEFAULT_CONFIG,
+            ytdlp_path=make_fake_ytdlp(self.scratch),
+            engine="subprocess",
+            retry_base_delay=0.01,
+            retry_max_delay=0.05,
+            auto_tune=False,
+            max_download_rate="",
+            info_cache_max_mb=0,
+        )
+
+    def make_engine(self):
+        download = DownloadEngine(self.config)
+        self.addCleanup(download.shutdown)
+        self.events = []
+        download.subscribe(lambda event, data: self.events.append((event, data)))
+        return download
+
+    def run_job(self, download, job, **options):
+        download.start(job, **options)
+        deadline = time.monotonic() + TIMEOUT
+        while download.running:
+            if time.monotonic() > deadline:
+                self.fail("job did not finish")
+            download.pump()
+            time.sleep(0.01)
+
+    def started(self):
+        return [data["item"].video_id for event, data in self.events if event == "item_started"]
+
+
+class DownloadTest(EngineTestCase):
+    def test_playlist_downloads_every_item(self):
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(4), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+
+        self.assertEqual(download.return_code, 0)
+        self.assertEqual([item.state for item in download.items], ["done"] * 4)
+        self.assertEqual(sorted(self.started()), [f"bench{n:05d}" for n in range(1, 5)])
+        self.assertTrue((self.scratch / "metrics" / "last_job.json").exists())
+
+    def test_permanent_failure_is_not_retried(self):
+        os.environ["BENCH_FAIL_EVERY"] = "2"
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(4), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+
+        failed = {item.video_id: item for item in download.items if item.state == "failed"}
+        self.assertEqual(sorted(failed), ["bench00002", "bench00004"])
+        for item in failed.values():
+            self.assertEqual(item.attempts, 1)
+            self.assertEqual(item.error_category, "permanent")
+        self.assertNotIn("retry_scheduled", [event for event, _ in self.events])
+        self.assertEqual(sorted(failure.id for failure in download.failed_videos), ["bench00002", "bench00004"])
+
+    def test_archive_skips_finished_items(self):
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(3), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(3), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+        self.assertEqual(self.started(), [])
+        self.assertEqual([item.state for item in download.items], ["skipped"] * 3)
+
+    def test_files_from_older_versions_are_skipped(self):
+        # Saved as "<title>.<ext>" before the video id was added to file names
+        (self.download_dir / "Bench video 2.mp4").write_bytes(b"data")
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(3), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+        self.assertEqual(sorted(self.started()), ["bench00001", "bench00003"])
+        self.assertEqual(download.items[1].state, "skipped")
+
+    def test_merge_is_timed_as_postprocessing(self):
+        os.environ["BENCH_MERGE_DELAY"] = "0.2"
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(2), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+        for item in download.items:
+            self.assertEqual(item.state, "done")
+            self.assertGreaterEqual(item.phase_times.get("postprocessing", 0), 0.2)
+
+
+class BudgetTest(EngineTestCase):
+    def test_ytdlp_rate_syntax(self):
+        self.config["max_download_rate"] = "8M"
+        budget = self.make_engine()._get_budget(2)
+        self.assertEqual(budget.total, 8 * 1024 ** 2)
+
+    def test_unreadable_rate_is_reported(self):
+        self.config["max_download_rate"] = "8 per second"
+        self.assertIsNone(self.make_engine()._get_budget(2))
+        logged = [data["text"] for event, data in self.events if event == "log"]
+        self.assertEqual(len(logged), 1)
+        self.assertIn("'8 per second'", logged[0])
+
+    def test_no_rate(self):
+        download = self.make_engine()
+        self.assertIsNone(download._get_budget(2))
+        self.assertEqual(self.events, [])
+
+
+class RetryTest(EngineTestCase):
+    # The fake yt-dlp's "Private video" errors become retryable network errors
+    error_rules = "network: private video\n"
+
+    def test_failures_are_retried_with_backoff(self):
+        os.environ["BENCH_FAIL_EVERY"] = "3"
+        self.config["retry_max_attempts"] = 3
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(3), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+
+        item = download.items[2]
+        self.assertEqual(item.state, "failed")
+        self.assertEqual(item.attempts, 3)
+        self.assertEqual(item.error_category, "network")
+        self.assertEqual(self.started().count("bench00003"), 3)
+
+        delays = [data["delay"] for event, data in self.events if event == "retry_scheduled"]
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[0], delays[1])
+        self.assertEqual([item.state for item in download.items[:2]], ["done", "done"])
+
+    def test_retry_reuses_extracted_info(self):
+        os.environ["BENCH_DROP_EVERY"] = "2"
+        self.config["info_cache_max_mb"] = 10
+        download = self.make_engine()
+        job = download.enqueue(PLAYLIST_URL.format(3), str(self.download_dir), "Best")
+        self.run_job(download, job, workers=2)
+
+        self.assertEqual([item.state for item in download.items], ["done"] * 3)
+        self.assertEqual(download.items[1].attempts, 2)
+        logged = "".join(data["text"] for event, data in self.events if event == "log")
+        self.assertIn("Reusing extracted info for bench00002", logged)
+        # Finished items no longer need their info JSON
+        self.assertEqual(list((self.scratch / "info_cache").iterdir()), [])
+
+    def test_backoff_delays(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=5.0, categories={"permanent": {"max_attempts": 1}})
+        for attempt, ceiling in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (10, 5.0)]:
+            for _ in range(20):
+                self.assertTrue(ceiling / 2 <= policy.delay(attempt) <= ceiling)
+        self.assertFalse(policy.is_retryable("permanent"))
+        self.assertTrue(policy.is_retryable("network"))
+
+
+class JournalTest(EngineTestCase):
+    def listed_items(self, count):
+        return [
+            PlaylistItem(n, f"https://bench.invalid/watch?v=bench{n:05d}", f"bench{n:05d}", f"Video {n}", "bench")
+            for n in range(1, count + 1)
+        ]
+
+    def test_replay(self):
+        queue = JobQueue(engine.JOBS_FILE)
+        job = queue.add(PLAYLIST_URL.format(4), str(self.download_dir), "Best")
+        items = self.listed_items(4)
+        items[0].state, items[0].attempts = "done", 1
+        items[1].state, items[1].attempts = "downloading", 1
+        queue.set_items(job, items)
+        queue.flush()
+        # A write interrupted by a crash leaves a torn last line
+        with open(engine.JOBS_FILE, "a", encoding="utf-8") as f:
+            f.write('{"op": "item", "job": "')
+
+        restored = JobQueue(engine.JOBS_FILE).pending()
+        self.assertEqual([other.id for other in restored], [job.id])
+        items = restored[0].restore_items()
+        self.assertEqual([item.state for item in items], ["done", "pending", "pending", "pending"])
+        # The interrupted attempt does not count
+        self.assertEqual(items[1].attempts, 0)
+
+    def test_finished_jobs_are_compacted(self):
+        queue = JobQueue(engine.JOBS_FILE)
+        first = queue.add(PLAYLIST_URL.format(1), str(self.download_dir), "Best")
+        second = queue.add(PLAYLIST_URL.format(2), str(self.download_dir), "Best")
+        self.assertIs(queue.add(PLAYLIST_URL.format(1), str(self.download_dir), "Best"), first)
+        queue.finish(first)
+
+        restored = JobQueue(engine.JOBS_FILE)
+        self.assertEqual([job.id for job in restored.pending()], [second.id])
+        self.assertNotIn(first.id, engine.JOBS_FILE.read_text(encoding="utf-8"))
+
+    def test_add_many_drops_duplicates(self):
+        queue = JobQueue(engine.JOBS_FILE)
+        playlist = queue.add(PLAYLIST_URL.format(2), str(self.download_dir), "Best")
+        items = self.listed_items(2)
+        for item in items:
+            item.extractor = "youtube"
+        queue.set_items(playlist, items)
+        jobs = queue.add_many(
+            [
+                "https://www.youtube.com/watch?v=abc",
+                "https://youtu.be/abc?t=5",
+                # Already queued as a playlist entry
+                "https://youtu.be/bench00002",
+                PLAYLIST_URL.format(2),
+            ],
+            str(self.download_dir),
+            "Best",
+        )
+        self.assertIs(jobs[1], jobs[0])
+        self.assertEqual(jobs[2:], [playlist, playlist])
+        # Another quality is another download
+        self.assertIsNot(queue.add("https://youtu.be/abc", str(self.download_dir), "720p"), jobs[0])
+
+        queue.finish(jobs[0])
+        self.assertIsNot(queue.add("https://youtu.be/abc", str(self.download_dir), "Best"), jobs[0])
+        restored = JobQueue(engine.JOBS_FILE)
+        self.assertEqual(len(restored.pending()), 3)
+
+    def test_resume_downloads_only_unfinished_items(self):
+        queue = JobQueue(engine.JOBS_FILE)
+        job = queue.add(PLAYLIST_URL.format(4), str(self.download_dir), "Best")
+        items = self.listed_items(4)
+        for item in items[:2]:
+            item.state, item.attempts = "done", 1
+        queue.set_items(job, items)
+        queue.flush()
+
+        download = self.make_engine()
+        job = download.pending_jobs()[0]
+        self.run_job(download, job, workers=2)
+
+        self.assertTrue(self.events[0][1]["resumed"])
+        self.assertEqual(sorted(self.started()), ["bench00003", "bench00004"])
+        self.assertEqual([item.state for item in download.items], ["done"] * 4)
+        self.assertEqual(download.jobs.pending(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
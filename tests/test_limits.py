@@ -0,0 +1,158 @@
+"""Tests for sharing bandwidth and connections between downloads, and for tuning them per site."""
+
+import sys
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import engine  # noqa: E402
+from engine import (  # noqa: E402
+    THROTTLE_COOLDOWN,
+    THROTTLE_RECOVERY_ITEMS,
+    TUNING_FRAGMENTS,
+    TUNING_SAMPLES,
+    BandwidthBudget,
+    FragmentTuner,
+    HostLimiter,
+    PlaylistItem,
+)
+
+
+class BandwidthBudgetTest(unittest.TestCase):
+    def test_fixed_shares(self):
+        budget = BandwidthBudget(8000, slots=4)
+        # The first items leave room for the queued ones
+        self.assertEqual(budget.acquire("a", queued=3), 2000)
+        self.assertEqual(budget.acquire("b", queued=2), 2000)
+        budget.release("a")
+        # Nothing queued: the next item takes what is left
+        self.assertEqual(budget.acquire("c"), 6000)
+
+    def test_new_item_is_not_starved(self):
+        budget = BandwidthBudget(8000, slots=1)
+        self.assertEqual(budget.acquire("a"), 8000)
+        self.assertEqual(budget.acquire("b"), 1000)
+
+    def test_live_shares_are_rebalanced(self):
+        budget = BandwidthBudget(8000, slots=2)
+        first, second = SimpleNamespace(value=0.0), SimpleNamespace(value=0.0)
+        self.assertEqual(budget.acquire("a", live=first), 8000)
+        budget.acquire("b", live=second)
+        self.assertEqual((first.value, second.value), (4000, 4000))
+        budget.release("a")
+        self.assertEqual((first.value, second.value), (0, 8000))
+
+
+class HostLimiterTest(unittest.TestCase):
+    def test_key(self):
+        self.assertEqual(HostLimiter.key(PlaylistItem(1, "https://youtu.be/abc", extractor="Youtube")), "youtube")
+        self.assertEqual(HostLimiter.key(PlaylistItem(1, "https://www.Example.com/v/1")), "example.com")
+
+    def test_cap_blocks_until_release(self):
+        limiter = HostLimiter(max_per_host=2)
+        limiter.acquire("site")
+        limiter.acquire("site")
+        started = threading.Event()
+
+        def third():
+            limiter.acquire("site")
+            started.set()
+
+        thread = threading.Thread(target=third, daemon=True)
+        thread.start()
+        self.assertFalse(started.wait(0.1))
+        # Other sites are not held up
+        limiter.acquire("other")
+        limiter.release("site")
+        self.assertTrue(started.wait(5))
+        thread.join()
+
+    def test_throttled_site_recovers(self):
+        limiter = HostLimiter(max_per_host=0)
+        for _ in range(3):
+            limiter.acquire("site")
+        self.assertEqual(limiter.throttle("site"), 2)
+        # Further throttling within the cooldown does not lower it again
+        self.assertIsNone(limiter.throttle("site"))
+        self.assertEqual(limiter.limit("site"), 2)
+
+        raised = [limiter.release("site") for _ in range(3)]
+        for _ in range(THROTTLE_RECOVERY_ITEMS - 3):
+            limiter.acquire("site")
+            raised.append(limiter.release("site"))
+        self.assertEqual(raised, [None] * (THROTTLE_RECOVERY_ITEMS - 1) + [3])
+        self.assertEqual(limiter.limit("site"), 3)
+
+    def test_throttle_after_cooldown(self):
+        limiter = HostLimiter(max_per_host=4)
+        now = 1000.0
+        with mock.patch.object(engine.time, "monotonic", lambda: now):
+            self.assertEqual(limiter.throttle("site"), 3)
+            now += THROTTLE_COOLDOWN
+            self.assertEqual(limiter.throttle("site"), 2)
+
+    def test_recovery_stops_at_max_per_host(self):
+        limiter = HostLimiter(max_per_host=2)
+        self.assertEqual(limiter.throttle("site"), 1)
+        for _ in range(THROTTLE_RECOVERY_ITEMS):
+            limiter.acquire("site")
+            raised = limiter.release("site")
+        self.assertEqual(raised, 2)
+        self.assertEqual(limiter.limit("site"), 2)
+
+
+class FragmentTunerTest(unittest.TestCase):
+    def measure(self, tuner, throughput):
+        """Record TUNING_SAMPLES downloads of the current candidate; returns what each record() call returned."""
+        candidate, _ = tuner.options("youtube")
+        return [tuner.record("youtube", candidate, throughput) for _ in range(TUNING_SAMPLES)]
+
+    def test_doubles_until_no_gain(self):
+        state = {}
+        tuner = FragmentTuner(state, downloaders=[])
+        self.assertEqual(tuner.options("youtube"), ("fragments=1", ["--concurrent-fragments", "1"]))
+        self.assertEqual(self.measure(tuner, 100), [None] * (TUNING_SAMPLES - 1) + ["fragments=2"])
+        self.assertEqual(self.measure(tuner, 200)[-1], "fragments=4")
+        # Under 10% faster: settle on the fewest fragments about as fast as the best
+        self.assertEqual(self.measure(tuner, 205)[-1], "fragments=2")
+        self.assertTrue(state["youtube"]["settled"])
+        self.assertEqual(tuner.options("youtube")[1], ["--concurrent-fragments", "2"])
+        self.assertEqual(self.measure(tuner, 500), [None] * TUNING_SAMPLES)
+
+    def test_tries_downloaders_last(self):
+        tuner = FragmentTuner({}, downloaders=["aria2c"])
+        self.measure(tuner, 100)
+        self.assertEqual(self.measure(tuner, 105)[-1], "aria2c")
+        self.assertEqual(tuner.options("youtube"), ("aria2c", ["--downloader", "aria2c"]))
+        self.assertEqual(self.measure(tuner, 300)[-1], "aria2c")
+        self.assertTrue(tuner.state["youtube"]["settled"])
+
+    def test_stops_at_the_last_candidate(self):
+        tuner = FragmentTuner({}, downloaders=[])
+        for n, fragments in enumerate(TUNING_FRAGMENTS, 1):
+            self.assertEqual(tuner.options("youtube")[0], f"fragments={fragments}")
+            changed = self.measure(tuner, 100 * n)[-1]
+        self.assertEqual(changed, f"fragments={TUNING_FRAGMENTS[-1]}")
+        self.assertTrue(tuner.state["youtube"]["settled"])
+
+    def test_other_candidates_do_not_count(self):
+        tuner = FragmentTuner({}, downloaders=[])
+        # A download started before the setting changed
+        for _ in range(TUNING_SAMPLES):
+            self.assertIsNone(tuner.record("youtube", "fragments=8", 1000))
+        self.assertEqual(tuner.options("youtube")[0], "fragments=1")
+        self.assertEqual(tuner.state["youtube"]["results"]["fragments=8"], [1000, TUNING_SAMPLES])
+
+    def test_sites_are_tuned_separately(self):
+        tuner = FragmentTuner({}, downloaders=[])
+        self.measure(tuner, 100)
+        self.assertEqual(tuner.options("youtube")[0], "fragments=2")
+        self.assertEqual(tuner.options("vimeo")[0], "fragments=1")
+
+
+if __name__ == "__main__":
+    unittest.main()
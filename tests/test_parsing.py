@@ -0,0 +1,203 @@
+"""Tests for the pure parsing helpers: output lines, error rules, URLs and stream splitting."""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import (  # noqa: E402
+    DEFAULT_ERROR_RULES,
+    ErrorClassifier,
+    MessageCounts,
+    _Stream,
+    classify_line,
+    parse_rate,
+    split_video_id,
+    url_key,
+)
+
+
+class ClassifyLineTest(unittest.TestCase):
+    def test_text_progress(self):
+        event = classify_line("[download]  45.0% of ~  10.00MiB at    2.00MiB/s ETA 00:03\n")
+        self.assertEqual(event[0], "progress")
+        self.assertEqual(event[1], 45.0)
+        self.assertEqual(event[3], 10 * 1024 ** 2)
+        self.assertEqual(event[5], 3)
+
+    def test_structured_progress(self):
+        event = classify_line("[progress] download\tdownloading\tabc\t250\t1000\t50.00\t15\t/d/abc.mp4\n")
+        self.assertEqual(event, ("progress", 25.0, 250.0, 1000.0, 50.0, 15.0))
+
+    def test_error_with_video_id(self):
+        event = classify_line("ERROR: [youtube] abc123: Private video. Sign in if you've been granted access\n")
+        self.assertEqual(event[0], "error")
+        self.assertEqual(event[1], "[youtube] abc123: Private video. Sign in if you've been granted access")
+        self.assertEqual(event[2], "abc123")
+
+    def test_warning(self):
+        event = classify_line("WARNING: [youtube] abc123: Some formats are possibly damaged\n")
+        self.assertEqual(event[:2], ("warning", "[youtube] abc123: Some formats are possibly damaged"))
+
+    def test_files(self):
+        self.assertEqual(
+            classify_line("[download] Destination: /d/Title [abc].f137.mp4\n"),
+            ("destination", "/d/Title [abc].f137.mp4"),
+        )
+        self.assertEqual(
+            classify_line("[download] /d/Title [abc].mp4 has already been downloaded\n"),
+            ("already_downloaded", "/d/Title [abc].mp4"),
+        )
+
+    def test_unrecognised(self):
+        self.assertIsNone(classify_line("[info] abc: Downloading 1 format(s): 18\n"))
+        self.assertIsNone(classify_line("\n"))
+
+
+class ParseRateTest(unittest.TestCase):
+    def test_ytdlp_suffixes(self):
+        cases = {"500K": 500 * 1024, "8M": 8 * 1024 ** 2, "8m": 8 * 1024 ** 2, "1.5G": 1.5 * 1024 ** 3, "4096": 4096}
+        for text, rate in cases.items():
+            self.assertEqual(parse_rate(text), rate, text)
+
+    def test_units(self):
+        cases = {"8MiB": 8 * 1024 ** 2, "8 MiB/s": 8 * 1024 ** 2, "8MB": 8 * 1000 ** 2, "100B": 100}
+        for text, rate in cases.items():
+            self.assertEqual(parse_rate(text), rate, text)
+
+    def test_invalid(self):
+        for text in ("", "M", "8X", "fast", "8 M B"):
+            self.assertIsNone(parse_rate(text), text)
+
+
+class ErrorClassifierTest(unittest.TestCase):
+    def test_default_rules(self):
+        classifier = ErrorClassifier(DEFAULT_ERROR_RULES)
+        cases = {
+            "[youtube] abc: Private video. Sign in if you've been granted access": "permanent",
+            "[youtube] abc: Sign in to confirm you're not a bot": "rate_limited",
+            "Unable to download webpage: HTTP Error 503: Service Unavailable": "network",
+            "[youtube] abc: Sign in to confirm your age": "needs_cookies",
+            "[youtube] abc: Some formats are possibly damaged": "unknown",
+        }
+        for message, category in cases.items():
+            self.assertEqual(classifier.classify(message), category, message)
+
+    def test_first_rule_wins(self):
+        classifier = ErrorClassifier("network: re:error 4\\d\\d\npermanent: http error 404\n")
+        self.assertEqual(classifier.classify("HTTP Error 404: Not Found"), "network")
+        classifier = ErrorClassifier("permanent: http error 404\nnetwork: re:error 4\\d\\d\n")
+        self.assertEqual(classifier.classify("HTTP Error 404: Not Found"), "permanent")
+
+    def test_same_message_for_other_videos(self):
+        classifier = ErrorClassifier("permanent: private video\n")
+        self.assertEqual(classifier.classify("[youtube] aaa: Private video"), "permanent")
+        self.assertEqual(classifier.classify("[youtube] bbb: Private video"), "permanent")
+        self.assertEqual(classifier.classify("[youtube] bbb: Public video"), "unknown")
+
+    def test_malformed_rules_are_skipped(self):
+        classifier = ErrorClassifier("no separator\nbogus: text\nnetwork: re:(\nnetwork: timed out\n")
+        self.assertEqual(len(classifier.skipped), 3)
+        self.assertEqual(classifier.classify("Read timed out"), "network")
+
+
+class MessageCountsTest(unittest.TestCase):
+    def test_split_video_id(self):
+        self.assertEqual(split_video_id("[youtube] abc: Private video"), ("[youtube] : Private video", "abc"))
+        self.assertEqual(
+            split_video_id("WARNING: [youtube] abc: Some formats are possibly damaged"),
+            ("WARNING: [youtube] : Some formats are possibly damaged", "abc"),
+        )
+        for line in ("ERROR: Unable to download webpage: HTTP Error 503", "ERROR: [youtube] two words: x", "[info] x"):
+            self.assertEqual(split_video_id(line), (line, None))
+
+    def test_same_message_for_many_videos(self):
+        messages = MessageCounts(max_distinct=5)
+        for n in range(10000):
+            messages.add(f"WARNING: [youtube] id{n}: Some formats are possibly damaged")
+        messages.add("ERROR: Unable to download webpage")
+        self.assertEqual((len(messages), messages.total, messages.dropped), (2, 10001, 0))
+        self.assertEqual(
+            list(messages.lines()),
+            [
+                "WARNING: [youtube] id0: Some formats are possibly damaged  (x10000, videos id0, id1, id2, ...)",
+                "ERROR: Unable to download webpage",
+            ],
+        )
+
+    def test_repeats_for_one_video(self):
+        messages = MessageCounts()
+        messages.add("ERROR: [youtube] abc: Private video")
+        messages.add("ERROR: [youtube] abc: Private video")
+        self.assertEqual(list(messages.lines()), ["ERROR: [youtube] abc: Private video  (x2)"])
+
+    def test_distinct_messages_are_capped(self):
+        messages = MessageCounts(max_distinct=2)
+        for text in ("one", "two", "three", "one"):
+            messages.add(f"ERROR: {text}")
+        self.assertEqual(list(messages.lines()), ["ERROR: one  (x2)", "ERROR: two"])
+        self.assertEqual(messages.dropped, 1)
+
+
+class UrlKeyTest(unittest.TestCase):
+    def test_video_urls(self):
+        for url in (
+            "https://www.youtube.com/watch?v=abc_-1&t=30",
+            "https://youtu.be/abc_-1",
+            "https://m.youtube.com/watch?v=abc_-1",
+            "https://youtube.com/shorts/abc_-1",
+        ):
+            self.assertEqual(url_key(url), "youtube abc_-1", url)
+
+    def test_playlists(self):
+        for url in (
+            "https://www.youtube.com/playlist?list=PL1",
+            "https://www.youtube.com/watch?v=abc&list=PL1",
+            "https://youtu.be/abc?list=PL1",
+        ):
+            self.assertEqual(url_key(url), "youtube playlist PL1", url)
+
+    def test_other_sites(self):
+        self.assertEqual(url_key("https://vimeo.com/12345"), "vimeo 12345")
+        self.assertEqual(
+            url_key("HTTPS://Example.com/videos/?b=2&a=1&si=x"),
+            "https://example.com/videos?a=1&b=2",
+        )
+
+
+class StreamFeedTest(unittest.TestCase):
+    def feed(self, *chunks):
+        stream = _Stream(None, None, None)
+        lines = []
+        for chunk in chunks:
+            lines.extend(stream.feed(chunk))
+        lines.extend(stream.feed(b"", final=True))
+        return lines
+
+    def test_line_endings(self):
+        self.assertEqual(self.feed(b"a\nb\r\nc\rd"), ["a\n", "b\n", "c\n", "d\n"])
+
+    def test_crlf_split_across_chunks(self):
+        self.assertEqual(self.feed(b"a\r", b"\nb\r", b"\n"), ["a\n", "b\n"])
+
+    def test_cr_then_blank_line(self):
+        self.assertEqual(self.feed(b"a\r", b"\r\nb"), ["a\n", "\n", "b\n"])
+
+    def test_partial_lines_and_characters(self):
+        text = "50% café\r60% café\n".encode("utf-8")
+        stream = _Stream(None, None, None)
+        if stream.decoder.decode(text) != "50% café\r60% café\n":
+            self.skipTest("preferred encoding is not UTF-8")
+        self.assertEqual(
+            self.feed(text[:3], text[3:8], text[8:]),
+            ["50% café\n", "60% café\n"],
+        )
+
+    def test_no_trailing_newline(self):
+        self.assertEqual(self.feed(b"only"), ["only\n"])
+        self.assertEqual(self.feed(b""), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Tests for merging and converting downloaded streams apart from the download slots."""
+
+import os
+import queue
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import DownloadArchive, PlaylistItem, PostProcessPool, ffmpeg_cmd, postprocess_task  # noqa: E402
+
+# Stands in for ffmpeg: reports a 10 s duration and progress, then writes the
+# inputs' names to the output file; inputs named "*bad*" fail like damaged files
+FAKE_FFMPEG = r'''
+import sys
+args = sys.argv[1:]
+inputs = [args[i + 1] for i, arg in enumerate(args) if arg == "-i"]
+print("  Duration: 00:00:10.00, start: 0.000000, bitrate: 1 kb/s", flush=True)
+if any("bad" in path for path in inputs):
+    print(inputs[0] + ": Invalid data found when processing input")
+    sys.exit(1)
+for us in (0, 5000000, 10000000):
+    print(f"frame=1\nout_time_us={us}\nprogress=continue", flush=True)
+with open(args[-1], "w", encoding="utf-8") as f:
+    f.write("+".join(inputs))
+print("progress=end")
+'''
+
+
+def make_fake_ffmpeg(directory):
+    """An executable wrapper that runs FAKE_FFMPEG with this interpreter."""
+    script = directory / "fake_ffmpeg.py"
+    script.write_text(FAKE_FFMPEG, encoding="utf-8")
+    if os.name == "nt":
+        wrapper = directory / "ffmpeg.cmd"
+        wrapper.write_text(f'@"{sys.executable}" "{script}" %*\r\n', encoding="utf-8")
+    else:
+        wrapper = directory / "ffmpeg"
+        wrapper.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n', encoding="utf-8")
+        wrapper.chmod(0o755)
+    return str(wrapper)
+
+
+class PostProcessTestCase(unittest.TestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory(prefix="yt-dlp-gui-test-")
+        self.addCleanup(scratch.cleanup)
+        self.root = Path(scratch.name)
+
+    def write(self, name, text="data"):
+        path = self.root / name
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+
+
+class PostprocessTaskTest(PostProcessTestCase):
+    def test_merge(self):
+        video, audio = self.write("Video [abc].f137.mp4"), self.write("Video [abc].f140.m4a")
+        missing = str(self.root / "Video [abc].f251.webm")
+        self.assertEqual(
+            postprocess_task("Best", [video, video, missing, audio]),
+            ("merge", [video, audio], str(self.root / "Video [abc].mp4")),
+        )
+
+    def test_convert_and_rename(self):
+        audio = self.write("Song [abc].f251.webm")
+        self.assertEqual(
+            postprocess_task("Audio Only", [audio]),
+            ("convert", [audio], str(self.root / "Song [abc].mp3")),
+        )
+        self.assertEqual(postprocess_task("720p", [audio]), ("rename", [audio], str(self.root / "Song [abc].webm")))
+
+    def test_nothing_downloaded(self):
+        self.assertIsNone(postprocess_task("Best", []))
+        self.assertIsNone(postprocess_task("Best", [str(self.root / "gone.f137.mp4")]))
+
+    def test_ffmpeg_cmd(self):
+        merge = ffmpeg_cmd("ffmpeg", "merge", ["v.mp4", "a.m4a"], "out.mp4")
+        self.assertEqual(
+            merge[-11:],
+            ["-i", "v.mp4", "-i", "a.m4a", "-map", "0:v:0", "-map", "1:a:0", "-c", "copy", "out.mp4"],
+        )
+        convert = ffmpeg_cmd("ffmpeg", "convert", ["a.webm"], "out.mp3")
+        self.assertIn("libmp3lame", convert)
+        self.assertEqual(convert[-1], "out.mp3")
+
+
+class PostProcessPoolTest(PostProcessTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output = queue.Queue()
+        self.archive = DownloadArchive(self.root / "archive.txt")
+        self.pool = PostProcessPool(self.output, ffmpeg=make_fake_ffmpeg(self.root), workers=2, archive=self.archive)
+        self.item = PlaylistItem(1, "https://youtu.be/abc", "abc", "Video", "youtube")
+
+    def run_task(self, task):
+        self.pool.submit(self.item, task)
+        self.pool.join()
+        messages = []
+        while not self.output.empty():
+            messages.append(self.output.get())
+        return messages
+
+    def test_merge(self):
+        video, audio = self.write("Video [abc].f137.mp4"), self.write("Video [abc].f140.m4a")
+        messages = self.run_task(postprocess_task("Best", [video, audio]))
+
+        self.assertEqual(messages[0], ("__POSTPROCESS_START__", self.item, "merge", 1))
+        progress = [message[2] for message in messages if message[0] == "__POSTPROCESS_PROGRESS__"]
+        self.assertEqual(progress, [0.0, 50.0, 100.0])
+        self.assertEqual(messages[-1], ("__POSTPROCESS_END__", self.item, None))
+        self.assertEqual((self.root / "Video [abc].mp4").read_text(encoding="utf-8"), f"{video}+{audio}")
+        self.assertFalse(os.path.exists(video) or os.path.exists(audio))
+        self.assertEqual(self.item.returncode, 0)
+        self.assertIn(self.item, DownloadArchive(self.archive.path))
+
+    def test_failure_is_retried_and_keeps_the_streams(self):
+        video, audio = self.write("bad [abc].f137.mp4"), self.write("bad [abc].f140.m4a")
+        self.pool.attempts = 2
+        messages = self.run_task(postprocess_task("Best", [video, audio]))
+
+        starts = [message[3] for message in messages if message[0] == "__POSTPROCESS_START__"]
+        self.assertEqual(starts, [1, 2])
+        _, _, error = messages[-1]
+        self.assertIn("ffmpeg exited with code 1", error)
+        self.assertIn("Invalid data found", error)
+        # Neither the output nor a partial ".temp" file is left behind
+        names = sorted(name for name in os.listdir(self.root) if name.startswith("bad"))
+        self.assertEqual(names, ["bad [abc].f137.mp4", "bad [abc].f140.m4a"])
+        self.assertEqual(self.item.returncode, 1)
+        self.assertNotIn(self.item, DownloadArchive(self.archive.path))
+
+    def test_missing_ffmpeg_is_not_retried(self):
+        self.pool.ffmpeg = str(self.root / "no-such-ffmpeg")
+        audio = self.write("Song [abc].f251.webm")
+        messages = self.run_task(postprocess_task("Audio Only", [audio]))
+        self.assertEqual([message[0] for message in messages], ["__POSTPROCESS_START__", "__POSTPROCESS_END__"])
+        self.assertEqual(messages[-1][2], "ffmpeg not found. Please install it first.")
+        self.assertTrue(os.path.exists(audio))
+
+    def test_rename_is_handed_to_staging(self):
+        self.pool.staging = mock.Mock()
+        video = self.write("Video [abc].f22.mp4")
+        self.run_task(postprocess_task("720p", [video]))
+        self.assertTrue((self.root / "Video [abc].mp4").exists())
+        self.pool.staging.submit.assert_called_once_with(self.item)
+
+
+if __name__ == "__main__":
+    unittest.main()
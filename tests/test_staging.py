@@ -0,0 +1,133 @@
+"""Tests for the scratch folder: moving finished files and cleaning up after old jobs."""
+
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import engine  # noqa: E402
+from engine import STAGING_MARKER, STAGING_SUBDIR, PlaylistItem, StagingArea, move_file  # noqa: E402
+
+
+class StagingTestCase(unittest.TestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory(prefix="yt-dlp-gui-test-")
+        self.addCleanup(scratch.cleanup)
+        self.root = Path(scratch.name)
+        self.scratch_dir = self.root / "scratch"
+        self.download_dir = self.root / "downloads"
+        self.scratch_dir.mkdir()
+        self.download_dir.mkdir()
+
+    def write(self, path, text="data"):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        return path
+
+
+class MoveFileTest(StagingTestCase):
+    def test_same_device(self):
+        src = self.write(self.scratch_dir / "Video [abc].mp4")
+        dst = move_file(str(src), str(self.download_dir))
+        self.assertEqual(dst, str(self.download_dir / "Video [abc].mp4"))
+        self.assertFalse(src.exists())
+        self.assertEqual(Path(dst).read_text(encoding="utf-8"), "data")
+
+    def test_other_device_is_copied_then_renamed(self):
+        src = self.write(self.scratch_dir / "Video [abc].mp4")
+        copied = []
+
+        def copy2(source, target):
+            copied.append(os.path.basename(target))
+            return shutil.copyfile(source, target)
+
+        # Looks like another device, so the copy path is taken
+        with mock.patch.object(engine, "_same_device", return_value=False), \
+                mock.patch.object(engine.shutil, "copy2", copy2):
+            dst = move_file(str(src), str(self.download_dir))
+        self.assertEqual(copied, [".Video [abc].mp4.moving"])
+        self.assertFalse(src.exists())
+        self.assertEqual(os.listdir(self.download_dir), ["Video [abc].mp4"])
+        self.assertEqual(Path(dst).read_text(encoding="utf-8"), "data")
+
+    def test_failed_copy_keeps_the_source(self):
+        src = self.write(self.scratch_dir / "Video [abc].mp4")
+
+        def copy2(source, target):
+            Path(target).write_text("partial", encoding="utf-8")
+            raise OSError("disk full")
+
+        with mock.patch.object(engine, "_same_device", return_value=False), \
+                mock.patch.object(engine.shutil, "copy2", copy2):
+            with self.assertRaises(OSError):
+                move_file(str(src), str(self.download_dir))
+        self.assertTrue(src.exists())
+        self.assertEqual(os.listdir(self.download_dir), [])
+
+
+class CleanupTest(StagingTestCase):
+    def job_folder(self, job_id, *names):
+        folder = self.scratch_dir / STAGING_SUBDIR / job_id
+        self.write(folder / STAGING_MARKER, "")
+        for name in names:
+            self.write(folder / name)
+        return folder
+
+    def test_only_marked_job_folders_are_deleted(self):
+        unrelated = [
+            self.write(self.scratch_dir / "my_project" / "src" / "code.py"),
+            self.write(self.scratch_dir / "photos" / "a.jpg"),
+            # In the app's own subfolder, but not made by it
+            self.write(self.scratch_dir / STAGING_SUBDIR / "notes" / "todo.txt"),
+        ]
+        gone = self.job_folder("oldjob", "Video [abc].mp4.part")
+        queued = self.job_folder("queued", "Video [def].mp4.part")
+
+        self.assertEqual(StagingArea.cleanup(self.scratch_dir, {"queued"}), [])
+        self.assertFalse(gone.exists())
+        self.assertTrue(queued.exists())
+        for path in unrelated:
+            self.assertTrue(path.exists(), path)
+
+    def test_folders_with_finished_files_are_kept(self):
+        finished = self.job_folder("oldjob", "Video [abc].mp4")
+        raw = self.job_folder("rawjob", "Video [abc].f137.mp4")
+        kept = StagingArea.cleanup(self.scratch_dir, set())
+        self.assertEqual(sorted(kept), sorted([str(finished), str(raw)]))
+
+    def test_missing_scratch_dir(self):
+        self.assertEqual(StagingArea.cleanup(self.root / "missing", set()), [])
+
+
+class StagingAreaTest(StagingTestCase):
+    def test_files_are_moved_and_the_folder_removed(self):
+        output = queue.Queue()
+        staging = StagingArea(self.scratch_dir, "job1", str(self.download_dir), output, min_free=0)
+        self.assertIsNone(staging.prepare())
+        self.assertTrue((staging.directory / STAGING_MARKER).exists())
+        self.assertEqual(staging.directory, self.scratch_dir / STAGING_SUBDIR / "job1")
+
+        self.write(staging.directory / "One [aaa].mp4")
+        self.write(staging.directory / "Two [bbb].mp4.part")
+        staging.submit(PlaylistItem(1, "https://example.invalid/aaa", "aaa", "One", "Youtube"))
+        staging.join()
+
+        self.assertEqual(os.listdir(self.download_dir), ["One [aaa].mp4"])
+        self.assertFalse(staging.directory.exists())
+        self.assertTrue(output.empty())
+
+    def test_short_download_dir_is_fatal(self):
+        staging = StagingArea(self.scratch_dir, "job1", str(self.download_dir), queue.Queue(), min_free=1 << 62)
+        fatal, message = staging.prepare()
+        self.assertTrue(fatal)
+        self.assertIn(str(self.download_dir), message)
+
+
+if __name__ == "__main__":
+    unittest.main()